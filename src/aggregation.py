@@ -0,0 +1,133 @@
+import numpy as np, pandas as pd
+from scipy import sparse
+
+# 最適化結果の集計（キャリア × バス × 時刻 の需給バランス）
+# 発電機・StorageUnit・揚水（Link）の出力を、列（コンポーネント）→(キャリア, バス) の
+# 対応行列との1回の行列積でまとめて集計する。結果はネットワークオブジェクトにキャッシュし、
+# analyze_results のプロット関数とヘッドレスでの出力（export_energy_balance）で共有する。
+# matplotlib に依存しないので、描画環境のないバッチ処理からも使える。
+
+# 揚水発電のLinkのキャリア名
+PHSS_DISCHARGE = '揚水（放電）'
+PHSS_CHARGE = '揚水（充電）'
+
+
+def _cached(network, key, inputs, compute):
+    # 入力のDataFrame（ネットワーク自身が持つもの）が差し替えられていなければキャッシュを返す
+    # 入力そのものへの参照を保持して同一性で比べるので、解放されたオブジェクトの id が
+    # 再利用されて別の結果を返すことはない
+    cache = network.__dict__.setdefault('_aggregation_cache', {})
+    shapes = tuple(df.shape for df in inputs)
+    entry = cache.get(key)
+    if entry is None or entry[1] != shapes or len(entry[0]) != len(inputs) \
+            or any(a is not b for a, b in zip(entry[0], inputs)):
+        cache[key] = (tuple(inputs), shapes, compute())
+    return cache[key][2]
+
+
+def clear_cache(network):
+    """
+    集計結果のキャッシュを削除する（結果のDataFrameをその場で書き換えた場合に使う）
+    """
+    network.__dict__.pop('_aggregation_cache', None)
+
+
+def _group_columns(values, carriers, buses, index):
+    # 列を (キャリア, バス) ごとに合計する（疎な対応行列との行列積）
+    keys = pd.MultiIndex.from_arrays([carriers, buses], names=['carrier', 'bus'])
+    codes, groups = pd.factorize(keys)
+    mapping = sparse.csr_matrix((np.ones(len(codes)), (np.arange(len(codes)), codes)),
+                                shape=(len(codes), len(groups)))
+    summed = (mapping.T @ values.T).T
+    return pd.DataFrame(summed, index=index, columns=pd.MultiIndex.from_tuples(groups, names=['carrier', 'bus']))
+
+
+def energy_balance(network):
+    """
+    キャリア × バス × 時刻 の出力 [MW] を返す（列は (carrier, bus) のマルチインデックス）
+
+    - 発電機: generators_t.p
+    - StorageUnit: storage_units_t.p
+    - 揚水（放電）: 放電Linkの p0 を系統側のバス(bus1)に計上
+    - 揚水（充電）: 充電Linkの p0 を負の値として系統側のバス(bus0)に計上
+    """
+    gens = network.generators
+    storage = network.storage_units
+    links = network.links
+    p0 = network.links_t.p0
+
+    def compute():
+        p_gen = network.generators_t.p.reindex(columns=gens.index, fill_value=0.0)
+        p_storage = network.storage_units_t.p.reindex(columns=storage.index, fill_value=0.0)
+        values, carriers, buses = [p_gen.to_numpy()], [gens.carrier.to_numpy()], [gens.bus.to_numpy()]
+        if len(storage) > 0:
+            values.append(p_storage.to_numpy())
+            carriers.append(storage.carrier.to_numpy())
+            buses.append(storage.bus.to_numpy())
+        if len(links) > 0 and not p0.empty:
+            for carrier, bus_attr, sign in [(PHSS_DISCHARGE, 'bus1', 1.0), (PHSS_CHARGE, 'bus0', -1.0)]:
+                phss = links[links.carrier == carrier]
+                if len(phss) > 0:
+                    values.append(sign * p0.reindex(columns=phss.index, fill_value=0.0).to_numpy())
+                    carriers.append(phss.carrier.to_numpy())
+                    buses.append(phss[bus_attr].to_numpy())
+        return _group_columns(np.hstack(values), np.concatenate(carriers), np.concatenate(buses), network.snapshots)
+
+    return _cached(network, 'energy_balance', [network.generators_t.p, network.storage_units_t.p, p0,
+                                               gens, storage, links], compute)
+
+
+def total_load(network):
+    """
+    全負荷の合計 [MW]（時刻ごと）
+    """
+    p_set = network.loads_t.p_set
+    return _cached(network, 'total_load', [p_set], lambda: p_set.sum(axis=1))
+
+
+def generation_by_carrier(network, snapshots=None):
+    """
+    キャリア別の出力 [MW]（時刻 × キャリア）。揚水（充電）は負の値
+    """
+    by_carrier = _cached(network, 'generation_by_carrier', [network.generators_t.p, network.storage_units_t.p,
+                                                            network.links_t.p0, network.generators,
+                                                            network.storage_units, network.links],
+                         lambda: energy_balance(network).T.groupby(level='carrier', sort=False).sum().T)
+    return by_carrier if snapshots is None else by_carrier.loc[snapshots]
+
+
+def generator_energy_by_bus(network):
+    """
+    発電機のバス × キャリア別発電電力量 [MWh]（snapshot_weightings を考慮）
+    """
+    gens = network.generators
+
+    def compute():
+        weights = network.snapshot_weightings['generators'].to_numpy()
+        p_gen = network.generators_t.p.reindex(columns=gens.index, fill_value=0.0)
+        totals = pd.Series(weights @ p_gen.to_numpy(), index=gens.index)
+        return totals.groupby([gens.bus, gens.carrier]).sum().unstack('carrier', fill_value=0.0)
+
+    return _cached(network, 'generator_energy_by_bus', [network.generators_t.p, gens, network.snapshot_weightings],
+                   compute)
+
+
+def generator_energy_by_carrier(network):
+    """
+    発電機のキャリア別発電電力量 [MWh]（snapshot_weightings を考慮）
+    """
+    return generator_energy_by_bus(network).sum()
+
+
+def export_energy_balance(network, path):
+    """
+    需給バランスをファイルに出力する（描画なし）。拡張子で形式を選ぶ（.parquet / .csv）
+
+    出力は縦持ち（snapshot, carrier, bus, p）の表。
+    """
+    tidy = energy_balance(network).stack(['carrier', 'bus'], future_stack=True).rename('p').reset_index()
+    if path.endswith('.parquet'):
+        tidy.to_parquet(path)
+    else:
+        tidy.to_csv(path, index=False, encoding='utf-8-sig')
+    return tidy
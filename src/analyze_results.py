@@ -3,9 +3,34 @@ from IPython.display import clear_output, display
 from concurrent.futures import ThreadPoolExecutor
 import warnings, requests, re, shutil
 import matplotlib.pyplot as plt
+from .aggregation import generation_by_carrier, generator_energy_by_bus, generator_energy_by_carrier, \
+    total_load as load_total, PHSS_CHARGE
+
+# 日本語フォントの候補（インストールされている最初のフォントを使う）
+JAPANESE_FONTS = ['Meiryo', 'Yu Gothic', 'MS Gothic', 'Hiragino Sans', 'IPAexGothic', 'Noto Sans CJK JP']
+_font_configured = False
+
+
+def setup_japanese_font():
+    """
+    日本語フォントを設定する（プロセスで1回だけ。フォントの一覧の検索は重いため）
+    """
+    global _font_configured
+    if _font_configured:
+        return
+    from matplotlib import font_manager
+    installed = {font.name for font in font_manager.fontManager.ttflist}
+    available = [name for name in JAPANESE_FONTS if name in installed]
+    if available:
+        plt.rcParams['font.family'] = available[0]
+    else:
+        print(f"  ⚠ 日本語フォントが見つかりません（候補: {', '.join(JAPANESE_FONTS)}）")
+    plt.rcParams['axes.unicode_minus'] = False  # マイナス符号も文字化け防止
+    _font_configured = True
+
 
 # 発電量プロット
-def plot_total_generation_by_carrier(network, start_date=None, end_date=None):
+def plot_total_generation_by_carrier(network, start_date=None, end_date=None, show=True):
     """
     キャリア別の合計発電出力をプロット
     
@@ -13,10 +38,10 @@ def plot_total_generation_by_carrier(network, start_date=None, end_date=None):
         network: PyPSA Network object
         start_date: 開始日時 (例: '2024-04-01' または '2024-04-01 00:00')
         end_date: 終了日時 (例: '2024-04-14' または '2024-04-14 23:00')
+        show: Trueの場合は plt.show() で表示する（Falseの場合は表示せずに Figure を返す）
     """
     pd.options.plotting.backend = "matplotlib"  # プロットバックエンドをmatplotlibに
-    plt.rcParams['font.family'] = 'Meiryo'  # または 'Meiryo', 'Yu Gothic' MS Gothic
-    plt.rcParams['axes.unicode_minus'] = False  # マイナス符号も文字化け防止
+    setup_japanese_font()
     
     # 期間指定がある場合はデータをフィルタリング
     if start_date is not None or end_date is not None:
@@ -35,41 +60,13 @@ def plot_total_generation_by_carrier(network, start_date=None, end_date=None):
     else:
         snapshots = network.snapshots
     
-    # 各generatorがどのcarrierかを取得
-    carrier_map = network.generators['carrier']
-
-    # generator名→carrier名の辞書
-    gen_to_carrier = carrier_map.to_dict()
-
-    # generators_t.pの列（generator名）ごとにcarrierでgroupbyして合計
-    carrier_output = {}
-    for gen, carrier in gen_to_carrier.items():
-        gen_data = network.generators_t.p[gen].loc[snapshots]
-        if carrier not in carrier_output:
-            carrier_output[carrier] = gen_data.copy()
-        else:
-            carrier_output[carrier] = carrier_output[carrier] + gen_data
-
-    # 揚水発電の出力を追加（linksから取得）
-    phss_discharge = None
+    # キャリア別の出力（発電機・揚水を列方向に一括集計したもの。ネットワークにキャッシュされる）
+    carrier_output_df = generation_by_carrier(network, snapshots)
+
+    # 揚水充電（負の値）は積み上げとは別に描画する
     phss_charge = None
-    if hasattr(network, 'links') and hasattr(network, 'links_t'):
-        if 'carrier' in network.links.columns:
-            # carrier='揚水（放電）'のリンクを抽出
-            phss_discharge_links = network.links[network.links['carrier'] == '揚水（放電）'].index
-            if len(phss_discharge_links) > 0 and hasattr(network.links_t, 'p0'):
-                phss_discharge = network.links_t.p0[phss_discharge_links].loc[snapshots].sum(axis=1)
-                carrier_output['揚水（放電）'] = phss_discharge.copy()
-            
-            # carrier='揚水（充電）'のリンクを抽出
-            phss_charge_links = network.links[network.links['carrier'] == '揚水（充電）'].index
-            if len(phss_charge_links) > 0 and hasattr(network.links_t, 'p0'):
-                phss_charge = network.links_t.p0[phss_charge_links].loc[snapshots].sum(axis=1)
-                # 充電は負の値として扱う（系統からの流出なので負にする）
-                phss_charge = -phss_charge
-
-    # DataFrame化（index=時系列、columns=carrier）
-    carrier_output_df = pd.DataFrame(carrier_output)
+    if PHSS_CHARGE in carrier_output_df.columns:
+        phss_charge = carrier_output_df[PHSS_CHARGE]
 
     # グラフ描画
     # キャリアの順序および色を指定（下から上に積み上がる順）
@@ -86,7 +83,8 @@ def plot_total_generation_by_carrier(network, start_date=None, end_date=None):
     fig, ax = plt.subplots(figsize=(14, 6))
     
     # Y軸の範囲を先に計算
-    y_max = network.loads_t['p_set'].loc[snapshots].sum(axis=1).max()
+    total_load = load_total(network).loc[snapshots]
+    y_max = total_load.max()
     y_min = 0
     if phss_charge is not None and phss_charge.sum() != 0:
         y_min = phss_charge.min()
@@ -100,7 +98,6 @@ def plot_total_generation_by_carrier(network, start_date=None, end_date=None):
                         alpha=0.6, color="#06A9DB", label='揚水（充電）', zorder=2, interpolate=True)
     
     # 負荷線を最後に描画（赤色、細線）
-    total_load = network.loads_t['p_set'].loc[snapshots].sum(axis=1) 
     total_load.plot(ax=ax, linewidth=1.2, color='red', label='Total Load (負荷)', linestyle='-', zorder=100)
         
     # Y軸の範囲を設定
@@ -130,33 +127,29 @@ def plot_total_generation_by_carrier(network, start_date=None, end_date=None):
     
     ax.legend(handles_ordered, labels_ordered, title="キャリア", bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.tight_layout()
-    plt.show()
+    if show:
+        plt.show()
+    return fig
 
 
 # バスごとの発電量内訳プロット
-def plot_generation_by_bus(network):
-    import pandas as pd
-    import matplotlib.pyplot as plt
+def plot_generation_by_bus(network, show=True):
     # 日本語フォント設定
-    plt.rcParams['font.family'] = 'Meiryo'
-    plt.rcParams['axes.unicode_minus'] = False
+    setup_japanese_font()
     # 発電種別の順序と色を定義
     desired_order = ["原子力", "揚水", "水力", "火力（石炭）", "火力（ガス）", "火力（石油）", "太陽光", "バイオマス", "その他"]
     color_list = ["#745994", "#2C3796", "#87CEEB", "#339689", "#E77A61", "#FF0000", "#EEFF00", "#228B22", "#D2691E"]
-    # バスのリスト
+    # バスの表示順（9エリアを先に、その他のバスは後ろに並べる）
     bus_list = ['北海道', '東北', '東京', '北陸', '中部', '関西', '四国', '中国', '九州']
+    # バス × キャリア別の発電電力量（発電機のみ、一括集計）
+    energy_by_bus = generator_energy_by_bus(network)
+    bus_order = [bus for bus in bus_list if bus in energy_by_bus.index] + \
+                [bus for bus in energy_by_bus.index if bus not in bus_list]
+    # 揚水発電は除外
+    energy_by_bus = energy_by_bus.drop(columns='揚水', errors='ignore').loc[bus_order]
     # 各バスの発電量データを収集
     bus_generation_data = {}
-    for bus_name in bus_list:
-        # このバスに接続されている発電機を取得
-        bus_generators = network.generators[network.generators.bus == bus_name]
-        if len(bus_generators) == 0:
-            continue
-        # 発電機ごとの総発電量を計算
-        gen_by_carrier = network.generators_t.p[bus_generators.index].sum().groupby(bus_generators.carrier).sum()
-        # 揚水発電は除外
-        if '揚水' in gen_by_carrier.index:
-            gen_by_carrier = gen_by_carrier.drop('揚水')
+    for bus_name, gen_by_carrier in energy_by_bus.iterrows():
         if gen_by_carrier.sum() > 0:
             bus_generation_data[bus_name] = gen_by_carrier
     # 1つのグラフに全地域の横棒グラフを作成
@@ -204,23 +197,23 @@ def plot_generation_by_bus(network):
     ax.invert_yaxis()  # 上から下に並べる
 
     plt.tight_layout()
-    plt.show()
+    if show:
+        plt.show()
+    return fig
 # --- IGNORE ---
 
 
-def plot_generation_mix_in_total_in_pie_graph(network):
+def plot_generation_mix_in_total_in_pie_graph(network, show=True):
     # 発電電力量を発電種別毎の円グラフで表示
-    import matplotlib.pyplot as plt
 
     # 日本語フォント設定
-    plt.rcParams['font.family'] = 'Meiryo'  # Windows用
-    plt.rcParams['axes.unicode_minus'] = False  # マイナス記号の文字化け防止
+    setup_japanese_font()
 
     desired_order = ["原子力", "揚水", "水力", "火力（石炭）", "火力（ガス）", "火力（石油）", "太陽光", "バイオマス", "その他"]
     color_list = ["#745994", "#2C3796", "#87CEEB", "#339689", "#E77A61", "#FF0000", "#EEFF00", "#228B22", "#D2691E"]
 
     # 発電種別ごとの総発電量を計算
-    generation_by_carrier = network.generators_t.p.sum().groupby(network.generators.carrier).sum()
+    generation_by_carrier = generator_energy_by_carrier(network)
 
     # まずネットワークにどんなcarrierがあるか確認
     print("ネットワーク内のcarrier一覧:")
@@ -249,4 +242,6 @@ def plot_generation_mix_in_total_in_pie_graph(network):
         textprops={'fontsize': 10})
     ax.set_title('発電種別ごとの総発電量 (Total Generation by Carrier Type)', fontsize=10)
     plt.tight_layout()
-    plt.show()
+    if show:
+        plt.show()
+    return fig
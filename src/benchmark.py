@@ -0,0 +1,185 @@
+import os, sys, json, time, argparse, platform, subprocess, tempfile, shutil, warnings
+import pandas as pd
+from .stage_timer import stage_timer
+from .synthetic_network import write_synthetic_case
+
+# 構築→最適化→分析 のベンチマーク
+# 規模の異なる合成ネットワーク（synthetic_network）を実際の処理段階に通し、
+# 段階ごとの経過時間と最大メモリ使用量をJSONに保存する。ネットワーク接続は不要。
+# コミット間の比較は compare_benchmarks() で行う。
+#
+# 実行例:
+#   python -m src.benchmark --sizes small medium
+#   python -m src.benchmark --compare benchmark_results/*.json
+
+# 規模: (バス数, 発電機数, スナップショット数)。'substation' は9エリアを変電所単位に分割した構成
+BENCHMARK_SIZES = {
+    'small': {'n_buses': 10, 'n_generators': 100, 'hours': 168},
+    'medium': {'n_buses': 50, 'n_generators': 500, 'hours': 336},
+    'large': {'n_buses': 200, 'n_generators': 2000, 'hours': 720},
+    'substation': {'n_buses': 300, 'n_generators': 3000, 'hours': 168, 'topology': 'areas', 'n_pumped_hydro': 40},
+}
+DEFAULT_OUTPUT_DIR = './benchmark_results'
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _package_versions():
+    import numpy, pypsa, linopy, highspy
+    versions = {'python': platform.python_version(), 'numpy': numpy.__version__, 'pandas': pd.__version__,
+                'pypsa': pypsa.__version__, 'linopy': linopy.__version__}
+    versions['highs'] = getattr(highspy.Highs(), 'version', lambda: None)()
+    return versions
+
+
+def run_benchmark(size, n_buses, n_generators, hours, year=2030, seed=0, synthetic_dir='./data/synthetic',
+                  solver_options=None, topology='mesh', n_pumped_hydro=0):
+    """
+    1つの規模で全段階を実行し、段階ごとの計測結果を返す
+
+    段階: excel_load（キャッシュなし）, excel_load_cached, demand, solar, hydro,
+          model_build, optimize, analyze
+
+    Args:
+        size: 規模の名前（結果に記録する）
+        n_buses, n_generators: 合成ネットワークの規模
+        topology, n_pumped_hydro: 合成ネットワークの系統構成と揚水発電所の数
+        hours: スナップショット数（対象年の1月1日から）
+        year: 対象年
+        seed: 合成ネットワークの乱数シード
+        synthetic_dir: 合成ネットワークの保存先（作成済みなら再利用する）
+        solver_options: HiGHSに渡すオプション
+    """
+    from .excel_cache import load_network
+    from .preprocess_data import import_demand_data_from_network_file, SolarTimeSeriesDataSet, HydroTimeSeriesDataSet
+    from . import aggregation
+
+    warnings.filterwarnings('ignore', category=UserWarning, module='pypsa')
+    case = write_synthetic_case(synthetic_dir, n_buses, n_generators, seed=seed, topology=topology,
+                                n_pumped_hydro=n_pumped_hydro)
+    snapshots = pd.date_range(f'{year}-01-01 00:00', periods=hours, freq='h')
+    records = []
+    # ワークブックのキャッシュは毎回空のディレクトリを使い、初回読み込みを測る
+    cache_dir = tempfile.mkdtemp(prefix='benchmark_cache_')
+    try:
+        with stage_timer('excel_load', records):
+            network = load_network(case['workbook'], cache_dir=cache_dir)
+        with stage_timer('excel_load_cached', records):
+            network = load_network(case['workbook'], cache_dir=cache_dir)
+        network.set_snapshots(snapshots)
+        with stage_timer('demand', records):
+            import_demand_data_from_network_file(network, case['workbook'], 0, cache_dir=cache_dir)
+        with stage_timer('solar', records):
+            SolarTimeSeriesDataSet(network, case['solar'])
+        with stage_timer('hydro', records):
+            HydroTimeSeriesDataSet(network, case['hydro'])
+        with stage_timer('model_build', records):
+            model = network.optimize.create_model()
+        with stage_timer('optimize', records):
+            status, condition = network.optimize.solve_model(solver_name='highs',
+                                                             solver_options=solver_options or {})
+        with stage_timer('analyze', records):
+            aggregation.energy_balance(network)
+            aggregation.generation_by_carrier(network)
+            aggregation.generator_energy_by_bus(network)
+            aggregation.total_load(network)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        'size': size,
+        'n_buses': n_buses,
+        'n_generators': n_generators,
+        'hours': hours,
+        'topology': topology,
+        'n_pumped_hydro': n_pumped_hydro,
+        'seed': seed,
+        'variables': int(model.nvars),
+        'constraints': int(model.ncons),
+        'status': status,
+        'termination_condition': condition,
+        'objective': network.objective if status == 'ok' else None,
+        'stages': records,
+    }
+
+
+def run_benchmarks(sizes=('small', 'medium'), output_dir=DEFAULT_OUTPUT_DIR, solver_options=None, **kwargs):
+    """
+    複数の規模でベンチマークを実行し、結果をJSONに保存する
+
+    Returns:
+        保存したJSONファイルのパス
+    """
+    solver_options = dict(solver_options or {'threads': 1, 'log_to_console': False})
+    commit = _git_commit()
+    results = []
+    for size in sizes:
+        print(f"ベンチマーク: {size} {BENCHMARK_SIZES[size]}")
+        results.append(run_benchmark(size, solver_options=solver_options, **BENCHMARK_SIZES[size], **kwargs))
+
+    report = {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': _package_versions(),
+        'solver_options': solver_options,
+        'results': results,
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"benchmark_{time.strftime('%Y%m%d-%H%M%S')}_{commit or 'nogit'}.json")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1, default=str)
+    print(f"  ✓ 結果を保存しました: {output_file}")
+    return output_file
+
+
+def load_benchmark(path):
+    """
+    ベンチマーク結果のJSONを (規模, 段階) ごとの表にする
+    """
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    rows = [dict(stage, size=result['size'], commit=report['commit'], created=report['created'])
+            for result in report['results'] for stage in result['stages']]
+    return pd.DataFrame(rows)
+
+
+def compare_benchmarks(paths, metric='elapsed'):
+    """
+    複数のベンチマーク結果を並べて比較する
+
+    Returns:
+        行=(規模, 段階)、列=実行（コミット・日時）の表
+    """
+    frames = [load_benchmark(path) for path in paths]
+    data = pd.concat(frames, ignore_index=True)
+    data['run'] = data['commit'].fillna('nogit') + ' ' + data['created']
+    table = data.pivot_table(index=['size', 'stage'], columns='run', values=metric, sort=False)
+    return table[sorted(table.columns, key=lambda c: c.split(' ', 1)[1])]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='構築→最適化→分析のベンチマーク（合成ネットワーク）')
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(BENCHMARK_SIZES))
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--threads', type=int, default=1, help='HiGHSのスレッド数')
+    parser.add_argument('--compare', nargs='+', metavar='JSON', help='保存済みの結果を比較して表示する')
+    parser.add_argument('--metric', default='elapsed', choices=['elapsed', 'peak_rss_mb'])
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with pd.option_context('display.width', 200, 'display.max_columns', 20):
+            print(compare_benchmarks(args.compare, args.metric).round(3))
+        return
+    run_benchmarks(args.sizes, args.output_dir, solver_options={'threads': args.threads, 'log_to_console': False})
+
+
+if __name__ == '__main__':
+    sys.exit(main())
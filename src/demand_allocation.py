@@ -0,0 +1,131 @@
+import os, hashlib
+import numpy as np, pandas as pd
+from scipy import sparse
+
+# エリア需要のノード（負荷）への割当
+# OCCTOのエリア別需要（Demandシートの '東京D' などの列）を、エリア→負荷の重み行列（疎行列）で
+# 各負荷の p_set に配分する。重みは人口・GDP・変電所容量などを想定し、エリアごとに合計1に正規化する。
+# 全時刻の配分は (時刻 × エリア) と (エリア × 負荷) の1回の行列積で計算するので、負荷の数が
+# 増えてもPythonのループは増えない。
+# 重み行列は内容のハッシュをキーにディスクにキャッシュし、シナリオ間（プロセス間）で再利用する。
+#
+# 割当表（allocation）は index=負荷名、列 area（Demandシートの列名）と weight のDataFrame。
+# 負荷シートに area / weight 列があればそれを使い、ない負荷は従来どおり負荷名と同じ列を割り当てる。
+
+DEFAULT_CACHE_DIR = './data/cache/allocation'
+
+
+def allocation_table(loads, demand_columns, allocation=None):
+    """
+    負荷ごとの割当先エリアと重みの表を作成する
+
+    優先順位: allocation 引数 → 負荷の area / weight 列 → 負荷名と同じDemandの列（重み1）
+
+    Args:
+        loads: network.loads
+        demand_columns: Demandシートの列名
+        allocation: index=負荷名、列 area, weight のDataFrame（省略可）
+
+    Returns:
+        (割当表, 割当先が見つからない負荷名のリスト)
+    """
+    table = pd.DataFrame({'area': pd.Series(np.nan, index=loads.index, dtype=object), 'weight': 1.0})
+    if 'area' in loads.columns:
+        table['area'] = loads['area'].where(loads['area'].notna() & (loads['area'] != ''))
+        if 'weight' in loads.columns:
+            table['weight'] = loads['weight'].fillna(1.0)
+    if allocation is not None:
+        allocation = allocation.reindex(loads.index)
+        has_area = allocation['area'].notna()
+        table.loc[has_area, 'area'] = allocation.loc[has_area, 'area']
+        if 'weight' in allocation.columns:
+            table.loc[has_area, 'weight'] = allocation.loc[has_area, 'weight'].fillna(1.0)
+
+    # エリアの指定がない負荷は、負荷名と同じ列があればそれを割り当てる
+    unassigned = table['area'].isna() & loads.index.isin(demand_columns)
+    table.loc[unassigned, 'area'] = loads.index[unassigned]
+    table.loc[unassigned, 'weight'] = 1.0
+
+    valid = table['area'].isin(demand_columns)
+    missing = table.index[~valid].tolist()
+    return table[valid].astype({'weight': float}), missing
+
+
+def _matrix_key(table, areas):
+    payload = pd.util.hash_pandas_object(table, index=True).to_numpy().tobytes() + '\0'.join(areas).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def allocation_matrix(table, areas, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    エリア × 負荷 の重み行列（CSR形式の疎行列）を作成する（キャッシュがあれば読み込む）
+
+    Args:
+        table: allocation_table() の割当表
+        areas: 行に対応するエリア（Demandシートの列名）の並び
+        cache_dir: キャッシュディレクトリ（Noneの場合はキャッシュしない）
+
+    Returns:
+        (len(areas), len(table)) の疎行列。各エリアの行の合計は1（そのエリアに負荷がある場合）
+    """
+    areas = list(areas)
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, f'allocation_{_matrix_key(table, areas)}.npz')
+        if os.path.exists(cache_file):
+            return sparse.load_npz(cache_file)
+
+    rows = pd.Index(areas).get_indexer(table['area'])
+    weights = table['weight'].to_numpy(dtype=float)
+    if (weights < 0).any():
+        raise ValueError('割当の重みは0以上にしてください')
+    # エリアごとに重みの合計で割って正規化する（重みの合計が0のエリアは均等に配分）
+    totals = np.bincount(rows, weights=weights, minlength=len(areas))
+    counts = np.bincount(rows, minlength=len(areas))
+    values = np.where(totals[rows] > 0, weights / np.where(totals[rows] > 0, totals[rows], 1.0), 1.0 / counts[rows])
+    matrix = sparse.csr_matrix((values, (rows, np.arange(len(table)))), shape=(len(areas), len(table)))
+
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp.npz'
+        sparse.save_npz(tmp_file, matrix)
+        os.replace(tmp_file, cache_file)
+    return matrix
+
+
+def allocate_demand(area_demand, table, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    エリア需要を負荷に配分する
+
+    Args:
+        area_demand: index=時刻、列=エリアのDataFrame
+        table: allocation_table() の割当表
+        cache_dir: 重み行列のキャッシュディレクトリ
+
+    Returns:
+        index=時刻、列=負荷名のDataFrame
+    """
+    areas = pd.unique(table['area'])
+    matrix = allocation_matrix(table, areas, cache_dir)
+    values = area_demand[areas].to_numpy(dtype=float)
+    # (時刻 × エリア) @ (エリア × 負荷) を疎行列側から計算する
+    allocated = (matrix.T @ values.T).T
+    return pd.DataFrame(allocated, index=area_demand.index, columns=table.index)
+
+
+def read_allocation_table(file_name, sheet_name='load_allocation', load_column='name', area_column='area',
+                          weight_column='weight'):
+    """
+    割当表をExcelシートまたはCSVから読み込む
+
+    Args:
+        file_name: .xlsx または .csv
+        sheet_name: Excelの場合のシート名
+        load_column, area_column, weight_column: 負荷名・エリア・重み（人口、GDPなど）の列名
+    """
+    if file_name.endswith('.csv'):
+        df = pd.read_csv(file_name)
+    else:
+        from .excel_cache import read_excel_sheet
+        df = read_excel_sheet(file_name, sheet_name)
+    return df.rename(columns={area_column: 'area', weight_column: 'weight'}).set_index(load_column)[['area', 'weight']]
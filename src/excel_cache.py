@@ -0,0 +1,118 @@
+import os, json, hashlib
+import pandas as pd
+
+# Excelワークブックの解析結果キャッシュ
+# ワークブックの内容ハッシュごとにディレクトリを作り、
+#   - コンポーネントシート → PyPSAのNetCDF (network.nc)
+#   - 個別シート（Demandなど） → Parquet (sheet_<名前>_<引数ハッシュ>.parquet)
+# として保存する。xlsxの更新日時・サイズが変わった場合のみ再ハッシュし、
+# 内容が変わっていればキャッシュを作り直す。
+# キャッシュのキーにはファイル名だけでなく絶対パスのハッシュも含め、同じ名前の別ファイル
+# （合成ネットワークの network.xlsx など）が互いのキャッシュを上書きしないようにする。
+# 古い内容のキャッシュは削除しない（並列実行中の他のプロセスが読んでいる可能性があるため）。
+
+DEFAULT_CACHE_DIR = './data/cache'
+
+
+def _hash_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _path_key(file_name):
+    # ファイル名と絶対パスのハッシュから作るキャッシュのキー
+    path = os.path.realpath(file_name)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{hashlib.sha256(path.encode('utf-8')).hexdigest()[:8]}"
+
+
+def file_fingerprint(file_name, cache_dir=None):
+    """
+    ワークブックの内容ハッシュ(sha256)を返す
+
+    更新日時とサイズが前回と同じなら保存済みのハッシュを再利用し、
+    異なる場合だけファイル全体を読み直してハッシュを計算する。
+
+    Args:
+        file_name: Excelファイルのパス
+        cache_dir: キャッシュディレクトリ（省略時は ./data/cache）
+    """
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(file_name)
+    index_file = os.path.join(cache_dir, f'{_path_key(file_name)}.json')
+
+    meta = {}
+    if os.path.exists(index_file):
+        with open(index_file, encoding='utf-8') as f:
+            meta = json.load(f)
+    if meta.get('mtime') == stat.st_mtime and meta.get('size') == stat.st_size and 'sha256' in meta:
+        return meta['sha256']
+
+    sha = _hash_file(file_name)
+    tmp_file = f'{index_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'path': os.path.realpath(file_name), 'mtime': stat.st_mtime,
+                   'size': stat.st_size, 'sha256': sha}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_file, index_file)
+    return sha
+
+
+def _workbook_cache_dir(file_name, cache_dir=None):
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    sha = file_fingerprint(file_name, cache_dir)
+    path = os.path.join(cache_dir, f'{_path_key(file_name)}-{sha[:16]}')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_excel_sheet(file_name, sheet_name, cache_dir=None, **read_kwargs):
+    """
+    pd.read_excelのキャッシュ付き版。2回目以降はParquetから読み込む
+
+    Args:
+        file_name: Excelファイルのパス
+        sheet_name: シート名
+        cache_dir: キャッシュディレクトリ（省略時は ./data/cache）
+        **read_kwargs: pd.read_excelにそのまま渡す引数（キャッシュキーにも含める）
+    """
+    key = hashlib.sha256(repr(sorted(read_kwargs.items())).encode('utf-8')).hexdigest()[:8]
+    cache_file = os.path.join(_workbook_cache_dir(file_name, cache_dir), f'sheet_{sheet_name}_{key}.parquet')
+    if os.path.exists(cache_file):
+        return pd.read_parquet(cache_file)
+
+    df = pd.read_excel(file_name, sheet_name=sheet_name, **read_kwargs)
+    # Parquetは文字列の列名しか扱えないため変換してから保存
+    df.columns = [str(c) for c in df.columns]
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    df.to_parquet(tmp_file)
+    os.replace(tmp_file, cache_file)
+    return df
+
+
+def load_network(file_name, cache_dir=None):
+    """
+    Excelワークブックから PyPSA Network を読み込む（NetCDFキャッシュ付き）
+
+    初回は pypsa.Network(file_name) でExcelを解析してNetCDFに保存し、
+    以降は同じ内容のワークブックであればNetCDFから読み込む。
+
+    Args:
+        file_name: Excelファイルのパス
+        cache_dir: キャッシュディレクトリ（省略時は ./data/cache）
+    """
+    import pypsa
+
+    cache_file = os.path.join(_workbook_cache_dir(file_name, cache_dir), 'network.nc')
+    if os.path.exists(cache_file):
+        return pypsa.Network(cache_file)
+
+    network = pypsa.Network(file_name)
+    # 並列実行時に書きかけのファイルを読まないよう、一時ファイル経由で保存
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    network.export_to_netcdf(tmp_file)
+    os.replace(tmp_file, cache_file)
+    return network
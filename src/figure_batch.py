@@ -0,0 +1,230 @@
+import os, sys, json, time, glob, hashlib, inspect, argparse, warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .excel_cache import _hash_file
+
+# 結果ネットワーク（.nc）の図を一括で描画する（夜間実行など、画面のない環境用）
+# - ワーカープロセスで非対話バックエンド（Agg）を使い、plt.show() せずにファイルに保存する
+# - 1つのネットワークの図は同じワーカーでまとめて描画する（.nc の読み込みは1回）
+# - 出力先（combined_plots/）の .render_manifest.json に、図ごとの入力（.nc の内容ハッシュ、
+#   描画関数のソース、形式・解像度）のキーを記録し、変わっていない図は描画しない
+# - 日本語フォントはワーカーごとに1回だけ設定する（analyze_results.setup_japanese_font）
+#
+# 実行例:
+#   python -m src.figure_batch complete_network --formats png svg --workers 4
+
+# 図の名前 → analyze_results の描画関数名
+FIGURES = {
+    'generation_by_carrier': 'plot_total_generation_by_carrier',
+    'generation_by_bus': 'plot_generation_by_bus',
+    'generation_mix': 'plot_generation_mix_in_total_in_pie_graph',
+}
+DEFAULT_OUTPUT_DIR = 'combined_plots'
+MANIFEST_NAME = '.render_manifest.json'
+
+
+def network_files(sources):
+    """
+    .nc ファイルとディレクトリ（直下の *.nc）のリストを .nc ファイルのリストにする
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            files += sorted(glob.glob(os.path.join(source, '*.nc')))
+        else:
+            files.append(source)
+    return files
+
+
+def figure_path(network_file, figure, fmt, output_dir=DEFAULT_OUTPUT_DIR):
+    # combined_plots/<ネットワーク名>_<図の名前>.<形式>
+    stem = os.path.splitext(os.path.basename(network_file))[0]
+    return os.path.join(output_dir, f'{stem}_{figure}.{fmt}')
+
+
+def _load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {'figures': {}, 'files': {}}
+
+
+def _save_manifest(manifest, output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_file = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_file, path)
+
+
+def _file_hash(path, manifest):
+    # 更新日時とサイズが前回と同じなら保存済みのハッシュを再利用する
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    meta = manifest['files'].get(key)
+    if meta and meta['mtime'] == stat.st_mtime and meta['size'] == stat.st_size:
+        return meta['sha256']
+    sha = _hash_file(path)
+    manifest['files'][key] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': sha}
+    return sha
+
+
+def _code_hashes():
+    # 描画関数と集計処理（aggregation.py）のソースのハッシュ（どちらかを修正した図は描き直す）
+    from . import analyze_results, aggregation
+    shared = inspect.getsource(aggregation)
+    return {figure: hashlib.sha256((inspect.getsource(getattr(analyze_results, function)) + shared)
+                                   .encode('utf-8')).hexdigest()
+            for figure, function in FIGURES.items()}
+
+
+def _figure_key(network_sha, figure, fmt, dpi, code_hash):
+    payload = json.dumps({'network': network_sha, 'figure': figure, 'format': fmt, 'dpi': dpi, 'code': code_hash},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _init_worker():
+    # ワーカープロセスを非対話バックエンドに切り替える
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    warnings.filterwarnings('ignore', category=UserWarning, module='pypsa')
+    # 日本語フォントがない環境では文字ごとに警告が出るため抑制する（フォントの警告は1回だけ表示される）
+    warnings.filterwarnings('ignore', message='Glyph .* missing from')
+
+
+def _render_network(network_file, jobs, dpi):
+    # ワーカープロセスで1つのネットワークの図をまとめて描画する
+    import pypsa, logging
+    import matplotlib.pyplot as plt
+    from . import analyze_results
+
+    logging.getLogger('pypsa').setLevel(logging.WARNING)
+    t0 = time.time()
+    network = pypsa.Network(network_file)
+    written = []
+    for figure, fmt, path in jobs:
+        fig = getattr(analyze_results, FIGURES[figure])(network, show=False)
+        if fig is None:
+            continue
+        tmp_file = f'{path}.{os.getpid()}.tmp.{fmt}'
+        fig.savefig(tmp_file, dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+        os.replace(tmp_file, path)
+        written.append(path)
+    return written, time.time() - t0
+
+
+def render_figures(sources, output_dir=DEFAULT_OUTPUT_DIR, figures=None, formats=('png',), dpi=150, workers=None,
+                   force=False):
+    """
+    結果ネットワークの図を並列に描画してファイルに保存する（入力が変わっていない図はスキップ）
+
+    Args:
+        sources: .nc ファイルまたはディレクトリ（のリスト）
+        output_dir: 保存先ディレクトリ
+        figures: 描画する図の名前のリスト（FIGURES のキー。省略時は全て）
+        formats: 保存形式（'png', 'svg' など）
+        dpi: PNGの解像度
+        workers: 並列ワーカー数（省略時はCPU数とネットワーク数の小さい方。1の場合はこのプロセスで描画する）
+        force: Trueの場合は全ての図を描き直す
+
+    Returns:
+        {'written': 保存したファイル, 'skipped': スキップしたファイル, 'failed': {.nc: エラー}}
+    """
+    figures = list(figures or FIGURES)
+    unknown = [f for f in figures if f not in FIGURES]
+    if unknown:
+        raise ValueError(f"不明な図: {unknown}（{list(FIGURES)} のいずれか）")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+    code_hashes = _code_hashes()
+
+    # 描画が必要な図をネットワークごとにまとめる
+    pending, keys, skipped = {}, {}, []
+    files = network_files(sources)
+    stems = [os.path.splitext(os.path.basename(f))[0] for f in files]
+    duplicated = sorted({stem for stem in stems if stems.count(stem) > 1})
+    if duplicated:
+        raise ValueError(f"ファイル名が重複しているため図の保存先が重なります: {duplicated} "
+                         "(output_dir を分けて実行してください)")
+    for network_file in files:
+        network_sha = _file_hash(network_file, manifest)
+        for figure in figures:
+            for fmt in formats:
+                path = figure_path(network_file, figure, fmt, output_dir)
+                key = _figure_key(network_sha, figure, fmt, dpi, code_hashes[figure])
+                if not force and os.path.exists(path) and manifest['figures'].get(path) == key:
+                    skipped.append(path)
+                    continue
+                pending.setdefault(network_file, []).append((figure, fmt, path))
+                keys[path] = key
+
+    n_figures = sum(len(jobs) for jobs in pending.values())
+    if workers is None:
+        workers = min(os.cpu_count() or 1, max(1, len(pending)))
+    print(f"図: 描画 {n_figures}枚（{len(pending)}ネットワーク）, スキップ {len(skipped)}枚, ワーカー数: {workers}")
+
+    written, failed = [], {}
+
+    def done(network_file, result):
+        paths, elapsed = result
+        written.extend(paths)
+        for path in paths:
+            manifest['figures'][path] = keys[path]
+        # ネットワークごとに保存し、途中で止めても描画済みの図は描き直さない
+        _save_manifest(manifest, output_dir)
+        print(f"  ✓ {network_file}: {len(paths)}枚 ({elapsed:.1f}秒)")
+
+    if workers == 1:
+        # このプロセスで描画する。描画中は非対話バックエンド（Agg）に切り替え、終わったら元に戻す
+        import matplotlib
+        import matplotlib.pyplot as plt
+        backend = matplotlib.get_backend()
+        with warnings.catch_warnings():
+            _init_worker()
+            try:
+                for network_file, jobs in pending.items():
+                    try:
+                        done(network_file, _render_network(network_file, jobs, dpi))
+                    except Exception as e:
+                        failed[network_file] = str(e)
+                        print(f"  ✗ {network_file}: {e}")
+            finally:
+                if backend.lower() != 'agg':
+                    plt.switch_backend(backend)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = {executor.submit(_render_network, network_file, jobs, dpi): network_file
+                       for network_file, jobs in pending.items()}
+            for future in as_completed(futures):
+                network_file = futures[future]
+                try:
+                    done(network_file, future.result())
+                except Exception as e:
+                    failed[network_file] = str(e)
+                    print(f"  ✗ {network_file}: {e}")
+
+    _save_manifest(manifest, output_dir)
+    return {'written': written, 'skipped': skipped, 'failed': failed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='結果ネットワーク（.nc）の図を一括で描画する')
+    parser.add_argument('sources', nargs='*', default=['complete_network'], help='.nc ファイルまたはディレクトリ')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--figures', nargs='+', choices=list(FIGURES))
+    parser.add_argument('--formats', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'])
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help='全ての図を描き直す')
+    args = parser.parse_args(argv)
+    result = render_figures(args.sources, args.output_dir, args.figures, args.formats, args.dpi, args.workers,
+                            args.force)
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
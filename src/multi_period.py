@@ -0,0 +1,269 @@
+import numpy as np, pandas as pd
+from .stage_timer import stage_timer
+from .time_aggregation import _time_series_frames
+
+# 複数の投資期間（2030, 2040, 2050 など）を1つのネットワークで最適化する
+# スナップショットは (period, timestep) のマルチインデックスで、各期間の時系列データは
+# build_network() と同じ読み込み処理（需要変化率・太陽光・水力、必要なら代表日）で期間ごとに作る。
+# investment_period_weightings には期間の年数と割引後の重みを設定する。
+# - 既存設備（V6では全て p_nom 固定）は全期間で使える
+# - extendable_carriers を指定すると、バス×キャリアごとに各期間の新設候補（build_year=期間,
+#   lifetime 年）を追加する。前の期間に建てた設備は後の期間でも使えるので、設備の判断が期間を
+#   またいでつながる
+# - 揚水の貯水量は期間ごとに初期化する（年ごとに解く場合と同じ条件で比較できるようにする）
+# 期間ごとの構築時間・メモリと、年ごとに解いた場合との比較は compare_with_per_year() で行う。
+
+DEFAULT_PERIODS = (2030, 2040, 2050)
+DEFAULT_DEMAND_CHANGES = {2024: 0, 2030: 10, 2040: 20, 2050: 30}
+
+
+def period_weightings(periods, discount_rate=0.0, last_period_years=None):
+    """
+    投資期間の重み（years: 期間の年数, objective: 期間内の各年の割引係数の合計）
+
+    Args:
+        periods: 投資期間（年）のリスト
+        discount_rate: 割引率（0.02 なら 2%/年。基準年は最初の期間）
+        last_period_years: 最後の期間の年数（省略時は直前の期間の間隔。期間が1つなら1年）
+    """
+    periods = list(periods)
+    gaps = list(np.diff(periods))
+    if last_period_years is None:
+        last_period_years = gaps[-1] if gaps else 1
+    years = pd.Series(gaps + [last_period_years], index=periods, dtype=float)
+    objective = pd.Series({
+        period: sum(1 / (1 + discount_rate) ** (period - periods[0] + t) for t in range(int(years[period])))
+        for period in periods
+    })
+    return pd.DataFrame({'objective': objective, 'years': years})
+
+
+def _add_expansion_candidates(network, carriers, periods, lifetime):
+    # バス×キャリアごとに、既存の発電機（先頭の1台）の諸元を写した新設候補を期間ごとに追加する
+    generators = network.generators[network.generators['carrier'].isin(carriers)]
+    if generators.empty:
+        print(f"  ⚠ 新設候補のキャリアの発電機がありません: {list(carriers)}")
+        return []
+    templates = generators.rename_axis('name').reset_index().groupby(['bus', 'carrier'], sort=False).first().reset_index()
+    p_max_pu = network.generators_t.p_max_pu
+    added = []
+    for period in periods:
+        names = pd.Index([f"{bus} {carrier} 新設{period}" for bus, carrier in zip(templates['bus'], templates['carrier'])])
+        static = templates.set_index(names).drop(columns=['name'])
+        static = static.assign(p_nom=0.0, p_nom_min=0.0, p_nom_max=np.inf, p_nom_extendable=True,
+                               build_year=period, lifetime=lifetime)
+        network.add('Generator', names, **{k: v for k, v in static.items() if k in network.generators.columns})
+        # 稼働率の時系列（太陽光・水力）は写し元と同じにする
+        source = templates['name'].to_numpy()
+        has_series = np.isin(source, p_max_pu.columns)
+        if has_series.any():
+            series = p_max_pu[source[has_series]].set_axis(names[has_series], axis=1)
+            network.generators_t.p_max_pu = pd.concat([network.generators_t.p_max_pu, series], axis=1)
+        added += list(names)
+    print(f"  ✓ 新設候補を追加しました: {len(added)}台（{len(templates)}地点 × {len(periods)}期間）")
+    return added
+
+
+def build_multi_period_network(file_name, periods=DEFAULT_PERIODS, demand_changes=None,
+                               start='04-01 00:00', end='04-14 23:00',
+                               solar_data_file='./data/processed/solar_time_series.parquet',
+                               hydro_data_file='./data/processed/hydro_hourly.parquet',
+                               representative_days=None, discount_rate=0.0, extendable_carriers=None,
+                               lifetime=30, records=None):
+    """
+    投資期間ごとの時系列データを持つマルチインデックスのネットワークを構築する
+
+    Args:
+        file_name: ネットワーク＋需要データを含むExcelファイル（V6など）
+        periods: 投資期間（年）のリスト
+        demand_changes: 年→需要変化率(%, 2024年比)の辞書（省略時はノートブックと同じ値）
+        start, end: 各期間の期間（月日時刻）
+        solar_data_file, hydro_data_file: 時系列データのファイルパス
+        representative_days: 指定した場合、各期間をその数の代表日に時間集約する
+        discount_rate: 期間の重みの割引率
+        extendable_carriers: 新設候補を追加するキャリアのリスト（例: ['太陽光', '火力（ガス）']）
+        lifetime: 新設候補の耐用年数
+        records: 期間ごとの構築時間・メモリの計測結果を追加するリスト（stage_timer の形式）
+
+    Returns:
+        PyPSA Network object（snapshots は (period, timestep) のマルチインデックス）
+    """
+    from .excel_cache import load_network
+    from .preprocess_data import build_network
+
+    periods = sorted(periods)
+    demand_changes = DEFAULT_DEMAND_CHANGES if demand_changes is None else demand_changes
+    records = [] if records is None else records
+
+    # 期間ごとに通常の1年分と同じ方法で時系列データを読み込む
+    period_networks = {}
+    for period in periods:
+        with stage_timer(f'build_{period}', records) as record:
+            period_networks[period] = build_network(file_name, period, demand_changes.get(period, 0), start=start,
+                                                    end=end, solar_data_file=solar_data_file,
+                                                    hydro_data_file=hydro_data_file,
+                                                    representative_days=representative_days)
+        record['period'] = period
+
+    with stage_timer('build_multi_period', records) as record:
+        network = load_network(file_name)
+        snapshots = pd.MultiIndex.from_tuples(
+            [(period, t) for period in periods for t in period_networks[period].snapshots],
+            names=['period', 'timestep'])
+        network.set_snapshots(snapshots)
+        network.set_investment_periods(periods)
+        network.snapshot_weightings = pd.concat(
+            [period_networks[period].snapshot_weightings for period in periods]).set_axis(network.snapshots)
+        network.investment_period_weightings = period_weightings(periods, discount_rate)
+
+        # 時系列データを期間の順に連結する
+        first = period_networks[periods[0]]
+        for c, attr, df in _time_series_frames(first):
+            frames = [period_networks[period].components[c.name].dynamic[attr][df.columns] for period in periods]
+            network.components[c.name].dynamic[attr] = pd.concat(frames).set_axis(network.snapshots)
+
+        # 揚水の貯水量は期間ごとに初期値から始める
+        if not network.stores.empty:
+            network.stores['e_initial_per_period'] = True
+            network.stores['e_cyclic_per_period'] = network.stores['e_cyclic']
+        if extendable_carriers:
+            _add_expansion_candidates(network, extendable_carriers, periods, lifetime)
+        record['period'] = 'all'
+
+    print(f"✓ 投資期間 {periods} のネットワークを構築しました ({len(network.snapshots)}スナップショット)")
+    return network
+
+
+def model_size_by_period(model):
+    """
+    期間ごとの変数・制約の数（スナップショットの次元を持つもの。設備容量の変数などは含まない）
+    """
+    sizes = {}
+    for kind, container in (('variables', model.variables), ('constraints', model.constraints)):
+        counts = None
+        for name in container:
+            labels = container[name].labels
+            if 'snapshot' not in labels.dims:
+                continue
+            valid = (labels >= 0).sum([d for d in labels.dims if d != 'snapshot'])
+            count = valid.to_series().groupby(level='period').sum()
+            counts = count if counts is None else counts.add(count, fill_value=0)
+        sizes[kind] = counts
+    return pd.DataFrame(sizes).fillna(0).astype(int)
+
+
+def operating_cost_by_period(network):
+    """
+    期間ごとの運転費（限界費用 × 出力 × snapshot_weightings['objective']、期間の重みは掛けない）
+
+    投資期間のない（1年分の）ネットワークの場合は運転費の合計を返す。
+    """
+    weights = network.snapshot_weightings['objective']
+    cost = pd.Series(0.0, index=network.snapshots)
+    for list_name, attr in (('generators', 'p'), ('links', 'p0'), ('storage_units', 'p_dispatch'), ('stores', 'p')):
+        static = getattr(network, list_name)
+        dispatch = getattr(network, f'{list_name}_t')[attr]
+        if static.empty or dispatch.empty:
+            continue
+        marginal = pd.DataFrame(np.broadcast_to(static['marginal_cost'].to_numpy(), (len(network.snapshots), len(static))),
+                                index=network.snapshots, columns=static.index)
+        varying = getattr(network, f'{list_name}_t').get('marginal_cost')
+        if varying is not None and not varying.empty:
+            marginal.update(varying)
+        cost += (dispatch * marginal.reindex(columns=dispatch.columns)).sum(axis=1)
+    cost = cost.mul(weights)
+    if not isinstance(network.snapshots, pd.MultiIndex):
+        return cost.sum()
+    return cost.groupby(level='period').sum()
+
+
+def optimize_multi_period(network, solver_options=None, extra_functionality=None, records=None):
+    """
+    複数投資期間のネットワークを1回で最適化する
+
+    Args:
+        network: build_multi_period_network() で構築したネットワーク
+        solver_options: HiGHSに渡すオプション
+        extra_functionality: 追加制約関数
+        records: 計測結果（model_build, optimize）を追加するリスト
+
+    Returns:
+        期間ごとの結果（運転費、変数・制約の数、新設容量）のDataFrame（attrs に全体のステータスと目的関数値）
+    """
+    records = [] if records is None else records
+    with stage_timer('model_build', records) as record:
+        model = network.optimize.create_model(multi_investment_periods=True)
+        if extra_functionality is not None:
+            extra_functionality(network, network.snapshots)
+        record['period'] = 'all'
+    sizes = model_size_by_period(model)
+    with stage_timer('optimize', records) as record:
+        status, condition = network.optimize.solve_model(solver_name='highs', solver_options=solver_options or {})
+        record['period'] = 'all'
+
+    result = sizes.copy()
+    if status == 'ok':
+        result['operating_cost'] = operating_cost_by_period(network)
+        new = network.generators[network.generators['p_nom_extendable']]
+        if not new.empty:
+            result['new_capacity_mw'] = new['p_nom_opt'].groupby(new['build_year']).sum().reindex(result.index,
+                                                                                                  fill_value=0.0)
+    result.attrs.update({'status': status, 'termination_condition': condition,
+                         'objective': network.objective if status == 'ok' else None})
+    print(f"  {'✓' if status == 'ok' else '✗'} 複数期間の最適化: {condition}")
+    return result
+
+
+def compare_with_per_year(file_name, periods=DEFAULT_PERIODS, demand_changes=None, start='04-01 00:00',
+                          end='04-14 23:00', solver_options=None, extra_functionality=None,
+                          **build_options):
+    """
+    年ごとに構築・最適化した場合と、複数期間を1回で最適化した場合を比較する
+
+    Args:
+        file_name, periods, demand_changes, start, end: build_multi_period_network() と同じ
+        solver_options: HiGHSに渡すオプション
+        extra_functionality: 追加制約関数
+        **build_options: build_multi_period_network() に渡すその他の引数（representative_days など）
+
+    Returns:
+        (期間ごとの比較表, 計測結果のDataFrame)
+        比較表の列: per_year_cost, multi_period_cost（年ごと・複数期間の最適化の運転費。operating_cost_by_period()）,
+                    per_year_build/optimize の時間 [秒] と最大メモリ [MB], 複数期間モデルの変数・制約の数
+    """
+    from .preprocess_data import build_network
+
+    periods = sorted(periods)
+    demand_changes = DEFAULT_DEMAND_CHANGES if demand_changes is None else demand_changes
+    per_year_options = {k: v for k, v in build_options.items()
+                        if k in ('solar_data_file', 'hydro_data_file', 'representative_days')}
+    records, per_year = [], {}
+    print("年ごとの最適化")
+    for period in periods:
+        with stage_timer(f'per_year_build_{period}', records) as record:
+            network = build_network(file_name, period, demand_changes.get(period, 0), start=start, end=end,
+                                    **per_year_options)
+        record['period'] = period
+        with stage_timer(f'per_year_optimize_{period}', records) as record:
+            status, condition = network.optimize(solver_name='highs', solver_options=solver_options or {},
+                                                 extra_functionality=extra_functionality)
+        record['period'] = period
+        # 目的関数値には設備費なども含まれるため、複数期間と同じ運転費で比べる
+        per_year[period] = operating_cost_by_period(network) if status == 'ok' else np.nan
+
+    print("複数期間の最適化")
+    network = build_multi_period_network(file_name, periods, demand_changes, start, end, records=records,
+                                         **build_options)
+    result = optimize_multi_period(network, solver_options, extra_functionality, records)
+
+    timings = pd.DataFrame(records)
+    per_period = timings[timings['period'] != 'all'].copy()
+    per_period['kind'] = per_period['stage'].str.replace(r'_\d+$', '', regex=True)
+    table = per_period.pivot_table(index='period', columns='kind', values=['elapsed', 'peak_rss_mb'])
+    table.columns = [f'{kind}_{metric}' for metric, kind in table.columns]
+    table.insert(0, 'per_year_cost', pd.Series(per_year))
+    if 'operating_cost' in result:
+        table.insert(1, 'multi_period_cost', result['operating_cost'])
+    table = table.join(result[['variables', 'constraints']])
+    table.attrs.update(result.attrs)
+    return table, timings
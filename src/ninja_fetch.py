@@ -0,0 +1,202 @@
+import os, json, time, threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Renewables.Ninja API の取得レイヤー
+# - 通信部分（transport）は差し替え可能: 本番は http_transport、テストでは
+#   fixture_transport（JSONファイルのディレクトリ）やローカルのスタブサーバーを使う
+# - (lat, lon, year, dataset, tilt, azim) ごとにレスポンスをディスクにキャッシュし、
+#   取得できたものから順に保存する（途中で止まっても再実行で続きから取得できる）
+# - ワーカー数を制限したスレッドプールで並列に取得し、APIのレート制限を守る
+# - 429 / 5xx はバックオフ付きで再試行する
+
+NINJA_PV_URL = 'https://www.renewables.ninja/api/data/pv'
+DEFAULT_CACHE_DIR = './data/cache/ninja'
+
+
+def http_transport(api_key, url=NINJA_PV_URL, timeout=60):
+    """
+    Renewables.Ninja API（またはURLを指定したスタブサーバー）へのHTTP通信
+
+    Returns:
+        params を受け取り (ステータスコード, JSONデータ, Retry-After秒) を返す関数
+    """
+    import requests
+
+    session = requests.Session()
+    session.headers['Authorization'] = f'Token {api_key}'
+
+    def transport(params):
+        response = session.get(url, params=params, timeout=timeout)
+        retry_after = response.headers.get('Retry-After')
+        data = response.json() if response.status_code == 200 else None
+        return response.status_code, data, float(retry_after) if retry_after and retry_after.isdigit() else None
+
+    return transport
+
+
+def fixture_transport(directory):
+    """
+    キャッシュと同じファイル名のJSONを置いたディレクトリから応答を返す（テスト・オフライン用）
+    """
+    def transport(params):
+        path = os.path.join(directory, f'{cache_key(params)}.json')
+        if not os.path.exists(path):
+            return 404, None, None
+        with open(path, encoding='utf-8') as f:
+            return 200, json.load(f), None
+
+    return transport
+
+
+def cache_key(params):
+    # (lat, lon, year, dataset, tilt, azim) ごとのキャッシュファイル名
+    year = str(params['date_to'])[:4]
+    return (f"pv_{float(params['lat']):.4f}_{float(params['lon']):.4f}_{year}_"
+            f"{params['dataset']}_{params['tilt']}_{params['azim']}")
+
+
+def rate_limiter(requests_per_hour):
+    """
+    全スレッドで共有するレート制限（リクエスト間隔の下限）
+
+    Returns:
+        リクエストの前に呼ぶと、必要な時間だけ待つ関数
+    """
+    interval = 3600.0 / requests_per_hour if requests_per_hour else 0.0
+    lock = threading.Lock()
+    state = {'next': 0.0}
+
+    def wait():
+        with lock:
+            now = time.monotonic()
+            delay = state['next'] - now
+            state['next'] = max(now, state['next']) + interval
+        if delay > 0:
+            time.sleep(delay)
+
+    return wait
+
+
+def pv_params(lat, lon, year, dataset='merra2', tilt=35, azim=180):
+    # JSTへの変換で9時間進むため、前年の12/31（UTC）から取得する
+    return {
+        'lat': lat,
+        'lon': lon,
+        'date_from': f'{year - 1}-12-31',
+        'date_to': f'{year}-12-31',
+        'dataset': dataset,
+        'capacity': 1.0,
+        'system_loss': 0.1,
+        'tracking': 0,
+        'tilt': tilt,
+        'azim': azim,
+        'format': 'json'
+    }
+
+
+def fetch_cached(params, transport, cache_dir=DEFAULT_CACHE_DIR, limiter=None, max_retries=5, backoff=10.0):
+    """
+    1地点分のレスポンスを取得する（キャッシュがあればAPIを呼ばない）
+
+    Returns:
+        レスポンスのJSONデータ。取得できなかった場合は例外を送出する
+    """
+    path = os.path.join(cache_dir, f'{cache_key(params)}.json')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter()
+        try:
+            status, data, retry_after = transport(params)
+        except OSError as e:
+            # タイムアウト・接続エラーも5xxと同様に再試行する
+            status, data, retry_after = f'{type(e).__name__}: {e}', None, None
+        if status == 200:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_file = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_file, path)
+            return data
+        if isinstance(status, int) and status != 429 and status < 500:
+            break
+        if attempt < max_retries:
+            # 429 / 5xx はRetry-After（なければ指数バックオフ）だけ待って再試行
+            time.sleep(retry_after if retry_after is not None else backoff * 2 ** attempt)
+    raise RuntimeError(f'Renewables.Ninja request failed with status {status}')
+
+
+def parse_pv_response(data, annual_snapshots):
+    """
+    Renewables.Ninja のレスポンスをJSTの時系列（annual_snapshotsの範囲）に変換する
+    """
+    if not (isinstance(data, dict) and 'data' in data):
+        raise ValueError('Unexpected response format')
+    # 辞書形式のレスポンス (時刻がキーの場合)
+    if isinstance(data['data'], dict):
+        time_keys = list(data['data'].keys())
+        # キーが数値(Unix時間, ミリ秒)かどうか確認
+        if time_keys and str(time_keys[0]).isdigit():
+            time_index = pd.to_datetime([int(k) for k in time_keys], unit='ms')
+        else:
+            time_index = pd.to_datetime(time_keys)
+        # JSTに変換（UTC+9時間）
+        time_index = time_index.tz_localize('UTC').tz_convert('Asia/Tokyo').tz_localize(None)
+        values = list(data['data'].values())
+        # 辞書から数値を抽出 (PyPSA形式)
+        if values and isinstance(values[0], dict):
+            values = [v.get('electricity', v) if isinstance(v, dict) else v for v in values]
+        return pd.Series(values, index=time_index).reindex(annual_snapshots, fill_value=0)
+    # リスト形式のレスポンス (DataFrame変換可能な場合)
+    df_temp = pd.DataFrame(data['data'])
+    time_col = next((col for col in df_temp.columns if 'time' in col.lower()), None)
+    if time_col:
+        df_temp.index = pd.to_datetime(df_temp[time_col])
+    elec_col = next((col for col in df_temp.columns if 'electric' in col.lower() or 'power' in col.lower()),
+                    df_temp.columns[1] if len(df_temp.columns) > 1 else df_temp.columns[0])
+    return df_temp[elec_col].reindex(annual_snapshots, fill_value=0)
+
+
+def fetch_pv_time_series(bus_coords, year, transport, cache_dir=DEFAULT_CACHE_DIR, max_workers=4,
+                         requests_per_hour=50, dataset='merra2', tilt=35, azim=180):
+    """
+    複数バスの太陽光発電の時系列を並列に取得する
+
+    Args:
+        bus_coords: index=バス名、列 lat, lon のDataFrame
+        year: 対象年
+        transport: http_transport() / fixture_transport() などの通信関数
+        cache_dir: レスポンスのキャッシュディレクトリ
+        max_workers: 同時に取得するワーカー数
+        requests_per_hour: 1時間あたりの最大リクエスト数（キャッシュ済みの地点は数えない）
+        dataset, tilt, azim: Renewables.Ninja のパラメータ
+
+    Returns:
+        (年間の時系列DataFrame（列=取得できたバス）, 取得に失敗したバスとエラー内容の辞書)
+    """
+    annual_snapshots = pd.date_range(f"{year}-01-01 00:00", f"{year}-12-31 23:00", freq="h")
+    limiter = rate_limiter(requests_per_hour)
+
+    def _fetch(bus_name, lat, lon):
+        params = pv_params(lat, lon, year, dataset, tilt, azim)
+        return parse_pv_response(fetch_cached(params, transport, cache_dir, limiter), annual_snapshots)
+
+    columns, failed = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_fetch, bus_name, row['lat'], row['lon']): bus_name
+                   for bus_name, row in bus_coords.iterrows()}
+        for future in as_completed(futures):
+            bus_name = futures[future]
+            try:
+                columns[bus_name] = future.result()
+                print(f"  ✓ Success for {bus_name}")
+            except Exception as e:
+                failed[bus_name] = str(e)
+                print(f"  ✗ Failed for {bus_name}: {e}")
+
+    ordered = [bus for bus in bus_coords.index if bus in columns]
+    return pd.DataFrame({bus: columns[bus] for bus in ordered}, index=annual_snapshots), failed
@@ -0,0 +1,373 @@
+import os, sys, json, time, hashlib, fnmatch, argparse
+import pandas as pd
+from .excel_cache import DEFAULT_CACHE_DIR, _hash_file
+from .stage_timer import stage_timer
+
+# 前処理→最適化→分析→図 の増分パイプライン（ノートブックを使わずコマンドラインから実行）
+# 各段階（stage）は入力ファイル・出力ファイル・パラメータを宣言する。段階のキーは
+# 入力ファイルの内容ハッシュ（sha256）とパラメータから作り、前回の実行と同じキーで出力も
+# 変わっていなければ再実行しない。段階の依存関係は「ある段階の出力を別の段階が入力に持つ」
+# ことから決まる。例: hydro.xlsx を編集すると水力の時系列と、それを使う最適化・分析だけが
+# 再実行される（水力の時系列の内容が変わらなければ最適化も再実行しない）。
+# 実行状態は data/cache/pipeline.json に保存する。
+#
+# 実行例:
+#   python -m src.pipeline run --years 2024 2030
+#   python -m src.pipeline run --targets 'solve_*' --dry-run
+#   python -m src.pipeline status
+
+DEFAULT_STATE_FILE = os.path.join(DEFAULT_CACHE_DIR, 'pipeline.json')
+DEFAULT_DEMAND_CHANGES = {2024: 0, 2030: 10, 2040: 20, 2050: 30}
+
+
+def stage(name, run, inputs=(), outputs=(), params=None):
+    """
+    パイプラインの段階を定義する
+
+    Args:
+        name: 段階の名前（一意）
+        run: 引数なしで呼ぶ処理（出力ファイルを書き出すこと）
+        inputs: 入力ファイルのリスト
+        outputs: 出力ファイルのリスト
+        params: キーに含めるパラメータの辞書、または辞書を返す関数（実行直前に評価する）
+    """
+    return {'name': name, 'run': run, 'inputs': list(inputs), 'outputs': list(outputs), 'params': params or {}}
+
+
+def _load_state(state_file):
+    if os.path.exists(state_file):
+        with open(state_file, encoding='utf-8') as f:
+            return json.load(f)
+    return {'stages': {}, 'files': {}}
+
+
+def _save_state(state, state_file):
+    os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+    tmp_file = f'{state_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_file, state_file)
+
+
+def _file_hash(path, state):
+    # 更新日時とサイズが前回と同じなら保存済みのハッシュを再利用する
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    meta = state['files'].get(key)
+    if meta and meta['mtime'] == stat.st_mtime and meta['size'] == stat.st_size:
+        return meta['sha256']
+    sha = _hash_file(path)
+    state['files'][key] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': sha}
+    return sha
+
+
+def _stage_key(item, state):
+    params = item['params']() if callable(item['params']) else item['params']
+    payload = {
+        # functools.partial の場合は元の関数名（reprにはアドレスが含まれるため）
+        'run': getattr(getattr(item['run'], 'func', item['run']), '__qualname__', None),
+        'params': params,
+        'inputs': {path: _file_hash(path, state) for path in item['inputs']},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _order(stages):
+    # 出力→段階の対応から依存関係を作り、トポロジカル順に並べる
+    producers = {}
+    for item in stages:
+        for path in item['outputs']:
+            if path in producers:
+                raise ValueError(f"出力ファイルが複数の段階で重複しています: {path} "
+                                 f"({producers[path]}, {item['name']})")
+            producers[path] = item['name']
+    by_name = {item['name']: item for item in stages}
+    if len(by_name) != len(stages):
+        raise ValueError('段階の名前が重複しています')
+    upstream = {item['name']: sorted({producers[p] for p in item['inputs'] if p in producers}) for item in stages}
+
+    ordered, visiting, done = [], set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"段階の依存関係が循環しています: {name}")
+        visiting.add(name)
+        for parent in upstream[name]:
+            visit(parent)
+        visiting.discard(name)
+        done.add(name)
+        ordered.append(by_name[name])
+
+    for item in stages:
+        visit(item['name'])
+    return ordered, upstream
+
+
+def _select(stages, upstream, targets):
+    # 対象の段階（名前のパターン）と、その上流の段階
+    if not targets:
+        return {item['name'] for item in stages}
+    selected, stack = set(), [item['name'] for item in stages
+                              if any(fnmatch.fnmatch(item['name'], t) for t in targets)]
+    if not stack:
+        raise ValueError(f"対象の段階が見つかりません: {targets}")
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(upstream[name])
+    return selected
+
+
+def run_pipeline(stages, targets=None, force=(), dry_run=False, state_file=DEFAULT_STATE_FILE):
+    """
+    変更のあった段階とその下流だけを実行する
+
+    Args:
+        stages: stage() で定義した段階のリスト（順不同）
+        targets: 実行する段階の名前のパターン（例: ['solve_*']。上流も含む。省略時は全段階）
+        force: キーが同じでも再実行する段階の名前のパターン
+        dry_run: Trueの場合は実行せず、実行される段階だけを表示する
+        state_file: 実行状態の保存先
+
+    Returns:
+        段階ごとの結果（status: 'skipped', 'ran', 'failed', 'blocked', 'pending'）のDataFrame
+    """
+    ordered, upstream = _order(stages)
+    selected = _select(ordered, upstream, targets)
+    state = _load_state(state_file)
+    results, status_by_name = [], {}
+
+    for item in ordered:
+        name = item['name']
+        if name not in selected:
+            continue
+        record = {'stage': name, 'status': None, 'reason': '', 'elapsed': None, 'peak_rss_mb': None}
+        results.append(record)
+
+        blocked = [p for p in upstream[name] if status_by_name.get(p) in ('failed', 'blocked')]
+        if blocked:
+            record.update(status='blocked', reason=f"上流の段階が失敗: {', '.join(blocked)}")
+            status_by_name[name] = 'blocked'
+            print(f"  ✗ {name}: {record['reason']}")
+            continue
+        if dry_run and any(status_by_name.get(p) == 'pending' for p in upstream[name]):
+            # 上流が未実行の場合は入力の内容が分からないため、実行されるものとして扱う
+            record.update(status='pending', reason='上流の段階が実行される')
+            status_by_name[name] = 'pending'
+            print(f"  → {name}: {record['reason']}")
+            continue
+        missing = [p for p in item['inputs'] if not os.path.exists(p)]
+        if missing:
+            record.update(status='failed', reason=f"入力ファイルがありません: {missing}")
+            status_by_name[name] = 'failed'
+            print(f"  ✗ {name}: {record['reason']}")
+            continue
+
+        key = _stage_key(item, state)
+        previous = state['stages'].get(name, {})
+        if any(fnmatch.fnmatch(name, pattern) for pattern in force):
+            reason = '強制再実行'
+        elif previous.get('key') != key:
+            reason = '新規' if not previous else '入力またはパラメータの変更'
+        elif not all(os.path.exists(p) for p in item['outputs']):
+            reason = '出力ファイルがない'
+        elif any(_file_hash(p, state) != previous['outputs'].get(p) for p in item['outputs']):
+            reason = '出力ファイルが変更された'
+        else:
+            record['status'] = status_by_name[name] = 'skipped'
+            print(f"  ✓ {name}: 変更なし（スキップ）")
+            continue
+
+        record['reason'] = reason
+        if dry_run:
+            record['status'] = status_by_name[name] = 'pending'
+            print(f"  → {name}: {reason}")
+            continue
+
+        print(f"  ▶ {name}: {reason}")
+        try:
+            for path in item['outputs']:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with stage_timer(name, verbose=False) as timing:
+                item['run']()
+            missing = [p for p in item['outputs'] if not os.path.exists(p)]
+            if missing:
+                raise RuntimeError(f"出力ファイルが作成されませんでした: {missing}")
+        except Exception as e:
+            record.update(status='failed', reason=f'{type(e).__name__}: {e}')
+            status_by_name[name] = 'failed'
+            print(f"  ✗ {name}: {record['reason']}")
+            continue
+
+        state['stages'][name] = {
+            'key': key,
+            'outputs': {p: _file_hash(p, state) for p in item['outputs']},
+            'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'elapsed': timing['elapsed'],
+        }
+        # 段階ごとに保存し、途中で止めても完了した段階は再実行しない
+        _save_state(state, state_file)
+        record.update(status='ran', elapsed=timing['elapsed'], peak_rss_mb=timing['peak_rss_mb'])
+        status_by_name[name] = 'ran'
+        print(f"  ✓ {name}: 完了 ({timing['elapsed']:.1f}秒)")
+
+    _save_state(state, state_file)
+    return pd.DataFrame(results)
+
+
+def pipeline_status(stages, state_file=DEFAULT_STATE_FILE):
+    """
+    各段階の最終実行日時と、現在の入力で再実行が必要かどうかを返す
+    """
+    ordered, upstream = _order(stages)
+    state = _load_state(state_file)
+    rows = []
+    for item in ordered:
+        previous = state['stages'].get(item['name'], {})
+        ready = all(os.path.exists(p) for p in item['inputs'])
+        stale = not previous or not ready or previous['key'] != _stage_key(item, state) \
+            or not all(os.path.exists(p) for p in item['outputs'])
+        rows.append({'stage': item['name'], 'updated': previous.get('updated'), 'stale': stale,
+                     'upstream': ', '.join(upstream[item['name']])})
+    _save_state(state, state_file)
+    return pd.DataFrame(rows)
+
+
+def _solar_bus_coords(file_name):
+    # 太陽光の取得に使うバスの座標（ワークブックの他のシートを編集しても再取得しないよう、座標だけをキーにする）
+    from .excel_cache import read_excel_sheet
+    buses = read_excel_sheet(file_name, 'buses').set_index('name')
+    if 'carrier' in buses.columns:
+        buses = buses[buses['carrier'] == 'AC']
+    return buses[['y', 'x']].dropna().round(6).to_dict(orient='index')
+
+
+def _solve(file_name, year, demand_change, output_dir, output_template, options):
+    from .scenario_runner import make_cases, run_scenarios
+    cases = make_cases([year], [demand_change], file_name)
+    summary = run_scenarios(cases, output_dir=output_dir, output_template=output_template, workers=1,
+                            resume=False, **options)
+    if (summary['status'] != 'ok').any():
+        raise RuntimeError(f"最適化に失敗しました: {summary['termination_condition'].iloc[0]}")
+
+
+def _export_energy_balance(network_file, output_file):
+    import pypsa
+    from .aggregation import export_energy_balance
+    export_energy_balance(pypsa.Network(network_file), output_file)
+
+
+def default_pipeline(file_name='./data/raw/pypsa-japan-10BusModelV6.xlsx', analysis_years=(2024, 2030, 2040, 2050),
+                     demand_changes=None, start='04-01 00:00', end='04-14 23:00',
+                     hydro_file='./data/raw/hydro.xlsx', hydro_data_file='./data/processed/hydro_hourly.csv',
+                     solar_data_file='./data/processed/solar_time_series.csv', solar_year=2024,
+                     renewable_ninja_api_key=None, output_dir='complete_network',
+                     output_template='optimized_network_{year}.nc', solver_options=None, highs_threads=1,
+                     plot_dir='combined_plots', figure_formats=('png',)):
+    """
+    ノートブックと同じ処理の段階を定義する
+
+    段階:
+        solar_fetch: Renewable.Ninja APIから太陽光の時系列を取得（APIキーを指定した場合のみ。
+                     指定しない場合は既存のCSVを入力とし、solar_store でストアに変換する）
+        hydro_profile: hydro.xlsx（日別）→ hydro_hourly.csv とストア
+        solve_{年}: ネットワーク構築→最適化→.nc（scenario_runner で実行し、.json にサマリーを保存）
+        energy_balance_{年}: .nc → キャリア×バス別の出力（aggregation.export_energy_balance）
+        figures_{年}: .nc → combined_plots/ の図（figure_batch.render_figures）
+
+    Args:
+        file_name: ネットワーク＋需要データを含むExcelファイル
+        analysis_years: 分析対象年のリスト
+        demand_changes: 年→需要変化率(%)の辞書（省略時はノートブックと同じ値）
+        start, end: 最適化期間（月日時刻）
+        renewable_ninja_api_key: 太陽光を取得する場合のAPIキー
+        その他: 各ファイルのパスと最適化の設定
+    """
+    from functools import partial
+    from .preprocess_data import GetSolarTimeSeriesData, convert_hydro_daily_to_hourly
+    from .profile_store import convert_csv_to_store, store_path_for
+    from .figure_batch import FIGURES, figure_path, render_figures
+
+    demand_changes = DEFAULT_DEMAND_CHANGES if demand_changes is None else demand_changes
+    solar_store, hydro_store = store_path_for(solar_data_file), store_path_for(hydro_data_file)
+    solver_options = dict(solver_options or {})
+    stages = []
+
+    if renewable_ninja_api_key:
+        stages.append(stage('solar_fetch',
+                            partial(GetSolarTimeSeriesData, file_name, solar_data_file, solar_year,
+                                    renewable_ninja_api_key),
+                            outputs=[solar_data_file, solar_store],
+                            params=lambda: {'year': solar_year, 'buses': _solar_bus_coords(file_name)}))
+    else:
+        stages.append(stage('solar_store', partial(convert_csv_to_store, solar_data_file, solar_store),
+                            inputs=[solar_data_file], outputs=[solar_store]))
+    stages.append(stage('hydro_profile', partial(convert_hydro_daily_to_hourly, hydro_file, hydro_data_file),
+                        inputs=[hydro_file], outputs=[hydro_data_file, hydro_store]))
+
+    options = {'start': start, 'end': end, 'solar_data_file': solar_store, 'hydro_data_file': hydro_store,
+               'solver_options': solver_options, 'highs_threads': highs_threads}
+    for year in analysis_years:
+        demand_change = demand_changes.get(year, 0) if isinstance(demand_changes, dict) else demand_changes
+        workbook = os.path.splitext(os.path.basename(file_name))[0]
+        network_file = os.path.join(output_dir, output_template.format(year=year, demand_change=demand_change,
+                                                                        workbook=workbook))
+        stages.append(stage(f'solve_{year}',
+                            partial(_solve, file_name, year, demand_change, output_dir, output_template, options),
+                            inputs=[file_name, solar_store, hydro_store],
+                            outputs=[network_file, os.path.splitext(network_file)[0] + '.json'],
+                            params={'year': year, 'demand_change': demand_change, 'start': start, 'end': end,
+                                    'solver_options': {k: v for k, v in solver_options.items() if k != 'threads'}}))
+        stages.append(stage(f'energy_balance_{year}',
+                            partial(_export_energy_balance, network_file,
+                                    os.path.splitext(network_file)[0] + '_energy_balance.parquet'),
+                            inputs=[network_file],
+                            outputs=[os.path.splitext(network_file)[0] + '_energy_balance.parquet']))
+        stages.append(stage(f'figures_{year}',
+                            partial(render_figures, [network_file], plot_dir, formats=figure_formats, workers=1),
+                            inputs=[network_file],
+                            outputs=[figure_path(network_file, figure, fmt, plot_dir)
+                                     for figure in FIGURES for fmt in figure_formats],
+                            params={'formats': list(figure_formats)}))
+    return stages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='前処理→最適化→分析→図の増分パイプライン')
+    parser.add_argument('command', choices=['run', 'status'])
+    parser.add_argument('--file-name', default='./data/raw/pypsa-japan-10BusModelV6.xlsx')
+    parser.add_argument('--years', nargs='+', type=int, default=[2024, 2030, 2040, 2050])
+    parser.add_argument('--demand-change', type=float, default=None,
+                        help='全ての年に適用する需要変化率(%%)（省略時は年ごとの既定値）')
+    parser.add_argument('--start', default='04-01 00:00')
+    parser.add_argument('--end', default='04-14 23:00')
+    parser.add_argument('--output-dir', default='complete_network')
+    parser.add_argument('--threads', type=int, default=1, help='HiGHSのスレッド数')
+    parser.add_argument('--figure-formats', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'])
+    parser.add_argument('--targets', nargs='+', help="実行する段階（例: 'solve_*'）")
+    parser.add_argument('--force', nargs='+', default=[], help='再実行する段階')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--state-file', default=DEFAULT_STATE_FILE)
+    args = parser.parse_args(argv)
+
+    import warnings
+    warnings.filterwarnings('ignore', category=UserWarning, module='pypsa')
+    stages = default_pipeline(args.file_name, args.years,
+                              demand_changes=args.demand_change, start=args.start, end=args.end,
+                              renewable_ninja_api_key=os.environ.get('RENEWABLES_NINJA_API_KEY'),
+                              output_dir=args.output_dir, highs_threads=args.threads,
+                              figure_formats=args.figure_formats)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20, 'display.max_colwidth', 60):
+        if args.command == 'status':
+            print(pipeline_status(stages, args.state_file).to_string(index=False))
+            return 0
+        results = run_pipeline(stages, args.targets, args.force, args.dry_run, args.state_file)
+        print(results.to_string(index=False))
+    return 1 if (results['status'] == 'failed').any() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,51 +1,108 @@
 ##　TEST
 
-import os, pandas as pd, time
+import os, pandas as pd, numpy as np, time
 from IPython.display import clear_output, display
 from concurrent.futures import ThreadPoolExecutor
 import warnings, requests, re, shutil
 import matplotlib.pyplot as plt
+from .excel_cache import DEFAULT_CACHE_DIR, load_network, read_excel_sheet
+from .demand_allocation import allocate_demand, allocation_table
+from .ninja_fetch import http_transport, fetch_pv_time_series
+from .profile_store import open_profiles, profiles_exist, resolve_store, store_columns, store_path_for, write_profile_store
+
+# 2月29日を除外（閏年対応）
+def drop_leap_day(data):
+    return data[~((data.index.month == 2) & (data.index.day == 29))]
+
+
+def shift_year(index, year):
+    # 月日時刻を保持したまま年だけを変更する（全タイムスタンプを一括で変換。平年にない2月29日は NaT）
+    return pd.DatetimeIndex(pd.to_datetime(pd.DataFrame({
+        'year': np.full(len(index), year),
+        'month': index.month, 'day': index.day,
+        'hour': index.hour, 'minute': index.minute,
+    }), errors='coerce'))
+
+
+def align_to_snapshots(data, snapshots):
+    """
+    時系列データ全体の年をスナップショットの年に置き換え、1回のreindexでスナップショットに合わせる
+
+    Args:
+        data: DatetimeIndexを持つDataFrame（2月29日は除外済みであること）
+        snapshots: network.snapshots
+    """
+    target_year = snapshots[0].year
+    base_year = data.index[0].year
+    if target_year != base_year:
+        data = data.set_axis(shift_year(data.index, target_year))
+        data = data[data.index.notna()]
+        # 複数年にまたがるデータの場合は重複した時刻を除いて並べ直す
+        if not data.index.is_unique:
+            data = data[~data.index.duplicated()]
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index()
+    # ネットワークのスナップショットに合わせてリインデックス
+    return data.reindex(snapshots, method='nearest')
+
+
+def attach_time_series(network, list_name, attr, data, column_map, scale=1.0):
+    """
+    時系列データをコンポーネントへ一括で割り当てる
+
+    Args:
+        network: PyPSA Network object
+        list_name: コンポーネントのリスト名（'loads', 'generators' など）
+        attr: 時系列属性名（'p_set', 'p_max_pu' など）
+        data: DatetimeIndexを持つ元データ（列はバス名など）
+        column_map: index=コンポーネント名、値=dataの列名 のSeries
+        scale: 値に掛ける係数
+    """
+    if len(column_map) == 0:
+        return
+    aligned = align_to_snapshots(data[pd.unique(column_map.values)], network.snapshots)
+    values = aligned[column_map.values].to_numpy(dtype=float) * scale
+    new = pd.DataFrame(values, index=network.snapshots, columns=column_map.index)
+
+    pnl = getattr(network, f'{list_name}_t')
+    # 既存の列を置き換えて1つのDataFrameとして書き込む（列ごとの代入による断片化を避ける）
+    pnl[attr] = pd.concat([pnl[attr].drop(columns=new.columns, errors='ignore'), new], axis=1)
+
 
 # 需要データの読み込み
-def import_demand_data_from_network_file(network, network_file_name, demand_change_compared_to_2024):
-    demand_data_raw = pd.read_excel(network_file_name, sheet_name='Demand', index_col=0, parse_dates=True)
+def import_demand_data_from_network_file(network, network_file_name, demand_change_compared_to_2024, cache_dir=None,
+                                         allocation=None):
+    # allocation: 負荷ごとの割当先エリアと重みの表（demand_allocation.read_allocation_table で読み込み、省略可）
+    #   省略時は負荷シートの area / weight 列、それもなければ負荷名と同じ列を割り当てる
+    demand_data_raw = read_excel_sheet(network_file_name, 'Demand', cache_dir=cache_dir, index_col=0, parse_dates=True)
     
     # インデックスをdatetimeに変換
     demand_data_raw.index = pd.to_datetime(demand_data_raw.index)
     
     # 2月29日を除外（閏年対応）
-    demand_data_raw = demand_data_raw[~((demand_data_raw.index.month == 2) & (demand_data_raw.index.day == 29))]
+    demand_data_raw = drop_leap_day(demand_data_raw)
     
-    # ネットワークのスナップショットの年を取得
-    target_year = network.snapshots[0].year
-    base_year = demand_data_raw.index[0].year
+    # エリア需要を負荷に割り当てる（重み行列はキャッシュから読み込み、全時刻を1回の行列積で配分）
+    table, missing = allocation_table(network.loads, demand_data_raw.columns, allocation)
+    for load in missing:
+        print(f"Warning: Load '{load}' not found in demand data.")
+    if len(table) == 0:
+        return
+    area_demand = align_to_snapshots(demand_data_raw[pd.unique(table['area'])], network.snapshots)
+    new = allocate_demand(area_demand, table, os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'allocation'))
     
-    # demand_data_rawに格納されたデータをnetwork.loads_t.p_setに適用
-    for load in network.loads.index:
-        if load in demand_data_raw.columns:
-            # 2024年のデータを対象年のスナップショットに合わせて調整
-            if target_year != base_year:
-                # 月日時刻を保持したまま年だけを変更
-                adjusted_index = demand_data_raw.index.map(lambda x: x.replace(year=target_year))
-                demand_series = pd.Series(demand_data_raw[load].values, index=adjusted_index)
-                # ネットワークのスナップショットに合わせてリインデックス
-                demand_series = demand_series.reindex(network.snapshots, method='nearest')
-            else:
-                demand_series = demand_data_raw[load].reindex(network.snapshots, method='nearest')
-            
-            # 需要変化率を適用
-            network.loads_t.p_set[load] = demand_series * (1 + demand_change_compared_to_2024 / 100)
-        else:
-            print(f"Warning: Load '{load}' not found in demand data.")
+    # 需要変化率を適用してnetwork.loads_t.p_setに書き込む
+    new = new * (1 + demand_change_compared_to_2024 / 100)
+    network.loads_t.p_set = pd.concat([network.loads_t.p_set.drop(columns=new.columns, errors='ignore'), new], axis=1)
 
 # 太陽光発電の時系列データをRenewable.Ninja APIから取得してCSVに保存
-def GetSolarTimeSeriesData(file_name, output_file, Year_of_analysis, renewable_ninja_api_key):
+def GetSolarTimeSeriesData(file_name, output_file, Year_of_analysis, renewable_ninja_api_key,
+                           transport=None, max_workers=4):
     # pypsa-japan-10BusModel.xlsx のbusesのバス名と座標を取得して、年間の時系列データを取得してCSVに保存
-    import pandas as pd
-    import requests
+    # transport: 通信関数（省略時はRenewable.Ninja API。テストでは ninja_fetch.fixture_transport などに差し替え）
 
     # ネットワークファイルからバス情報を読み込み
-    buses_df = pd.read_excel(file_name, sheet_name='buses')
+    buses_df = read_excel_sheet(file_name, 'buses')
     buses_df = buses_df.set_index('name')
     
     # carrier='AC'のバスのみに絞る
@@ -61,158 +118,72 @@ def GetSolarTimeSeriesData(file_name, output_file, Year_of_analysis, renewable_n
     print(f"取得したバス数: {len(bus_coords)}")
     print(bus_coords)
 
-    # 年間の日付範囲を作成（JSTで最終的に必要な範囲）
-    annual_snapshots = pd.date_range(f"{Year_of_analysis}-01-01 00:00",
-                                    f"{Year_of_analysis}-12-31 23:00",
-                                    freq="h")
-
-    # 結果を格納するDataFrame
-    solar_data_annual_full = pd.DataFrame(index=annual_snapshots)
-
-    # 各バスの座標に対してRenewable.Ninja APIからデータを取得
-    for bus_name, row in bus_coords.iterrows():
-        lat = row['lat']
-        lon = row['lon']
-        
-        print(f"Fetching data for {bus_name} (lat: {lat}, lon: {lon})...")
-        
-        # Renewable.Ninja API リクエスト
-        # JSTへの変換で9時間進むため、前日の15:00 UTCから取得開始
-        # （前日の15:00 UTC = 当日の0:00 JST）
-        url = 'https://www.renewables.ninja/api/data/pv'
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'date_from': f'{Year_of_analysis - 1}-12-31',  # 前年の12/31から取得
-            'date_to': f'{Year_of_analysis}-12-31',
-            'dataset': 'merra2',
-            'capacity': 1.0,
-            'system_loss': 0.1,
-            'tracking': 0,
-            'tilt': 35,
-            'azim': 180,
-            'format': 'json'
-        }
-        headers = {'Authorization': f'Token {renewable_ninja_api_key}'}
-        
-        response = requests.get(url, params=params, headers=headers)
-        
-        if response.status_code == 200:
-            data = response.json()
-            # レスポンス構造を確認してデバッグ
-            if isinstance(data, dict) and 'data' in data:
-                # 辞書形式のレスポンス (時刻がキーの場合)
-                if isinstance(data['data'], dict):
-                    # Unix時間(ミリ秒)をdatetimeに変換
-                    time_keys = list(data['data'].keys())
-                    # キーが数値(Unix時間)かどうか確認
-                    if time_keys and str(time_keys[0]).isdigit():
-                        # Unix時間(ミリ秒)の場合
-                        time_index = pd.to_datetime([int(k) for k in time_keys], unit='ms')
-                    else:
-                        # 文字列形式の場合
-                        time_index = pd.to_datetime(time_keys)
-                    # JSTに変換（UTC+9時間）
-                    time_index = time_index.tz_localize('UTC').tz_convert('Asia/Tokyo').tz_localize(None)
-                    values = list(data['data'].values())
-                    # 辞書から数値を抽出 (PyPSA形式)
-                    if values and isinstance(values[0], dict):
-                        values = [v.get('electricity', v) if isinstance(v, dict) else v for v in values]
-                    # 時刻インデックスと値を組み合わせて、annual_snapshotsの範囲にリインデックス
-                    temp_series = pd.Series(values, index=time_index)
-                    solar_data_annual_full[bus_name] = temp_series.reindex(annual_snapshots, fill_value=0)
-                # リスト形式のレスポンス (DataFrame変換可能な場合)
-                elif isinstance(data['data'], list):
-                    df_temp = pd.DataFrame(data['data'])
-                    # 時刻カラム名を探す
-                    time_col = next((col for col in df_temp.columns if 'time' in col.lower()), None)
-                    if time_col:
-                        df_temp.index = pd.to_datetime(df_temp[time_col])
-                    # 発電量カラム名を探す
-                    elec_col = next((col for col in df_temp.columns if 'electric' in col.lower() or 'power' in col.lower()), df_temp.columns[1] if len(df_temp.columns) > 1 else df_temp.columns[0])
-                    solar_data_annual_full[bus_name] = df_temp[elec_col]
-            else:
-                print(f"  ⚠ Unexpected response format for {bus_name}")
-                solar_data_annual_full[bus_name] = 0
-            print(f"  ✓ Success for {bus_name}")
-        else:
-            print(f"  ✗ Failed for {bus_name}: {response.status_code}")
-            solar_data_annual_full[bus_name] = 0
+    # 各バスの座標に対してRenewable.Ninja APIから並列に取得（取得済みの地点はキャッシュから読み込む）
+    if transport is None:
+        transport = http_transport(renewable_ninja_api_key)
+    solar_data_annual_full, failed = fetch_pv_time_series(bus_coords, Year_of_analysis, transport,
+                                                          max_workers=max_workers)
+    if failed:
+        # 取得できなかったバスは0で埋めずに列ごと除外する（読み込み時に警告が出る）
+        print(f"\n  ✗ 取得に失敗したバス ({len(failed)}個): {list(failed)}")
+        print("    再実行すると取得済みのバスはキャッシュから読み込み、失敗したバスのみ再取得します")
 
     # PyPSA形式のCSVとして保存（数値のみ、UTF-8エンコーディング）
 
     solar_data_annual_full.to_csv(output_file, encoding='utf-8-sig')
     print(f"\n年間太陽光データ(PyPSA形式)を保存しました: {output_file}")
+    # 読み込み用の列指向ストア（float32, 2月29日除外済み）も保存
+    write_profile_store(solar_data_annual_full, store_path_for(output_file), source=os.path.basename(output_file))
     print(f"データサイズ: {solar_data_annual_full.shape}")
     print("\n最初の5行:")
     print(solar_data_annual_full.head())
     print("\n統計情報:")
     print(solar_data_annual_full.describe())
 
-def SolarTimeSeriesDataSet(network,solar_data_file):
+def SolarTimeSeriesDataSet(network,solar_data_file, weather_year=None):
     # 太陽光発電データを読み込んで割り当て
+    # weather_year: 指定した場合、solar_data_file を気象年アンサンブルのディレクトリとしてその気象年を割り当てる
     
-    if os.path.exists(solar_data_file):
+    if profiles_exist(solar_data_file):
         print(f"太陽光データを読み込んでいます: {solar_data_file}")
-        solar_data = pd.read_csv(solar_data_file, index_col=0, parse_dates=True)
-        
-        # インデックスをdatetimeに変換
-        solar_data.index = pd.to_datetime(solar_data.index)
-        
-        # 2月29日を除外（閏年対応）
-        solar_data = solar_data[~((solar_data.index.month == 2) & (solar_data.index.day == 29))]
-        
-        # ネットワークのスナップショットの年を取得
-        target_year = network.snapshots[0].year
-        base_year = solar_data.index[0].year
         
         # 太陽光発電機を抽出（carrierが'solar'または'太陽光'のもの）
         solar_gens = network.generators[network.generators.carrier.str.contains('solar|太陽光', case=False, na=False)]
         
-        # 各太陽光発電機にバスのデータを割り当て
-        for gen_name in solar_gens.index:
-            bus_name = network.generators.loc[gen_name, 'bus']
-            if bus_name in solar_data.columns:
-                # 2024年のデータを対象年のスナップショットに合わせて調整
-                if target_year != base_year:
-                    # 月日時刻を保持したまま年だけを変更
-                    adjusted_index = solar_data.index.map(lambda x: x.replace(year=target_year))
-                    gen_series = pd.Series(solar_data[bus_name].values, index=adjusted_index)
-                    # snapshotの範囲に合わせてリインデックス
-                    gen_data = gen_series.reindex(network.snapshots, method='nearest')
-                else:
-                    # snapshotの範囲に合わせてリインデックス
-                    gen_data = solar_data[bus_name].reindex(network.snapshots, method='nearest')
-                
-                network.generators_t.p_max_pu[gen_name] = gen_data
-            else:
-                print(f"  ⚠ {gen_name} のバス {bus_name} がCSVに見つかりません")
-                network.generators_t.p_max_pu[gen_name] = 0.0
+        # ストアから必要なバスの列だけを読み込む（2月29日は除外済み）
+        if weather_year is not None:
+            from .weather_ensemble import ensemble_profiles
+            solar_data = ensemble_profiles(solar_data_file, 'solar', weather_year, columns=solar_gens.bus)
+        else:
+            solar_data = open_profiles(solar_data_file, columns=solar_gens.bus)
+        
+        # 発電機→バス列の対応表を作り、バスのデータを一括で割り当て
+        found = solar_gens.bus.isin(solar_data.columns)
+        for gen_name, bus_name in solar_gens.bus[~found].items():
+            print(f"  ⚠ {gen_name} のバス {bus_name} が太陽光データに見つかりません")
+        attach_time_series(network, 'generators', 'p_max_pu', solar_data, solar_gens.bus[found])
+        
+        # バスが見つからない発電機は0とする
+        missing = solar_gens.index[~found]
+        if len(missing) > 0:
+            zeros = pd.DataFrame(0.0, index=network.snapshots, columns=missing)
+            p_max_pu = network.generators_t.p_max_pu
+            network.generators_t.p_max_pu = pd.concat([p_max_pu.drop(columns=missing, errors='ignore'), zeros], axis=1)
     else:
         print(f"  ✗ 太陽光データファイルが存在しません: {solar_data_file}")
 
 
-def HydroTimeSeriesDataSet(network, hydro_data_file):
+def HydroTimeSeriesDataSet(network, hydro_data_file, weather_year=None):
     """
     水力発電の時系列データを読み込んで、ネットワークの発電機に割り当てる
     
     Args:
         network: PyPSA Network object
-        hydro_data_file: 水力時系列データのCSVファイルパス
+        hydro_data_file: 水力時系列データのファイルパス（.parquet または .csv）
+        weather_year: 指定した場合、hydro_data_file を気象年アンサンブルのディレクトリとしてその気象年を割り当てる
     """
-    if os.path.exists(hydro_data_file):
+    if profiles_exist(hydro_data_file):
         print(f"水力データを読み込んでいます: {hydro_data_file}")
-        hydro_data = pd.read_csv(hydro_data_file, index_col=0, parse_dates=True)
-        
-        # インデックスをdatetimeに変換
-        hydro_data.index = pd.to_datetime(hydro_data.index)
-        
-        # 2月29日を除外（閏年対応）
-        hydro_data = hydro_data[~((hydro_data.index.month == 2) & (hydro_data.index.day == 29))]
-        
-        # ネットワークのスナップショットの年を取得
-        target_year = network.snapshots[0].year
-        base_year = hydro_data.index[0].year
         
         # 水力発電機を抽出（carrierが'hydro'または'水力'のもの）
         hydro_gens = network.generators[network.generators.carrier.str.contains('hydro|水力', case=False, na=False)]
@@ -223,32 +194,88 @@ def HydroTimeSeriesDataSet(network, hydro_data_file):
         
         print(f"  水力発電機: {len(hydro_gens)}台")
         
-        # 水力稼働率カラムを取得（'水力稼働率'など）
+        # 水力稼働率カラムを取得（'水力稼働率'など）。列名はデータを読まずに取得する
+        if weather_year is not None:
+            from .weather_ensemble import ensemble_profiles
+            hydro_data = ensemble_profiles(hydro_data_file, 'hydro', weather_year)
+            hydro_columns = list(hydro_data.columns)
+        else:
+            hydro_columns = store_columns(resolve_store(hydro_data_file))
         rate_column = None
-        for col in hydro_data.columns:
+        for col in hydro_columns:
             if '水力' in col or 'hydro' in col.lower():
                 rate_column = col
                 break
         
         if rate_column is None:
-            print(f"  ✗ 水力稼働率カラムが見つかりません。利用可能なカラム: {hydro_data.columns.tolist()}")
+            print(f"  ✗ 水力稼働率カラムが見つかりません。利用可能なカラム: {hydro_columns}")
             return
         
-        # 各水力発電機に稼働率データを割り当て
-        for gen_name in hydro_gens.index:
-            # 年の調整
-            if target_year != base_year:
-                # 月日時刻を保持したまま年だけを変更
-                adjusted_index = hydro_data.index.map(lambda x: x.replace(year=target_year))
-                gen_series = pd.Series(hydro_data[rate_column].values, index=adjusted_index)
-                # snapshotの範囲に合わせてリインデックス
-                gen_data = gen_series.reindex(network.snapshots, method='nearest')
-            else:
-                # snapshotの範囲に合わせてリインデックス
-                gen_data = hydro_data[rate_column].reindex(network.snapshots, method='nearest')
-            
-            network.generators_t.p_max_pu[gen_name] = gen_data
+        if weather_year is None:
+            hydro_data = open_profiles(hydro_data_file, columns=[rate_column])
+        
+        # 全ての水力発電機に同じ稼働率カラムを一括で割り当て
+        column_map = pd.Series(rate_column, index=hydro_gens.index)
+        attach_time_series(network, 'generators', 'p_max_pu', hydro_data, column_map)
             
         print(f"  ✓ {len(hydro_gens)}台の水力発電機に稼働率を設定しました")
     else:
         print(f"  ✗ 水力データファイルが存在しません: {hydro_data_file}")
+
+
+def convert_hydro_daily_to_hourly(input_file, output_file, year=2024):
+    """
+    日別の水力稼働率（hydro.xlsx）を1時間値に展開し、CSVとストアに保存する
+
+    Args:
+        input_file: 日別稼働率のExcelファイル（1列目が稼働率、1行が1日）
+        output_file: 保存先のCSV（同じディレクトリに .parquet のストアも保存する）
+        year: 1行目の日付の年（1月1日から連続した日として扱う）
+    """
+    daily = read_excel_sheet(input_file, 0)
+    index = pd.date_range(f'{year}-01-01 00:00', periods=len(daily) * 24, freq='h')
+    hourly = pd.DataFrame({'水力稼働率': np.repeat(daily.iloc[:, 0].to_numpy(), 24)}, index=index)
+    hourly.to_csv(output_file, index_label='日時', encoding='utf-8-sig')
+    write_profile_store(hourly, store_path_for(output_file), source=os.path.basename(output_file))
+    print(f"  ✓ 水力の1時間値を保存しました: {output_file} ({len(daily)}日)")
+    return hourly
+
+
+def build_network(file_name, year, demand_change_compared_to_2024=0,
+                  start='01-01 00:00', end='12-31 23:00',
+                  solar_data_file='./data/processed/solar_time_series.parquet',
+                  hydro_data_file='./data/processed/hydro_hourly.parquet',
+                  representative_days=None, weather_year=None):
+    """
+    ワークブックと時系列データから対象年のネットワークを構築する（最適化前まで）
+    
+    Args:
+        file_name: ネットワーク＋需要データを含むExcelファイル
+        year: 対象年
+        demand_change_compared_to_2024: 需要変化率（2024年比, %）
+        start: 期間の開始（月日時刻, 例: '04-01 00:00'）
+        end: 期間の終了（月日時刻, 例: '04-14 23:00'）
+        solar_data_file: 太陽光時系列データのファイルパス（.parquet または .csv）
+        hydro_data_file: 水力時系列データのファイルパス（.parquet または .csv）
+        representative_days: 指定した場合、その数の代表日に時間集約したネットワークを返す
+        weather_year: 指定した場合、solar_data_file / hydro_data_file を気象年アンサンブルの
+                      ディレクトリとして、その気象年の太陽光・水力を割り当てる
+    """
+    # スナップショット作成
+    snapshots = pd.date_range(f"{year}-{start}", f"{year}-{end}", freq="h")
+    snapshots = snapshots[~((snapshots.month == 2) & (snapshots.day == 29))]
+    
+    # ネットワーク読み込み
+    network = load_network(file_name)
+    network.set_snapshots(snapshots)
+    
+    # 需要・太陽光・水力の時系列データを割り当て
+    import_demand_data_from_network_file(network, file_name, demand_change_compared_to_2024)
+    SolarTimeSeriesDataSet(network, solar_data_file, weather_year)
+    HydroTimeSeriesDataSet(network, hydro_data_file, weather_year)
+    
+    # 代表日による時間集約（投資最適化など、解く問題を小さくしたい場合）
+    if representative_days is not None:
+        from .time_aggregation import aggregate_snapshots
+        network = aggregate_snapshots(network, representative_days)
+    return network
@@ -0,0 +1,119 @@
+import os, json
+import numpy as np, pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 処理済み時系列データ（太陽光・水力など）の列指向ストア
+# CSVの代わりにParquetで保存する。
+# - 値は float32
+# - インデックスは2月29日を除いた1時間刻みの時刻（日付の解析が不要）
+# - スキーマのメタデータに元データの年（source_year）などを記録
+# 読み込み時は必要な列だけを読み込み（列の射影）、メモリマップも使える。
+
+STORE_METADATA_KEY = b'profile_store'
+
+
+def store_path_for(csv_file):
+    # CSVファイルに対応するストアのパス（同じディレクトリの .parquet）
+    return os.path.splitext(csv_file)[0] + '.parquet'
+
+
+def write_profile_store(data, path, source=None):
+    """
+    時系列データをストアに保存する
+
+    Args:
+        data: DatetimeIndexを持つDataFrame
+        path: 保存先の .parquet ファイル
+        source: 元データのファイル名など（メタデータに記録）
+    """
+    data = data[~((data.index.month == 2) & (data.index.day == 29))]
+    data = data.astype(np.float32)
+    data.index = pd.DatetimeIndex(data.index, name='snapshot')
+    data.columns = [str(c) for c in data.columns]
+
+    metadata = {
+        'source_year': int(data.index[0].year),
+        'source': source,
+        'hours': len(data),
+        'leap_day_removed': True,
+    }
+    table = pa.Table.from_pandas(data)
+    table = table.replace_schema_metadata({**table.schema.metadata,
+                                           STORE_METADATA_KEY: json.dumps(metadata, ensure_ascii=False)})
+    tmp_file = f'{path}.{os.getpid()}.tmp'
+    pq.write_table(table, tmp_file)
+    os.replace(tmp_file, path)
+    return metadata
+
+
+def convert_csv_to_store(csv_file, path=None):
+    """
+    処理済みCSV（solar_time_series.csv, hydro_hourly.csv）をストアに変換する
+    """
+    path = path or store_path_for(csv_file)
+    data = pd.read_csv(csv_file, index_col=0, parse_dates=True)
+    data.index = pd.to_datetime(data.index)
+    metadata = write_profile_store(data, path, source=os.path.basename(csv_file))
+    print(f"  ✓ ストアを作成しました: {path} ({metadata['hours']}時間 × {data.shape[1]}列)")
+    return path
+
+
+def store_columns(path):
+    # データを読まずに列名だけを取得する
+    schema = pq.read_schema(path)
+    index_columns = json.loads(schema.metadata[b'pandas'])['index_columns']
+    return [name for name in schema.names if name not in index_columns]
+
+
+def store_metadata(path):
+    return json.loads(pq.read_schema(path).metadata[STORE_METADATA_KEY])
+
+
+def read_profile_store(path, columns=None, memory_map=True):
+    """
+    ストアから時系列データを読み込む
+
+    Args:
+        path: .parquet ファイル
+        columns: 読み込む列（省略時は全列）
+        memory_map: Trueの場合はメモリマップで読み込む
+
+    Returns:
+        DataFrame（attrs['source_year'] に元データの年）
+    """
+    table = pq.read_table(path, columns=columns, memory_map=memory_map, use_pandas_metadata=True)
+    data = table.to_pandas()
+    data.attrs.update(json.loads(table.schema.metadata[STORE_METADATA_KEY]))
+    return data
+
+
+def profiles_exist(data_file):
+    return os.path.exists(data_file) or os.path.exists(store_path_for(data_file))
+
+
+def resolve_store(data_file):
+    """
+    データファイルに対応するストアのパスを返す（CSVの方が新しい場合はストアを作り直す）
+    """
+    if data_file.endswith('.parquet'):
+        return data_file
+    path = store_path_for(data_file)
+    if os.path.exists(data_file) and (not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(data_file)):
+        convert_csv_to_store(data_file, path)
+    return path
+
+
+def open_profiles(data_file, columns=None):
+    """
+    処理済み時系列データを読み込む（ストアを優先し、CSVしかない場合は変換してから読み込む）
+
+    Args:
+        data_file: .parquet または .csv のファイル
+        columns: 読み込む列（省略時は全列）。存在しない列は無視する
+    """
+    path = resolve_store(data_file)
+    if columns is not None:
+        available = set(store_columns(path))
+        columns = [c for c in pd.unique(pd.Index(columns)) if c in available]
+    return read_profile_store(path, columns=columns)
@@ -0,0 +1,133 @@
+import os, re, glob
+import numpy as np, pandas as pd
+import xarray as xr
+
+try:
+    import dask
+except ImportError:
+    dask = None
+
+# 最適化結果（complete_network/optimized_network_{year}.nc）の遅延読み込み
+# PyPSAのNetworkを組み立てずに、netCDFファイルをxarrayで直接開く。
+# 複数年（複数シナリオ）のファイルを (year, snapshot, コンポーネント) の1つのDatasetにまとめるが、
+# 値はdaskのチャンク単位で必要になった時に読み込まれるので、ファイル数が増えても
+# 使用メモリはチャンクの大きさで抑えられる。
+# snapshot は各年の先頭からの位置（0, 1, 2, ...）で揃え、実際の時刻は timestamp 座標に持つ。
+# daskがインストールされていない場合はチャンクを使わずに読み込む（結合時に全データを読み込む）。
+
+DEFAULT_VARIABLES = [('generators', 'p'), ('links', 'p0'), ('loads', 'p_set')]
+DEFAULT_CHUNKS = {'snapshots': 744} if dask is not None else None  # 約1か月分
+
+
+def result_files(output_dir='complete_network', output_template='optimized_network_{year}.nc'):
+    """
+    出力ディレクトリ内の結果ファイルを列挙する
+
+    Returns:
+        {年: ファイルパス} の辞書（年の昇順）
+    """
+    prefix, suffix = output_template.split('{year}')
+    pattern = re.compile(re.escape(prefix) + r'(\d+)' + re.escape(suffix) + '$')
+    files = {}
+    for path in glob.glob(os.path.join(output_dir, prefix + '*' + suffix)):
+        match = pattern.match(os.path.basename(path))
+        if match:
+            files[int(match.group(1))] = path
+    return dict(sorted(files.items()))
+
+
+def _time_series(ds, list_name, attr):
+    # netCDF内の {list_name}_t_{attr} を (snapshot, list_name) のDataArrayにする
+    # PyPSAは全時刻が既定値（0）の列を保存しないので、その列は0で補う
+    name = f'{list_name}_t_{attr}'
+    if name not in ds:
+        return None
+    series = ds[name].rename({'snapshots': 'snapshot', f'{name}_i': list_name}).drop_vars('snapshot', errors='ignore')
+    if f'{list_name}_i' in ds.coords:
+        series = series.reindex({list_name: ds[f'{list_name}_i'].values}, fill_value=0.0)
+    return series
+
+
+def open_result(path, variables=DEFAULT_VARIABLES, chunks=DEFAULT_CHUNKS):
+    """
+    1つの結果ファイルを遅延読み込みで開く
+
+    Args:
+        path: optimized_network_{year}.nc
+        variables: 読み込む時系列 (コンポーネント一覧名, 属性) のリスト
+        chunks: daskのチャンク（Noneの場合はdaskを使わず、変数ごとに必要な時に読み込む。
+                既定はdaskがあれば約1か月分、なければNone）
+
+    Returns:
+        xarray.Dataset（変数名は generators_t_p など。コンポーネントの carrier, bus も含む）
+    """
+    ds = xr.open_dataset(path, chunks=chunks)
+    data = {}
+    for list_name, attr in variables:
+        series = _time_series(ds, list_name, attr)
+        if series is not None:
+            data[f'{list_name}_t_{attr}'] = series
+        # キャリア・バスは小さいのでそのまま読み込む
+        for static_attr in ['carrier', 'bus', 'bus0', 'bus1']:
+            name = f'{list_name}_{static_attr}'
+            if name in ds and name not in data:
+                data[name] = ds[name].rename({f'{list_name}_i': list_name}).load()
+
+    result = xr.Dataset(data)
+    n_snapshots = ds.sizes['snapshots']
+    result = result.assign_coords(snapshot=np.arange(n_snapshots))
+    timestamps = ds['snapshots_snapshot'].values if 'snapshots_snapshot' in ds else ds['snapshots'].values
+    result['timestamp'] = ('snapshot', pd.to_datetime(timestamps).values)
+    # 代表日などで重み付けされている場合に備えて snapshot_weightings も持つ
+    weights = ds['snapshots_generators'].values if 'snapshots_generators' in ds else np.ones(n_snapshots)
+    result['weightings'] = ('snapshot', weights)
+    result.attrs['objective'] = ds.attrs.get('network__objective', np.nan)
+    result.attrs['source'] = path
+    return result
+
+
+def open_results(files=None, variables=DEFAULT_VARIABLES, chunks=DEFAULT_CHUNKS):
+    """
+    複数年の結果ファイルを (year, snapshot, コンポーネント) の1つのDatasetとして遅延読み込みする
+
+    年ごとにコンポーネントが異なる場合は和集合をとり、存在しない部分はNaNになる。
+
+    Args:
+        files: {年: ファイルパス} の辞書（省略時は result_files() の結果）
+        variables: 読み込む時系列 (コンポーネント一覧名, 属性) のリスト
+        chunks: daskのチャンク（Noneの場合は結合時に全データを読み込む。既定は open_result() と同じ）
+
+    Returns:
+        xarray.Dataset（attrs['objective'] の代わりに変数 objective を年ごとに持つ）
+    """
+    files = files if files is not None else result_files()
+    if not files:
+        raise FileNotFoundError('結果ファイルが見つかりません')
+    datasets = [open_result(path, variables, chunks) for path in files.values()]
+    objectives = [ds.attrs['objective'] for ds in datasets]
+    combined = xr.concat(datasets, dim=pd.Index(list(files), name='year'), join='outer',
+                         data_vars='all', coords='minimal', compat='override', combine_attrs='drop')
+    combined['objective'] = ('year', objectives)
+    return combined
+
+
+def energy_by_carrier(results, list_name='generators', attr='p'):
+    """
+    年 × キャリア別の電力量 [MWh]（snapshot_weightings を考慮）
+
+    時系列は年ごとに時間方向に合計してから読み込むので、全体をメモリに載せない。
+    """
+    totals = (results[f'{list_name}_t_{attr}'] * results['weightings']).sum('snapshot').compute()
+    carriers = results[f'{list_name}_carrier']
+    records = {}
+    for year in results['year'].values:
+        values = totals.sel(year=year).to_series()
+        records[year] = values.groupby(carriers.sel(year=year).to_series().reindex(values.index)).sum()
+    return pd.DataFrame(records).T.rename_axis(index='year', columns='carrier')
+
+
+def total_load_by_year(results):
+    """
+    年ごとの総需要 [MWh]（snapshot_weightings を考慮）
+    """
+    return (results['loads_t_p_set'] * results['weightings']).sum(['snapshot', 'loads']).to_series()
@@ -0,0 +1,106 @@
+import time
+import pandas as pd
+
+# ローリングホライズン最適化
+# 1年分（8760時間）のネットワークを一定長のウィンドウに分けて順に最適化する。
+# 各ウィンドウの結果（generators_t.p, links_t.p0, stores_t.e, storage_units_t など）は
+# PyPSAによって同じネットワークの該当スナップショットに書き込まれるので、最後に1つの
+# ネットワークとして結合された状態になる。線形計画の大きさはウィンドウ長で決まるため、
+# 最大メモリ使用量もウィンドウ長で抑えられる。
+
+
+def window_starts(n_snapshots, window, overlap):
+    """
+    各ウィンドウの開始位置を返す
+
+    Args:
+        n_snapshots: スナップショット数
+        window: ウィンドウ長（時間数）
+        overlap: 次のウィンドウと重なる時間数
+    """
+    if window <= overlap:
+        raise ValueError(f"overlap ({overlap}) は window ({window}) より小さくしてください")
+    return list(range(0, n_snapshots - overlap if n_snapshots > window else 1, window - overlap))
+
+
+def optimize_rolling_horizon(network, window=168, overlap=24, solver_name='highs', solver_options=None,
+                             extra_functionality=None):
+    """
+    ネットワーク全体をウィンドウごとに最適化し、結果を1つのネットワークにまとめる
+
+    ウィンドウ間では以下の状態を引き継ぐ。
+    - Store の e_initial ← 前のウィンドウで確定した時刻の e
+    - StorageUnit の state_of_charge_initial ← 同じく state_of_charge
+    - Ramp制約の基準出力 ← 直前のスナップショットの出力（PyPSAがウィンドウ開始時に参照する）
+    重なり部分は後のウィンドウの結果で上書きされる。
+    最適化に失敗したウィンドウがあればそこで打ち切る（解のない蓄電量を次のウィンドウに引き継がない）。
+
+    PyPSAの network.optimize.optimize_with_rolling_horizon() は使わない。失敗したウィンドウの後も
+    蓄電量を引き継いで続行し、ウィンドウごとの結果を返さず、巡回条件・初期値の一時的な変更と
+    復元も行わないため。
+
+    Args:
+        network: PyPSA Network object（全期間のスナップショットと時系列データを設定済み）
+        window: ウィンドウ長（時間数）
+        overlap: 次のウィンドウと重なる時間数
+        solver_name: ソルバー名
+        solver_options: ソルバーオプション
+        extra_functionality: 追加制約関数
+
+    Returns:
+        実行したウィンドウごとの結果（開始・終了時刻、ステータス、目的関数値、計算時間）のDataFrame
+    """
+    snapshots = network.snapshots
+
+    # ウィンドウごとに巡回条件がかからないよう、一時的に巡回条件を外す
+    stores_cyclic = network.stores['e_cyclic'].copy()
+    storage_cyclic = network.storage_units['cyclic_state_of_charge'].copy()
+    stores_initial = network.stores['e_initial'].copy()
+    storage_initial = network.storage_units['state_of_charge_initial'].copy()
+    network.stores['e_cyclic'] = False
+    network.storage_units['cyclic_state_of_charge'] = False
+
+    starts = window_starts(len(snapshots), window, overlap)
+    records = []
+    try:
+        for i, start in enumerate(starts):
+            end = min(len(snapshots), start + window)
+            sns = snapshots[start:end]
+            print(f"ウィンドウ {i + 1}/{len(starts)}: {sns[0]} ~ {sns[-1]} ({len(sns)}時間)")
+
+            if i > 0:
+                # 前のウィンドウで確定した直前時刻の蓄電量を初期値にする
+                if len(network.stores) > 0:
+                    network.stores['e_initial'] = network.stores_t.e.loc[snapshots[start - 1]]
+                if len(network.storage_units) > 0:
+                    network.storage_units['state_of_charge_initial'] = \
+                        network.storage_units_t.state_of_charge.loc[snapshots[start - 1]]
+
+            t0 = time.time()
+            status, condition = network.optimize(sns, solver_name=solver_name,
+                                                 solver_options=solver_options or {},
+                                                 extra_functionality=extra_functionality)
+            records.append({'window': i, 'start': sns[0], 'end': sns[-1], 'snapshots': len(sns),
+                            'status': status, 'termination_condition': condition,
+                            'objective': network.objective if status == 'ok' else None,
+                            'elapsed': time.time() - t0})
+            # 次のウィンドウの前にモデルを解放してメモリを抑える
+            network._model = None
+            if status != 'ok':
+                print(f"  ✗ ウィンドウ {i + 1} の最適化に失敗しました: {condition}"
+                      f"（残り {len(starts) - i - 1} ウィンドウは実行しません）")
+                break
+    finally:
+        network.stores['e_cyclic'] = stores_cyclic
+        network.storage_units['cyclic_state_of_charge'] = storage_cyclic
+        network.stores['e_initial'] = stores_initial
+        network.storage_units['state_of_charge_initial'] = storage_initial
+
+    return pd.DataFrame(records)
+
+
+def total_operating_cost(network):
+    """
+    結合後の出力から全期間の運転費用を計算する（ウィンドウの目的関数値は重なり部分を二重に数えるため）
+    """
+    return network.statistics.opex().sum()
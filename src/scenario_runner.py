@@ -0,0 +1,234 @@
+import os, json, time, hashlib, itertools, functools
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .excel_cache import file_fingerprint
+from .rolling_horizon import optimize_rolling_horizon, total_operating_cost
+from .solver_telemetry import profile_optimize, write_telemetry
+from .stage_timer import stage_timer
+
+# 分析年 × 需要変化率 × 入力ワークブック のシナリオを並列に最適化する
+# 各ケースの結果は complete_network/ 以下に .nc として保存し、同名の .json に
+# 入力ハッシュと結果サマリーを残す。入力ハッシュが一致する .nc が既にあるケースは
+# 再計算せずにスキップする（途中で止めても再開できる）。
+# telemetry=True の場合は最適化を段階に分けて計測し、.nc の隣に .telemetry.json を残す。
+
+DEFAULT_OUTPUT_TEMPLATE = 'optimized_network_{year}.nc'
+
+
+def make_cases(analysis_years, demand_changes, file_names):
+    """
+    シナリオのケース一覧を作成する
+
+    Args:
+        analysis_years: 分析対象年のリスト
+        demand_changes: 年→需要変化率(%)の辞書（ノートブックと同じ形式）、
+                        または全ての年に適用する需要変化率(%)のリスト
+        file_names: 入力ワークブックのパス（1つまたはリスト）
+    """
+    if isinstance(file_names, str):
+        file_names = [file_names]
+    cases = []
+    for file_name, year in itertools.product(file_names, analysis_years):
+        if isinstance(demand_changes, dict):
+            changes = [demand_changes.get(year, 0)]
+        else:
+            changes = list(demand_changes)
+        for demand_change in changes:
+            cases.append({'file_name': file_name, 'year': year, 'demand_change': demand_change})
+    return cases
+
+
+def _callable_key(func):
+    # 追加制約関数を識別する値（functools.partial の場合は固定した引数も含める）
+    if func is None:
+        return None
+    if isinstance(func, functools.partial):
+        return {'func': _callable_key(func.func), 'args': list(func.args), 'keywords': dict(func.keywords)}
+    return f"{getattr(func, '__module__', None)}.{getattr(func, '__qualname__', repr(func))}"
+
+
+def case_input_hash(case, start, end, solar_data_file, hydro_data_file, solver_options, extra_functionality=None,
+                    rolling_horizon=None, representative_days=None):
+    """
+    ケースの入力（ワークブック・時系列データの内容と計算条件）から入力ハッシュを作る
+
+    スレッド数は結果に影響しないためハッシュに含めない。
+    """
+    payload = {
+        'workbook': file_fingerprint(case['file_name']),
+        'solar': file_fingerprint(solar_data_file) if os.path.exists(solar_data_file) else None,
+        'hydro': file_fingerprint(hydro_data_file) if os.path.exists(hydro_data_file) else None,
+        'year': case['year'],
+        'demand_change': case['demand_change'],
+        'start': start,
+        'end': end,
+        'solver_options': {k: v for k, v in solver_options.items() if k != 'threads'},
+        'extra_functionality': _callable_key(extra_functionality),
+        'rolling_horizon': rolling_horizon,
+        'representative_days': representative_days,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _summary_file(output_file):
+    return os.path.splitext(output_file)[0] + '.json'
+
+
+def _failed_summary(case, error):
+    print(f"  ✗ 失敗: {case['output_file']}: {error}")
+    failed = dict(case)
+    failed.update({'status': 'error', 'termination_condition': str(error), 'skipped': False})
+    return failed
+
+
+def _run_case(case, options):
+    # ワーカープロセスで1ケースを構築→最適化→保存する
+    import warnings
+    from .preprocess_data import build_network
+
+    warnings.filterwarnings("ignore", category=UserWarning, module="pypsa")
+    t0 = time.time()
+    stages, telemetry = [], None
+    with stage_timer('build', stages, verbose=False):
+        network = build_network(case['file_name'], case['year'], case['demand_change'],
+                                start=options['start'], end=options['end'],
+                                solar_data_file=options['solar_data_file'],
+                                hydro_data_file=options['hydro_data_file'],
+                                representative_days=options['representative_days'])
+    with stage_timer('optimize', stages, verbose=False):
+        if options['rolling_horizon']:
+            # 全期間をウィンドウに分けて最適化し、費用は結合後の出力から計算する
+            # （失敗したウィンドウ以降は解がないため費用は記録しない）
+            windows = optimize_rolling_horizon(network, solver_options=options['solver_options'],
+                                               extra_functionality=options['extra_functionality'],
+                                               **options['rolling_horizon'])
+            failed = windows[windows['status'] != 'ok']
+            status = 'ok' if failed.empty else 'warning'
+            condition = 'optimal' if failed.empty else ','.join(failed['termination_condition'].astype(str).unique())
+            total_cost = total_operating_cost(network) if failed.empty else None
+        elif options['telemetry']:
+            status, condition, telemetry = profile_optimize(network, solver_options=options['solver_options'],
+                                                            extra_functionality=options['extra_functionality'])
+            total_cost = network.objective
+        else:
+            status, condition = network.optimize(solver_name='highs',
+                                                 solver_options=options['solver_options'],
+                                                 extra_functionality=options['extra_functionality'])
+            total_cost = network.objective
+    with stage_timer('export', stages, verbose=False):
+        network.export_to_netcdf(case['output_file'])
+    if telemetry is not None:
+        # 結果の書き出しの時間も含めて保存する
+        telemetry['stages'].append(stages[-1])
+        write_telemetry(telemetry, case['output_file'], workbook=os.path.basename(case['file_name']),
+                        workbook_hash=file_fingerprint(case['file_name']), year=case['year'],
+                        demand_change=case['demand_change'], input_hash=case['input_hash'])
+
+    summary = dict(case)
+    summary.update({
+        'status': status,
+        'termination_condition': condition,
+        'total_cost': total_cost,
+        'total_demand': network.loads_t.p.mul(network.snapshot_weightings['generators'], axis=0).sum().sum(),
+        'elapsed': time.time() - t0,
+        'stages': stages,
+        'skipped': False,
+    })
+    with open(_summary_file(case['output_file']), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1, default=str)
+    return summary
+
+
+def run_scenarios(cases, output_dir='complete_network', output_template=DEFAULT_OUTPUT_TEMPLATE,
+                  workers=None, highs_threads=1, start='04-01 00:00', end='04-14 23:00',
+                  solar_data_file='./data/processed/solar_time_series.parquet',
+                  hydro_data_file='./data/processed/hydro_hourly.parquet',
+                  extra_functionality=None, solver_options=None, resume=True,
+                  rolling_horizon=None, representative_days=None, telemetry=False):
+    """
+    シナリオのケースをプロセスプールで並列に最適化し、結果サマリーを1つの表にまとめる
+
+    Args:
+        cases: make_cases() で作成したケースのリスト
+        output_dir: 結果の保存先ディレクトリ
+        output_template: 出力ファイル名のテンプレート（{year}, {demand_change}, {workbook} が使える）
+        workers: 並列ワーカー数（省略時はCPU数 ÷ highs_threads）。1の場合は逐次実行
+        highs_threads: ワーカー1つあたりのHiGHSスレッド数
+        start: 期間の開始（月日時刻）
+        end: 期間の終了（月日時刻）
+        solar_data_file: 太陽光時系列データのファイルパス（.parquet または .csv）
+        hydro_data_file: 水力時系列データのファイルパス（.parquet または .csv）
+        extra_functionality: network.optimizeに渡す追加制約関数（並列実行時はモジュールレベルの関数であること）
+        solver_options: HiGHSに渡す追加オプション
+        resume: Trueの場合、入力ハッシュが一致する結果があるケースはスキップする
+        rolling_horizon: ローリングホライズンで解く場合のウィンドウ設定（例: {'window': 168, 'overlap': 24}）
+        representative_days: 代表日で時間集約して解く場合の代表日数
+        telemetry: Trueの場合、モデルの大きさ・段階ごとの時間・HiGHSの統計を .telemetry.json に保存する
+                   （rolling_horizon とは同時に使えない）
+    """
+    if telemetry and rolling_horizon:
+        raise ValueError('telemetry と rolling_horizon は同時に指定できません')
+    os.makedirs(output_dir, exist_ok=True)
+    solver_options = dict(solver_options or {})
+    solver_options.setdefault('threads', highs_threads)
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // max(1, highs_threads))
+
+    options = {
+        'start': start, 'end': end,
+        'solar_data_file': solar_data_file, 'hydro_data_file': hydro_data_file,
+        'solver_options': solver_options, 'extra_functionality': extra_functionality,
+        'rolling_horizon': rolling_horizon, 'representative_days': representative_days,
+        'telemetry': telemetry,
+    }
+
+    # 出力先と入力ハッシュを決定し、実行済みのケースを振り分ける
+    results, pending, seen = [], [], set()
+    for case in cases:
+        case = dict(case)
+        workbook = os.path.splitext(os.path.basename(case['file_name']))[0]
+        case['output_file'] = os.path.join(output_dir, output_template.format(
+            year=case['year'], demand_change=case['demand_change'], workbook=workbook))
+        if case['output_file'] in seen:
+            raise ValueError(f"出力ファイル名が重複しています: {case['output_file']} "
+                             "(output_template に {demand_change} や {workbook} を含めてください)")
+        seen.add(case['output_file'])
+        case['input_hash'] = case_input_hash(case, start, end, solar_data_file, hydro_data_file,
+                                             solver_options, extra_functionality, rolling_horizon,
+                                             representative_days)
+
+        summary_file = _summary_file(case['output_file'])
+        if resume and os.path.exists(case['output_file']) and os.path.exists(summary_file):
+            with open(summary_file, encoding='utf-8') as f:
+                summary = json.load(f)
+            if summary.get('input_hash') == case['input_hash']:
+                print(f"  ✓ スキップ（計算済み）: {case['output_file']}")
+                summary['skipped'] = True
+                results.append(summary)
+                continue
+        pending.append(case)
+
+    print(f"ケース数: {len(cases)} (実行: {len(pending)}, スキップ: {len(results)}, ワーカー数: {workers})")
+
+    if workers == 1:
+        for case in pending:
+            try:
+                results.append(_run_case(case, options))
+                print(f"  ✓ 完了: {case['output_file']}")
+            except Exception as e:
+                results.append(_failed_summary(case, e))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_run_case, case, options): case for case in pending}
+            for future in as_completed(futures):
+                case = futures[future]
+                try:
+                    results.append(future.result())
+                    print(f"  ✓ 完了: {case['output_file']}")
+                except Exception as e:
+                    results.append(_failed_summary(case, e))
+
+    summary_df = pd.DataFrame(results)
+    if summary_df.empty:
+        return summary_df
+    return summary_df.sort_values(['file_name', 'year', 'demand_change']).reset_index(drop=True)
@@ -0,0 +1,256 @@
+import os, re, json, time, tempfile
+import numpy as np, pandas as pd
+from .stage_timer import stage_timer
+
+# network.optimize の計測（遅い実行の原因の切り分け用）
+# optimize を モデル作成 → 追加制約 → 求解 に分けて、段階ごとの経過時間と最大メモリ使用量を測り、
+# 以下を結果ファイル（optimized_network_{year}.nc）の隣の .telemetry.json に保存する。
+# - linopyモデルの大きさ: コンポーネント（Generator, Link, Ramp など）ごとの変数・制約・非ゼロ要素数
+# - HiGHSの統計: 前処理での削減数、単体法・内点法・クロスオーバーの反復回数と経過時間、求解時間
+#   （HiGHSのログファイルと highspy の getInfo() から取得）
+# - 求解段階の時間のうちHiGHSの外側の時間（モデルの受け渡しと結果のネットワークへの書き戻し）
+# ワークブックのハッシュも記録するので、モデルのバージョン（V5 → V6 など）の間で
+# compare_telemetry() で比べて、定式化の規模が急に増えた変更を見つけられる。
+
+TELEMETRY_SUFFIX = '.telemetry.json'
+
+# HiGHSのログの区切り（この行以降を該当する段階の時間として数える）
+HIGHS_PHASES = [
+    ('presolve', re.compile(r'^Presolving model')),
+    ('simplex', re.compile(r'simplex', re.IGNORECASE)),
+    ('ipm', re.compile(r'^(IPX|Running IPX|Solving LP with IPX|.*interior point)', re.IGNORECASE)),
+    ('crossover', re.compile(r'crossover', re.IGNORECASE)),
+    ('postsolve', re.compile(r'^Postsolve', re.IGNORECASE)),
+]
+HIGHS_STATISTICS = {
+    'model_status': re.compile(r'^Model\s+status\s*:\s*(.+)$'),
+    'simplex_iterations': re.compile(r'^Simplex\s+iterations\s*:\s*(\d+)'),
+    'ipm_iterations': re.compile(r'^IPM\s+iterations\s*:\s*(\d+)'),
+    'crossover_iterations': re.compile(r'^Crossover\s+iterations\s*:\s*(\d+)'),
+    'objective_value': re.compile(r'^Objective\s+value\s*:\s*(\S+)'),
+    'highs_run_time': re.compile(r'^HiGHS\s+run\s+time\s*:\s*(\S+)'),
+}
+PRESOLVE_REDUCTIONS = re.compile(r'Reductions:\s*rows\s+(\d+)\(-(\d+)\);\s*columns\s+(\d+)\(-(\d+)\);'
+                                 r'\s*elements\s+(\d+)\(-(\d+)\)')
+LOG_TIME = re.compile(r'\s(\d+(?:\.\d+)?)s\s*$')
+
+
+def telemetry_path(output_file):
+    # 結果ファイルに対応する計測結果のパス
+    return os.path.splitext(output_file)[0] + TELEMETRY_SUFFIX
+
+
+def model_size(model):
+    """
+    linopyモデルの大きさをコンポーネントごとに集計する
+
+    変数・制約名の '-' より前（Generator-p なら Generator）をコンポーネントとする。
+    マスクで除かれた要素と係数0の項は数えない。
+
+    Returns:
+        index=コンポーネント、列 variables, constraints, nonzeros のDataFrame
+    """
+    rows = {}
+    for name in model.variables:
+        labels = model.variables[name].labels
+        row = rows.setdefault(name.split('-')[0], {'variables': 0, 'constraints': 0, 'nonzeros': 0})
+        row['variables'] += int((labels >= 0).sum())
+    for name in model.constraints:
+        constraint = model.constraints[name]
+        row = rows.setdefault(name.split('-')[0], {'variables': 0, 'constraints': 0, 'nonzeros': 0})
+        active = constraint.labels >= 0
+        row['constraints'] += int(active.sum())
+        row['nonzeros'] += int(((constraint.vars >= 0) & (constraint.coeffs != 0) & active).sum())
+    return pd.DataFrame.from_dict(rows, orient='index').rename_axis('component').sort_index()
+
+
+def parse_highs_log(text):
+    """
+    HiGHSのログから統計と段階ごとの経過時間を取り出す
+
+    段階の時間は、進捗行の末尾の経過時間（例: '... 1.23s'）から、その段階の最後の値と
+    前の段階の最後の値の差として推定する。
+    """
+    stats, phase_end, phase = {}, {}, None
+    for line in text.splitlines():
+        line = line.strip()
+        match = PRESOLVE_REDUCTIONS.search(line)
+        if match:
+            values = [int(v) for v in match.groups()]
+            stats.update({'presolve_rows': values[0], 'presolve_rows_removed': values[1],
+                          'presolve_columns': values[2], 'presolve_columns_removed': values[3],
+                          'presolve_nonzeros': values[4], 'presolve_nonzeros_removed': values[5]})
+        for key, pattern in HIGHS_STATISTICS.items():
+            match = pattern.match(line)
+            if match:
+                value = match.group(1).strip()
+                stats[key] = value if key == 'model_status' else float(value)
+        for name, pattern in HIGHS_PHASES:
+            if pattern.search(line) and phase != name and name not in phase_end:
+                phase = name
+                break
+        match = LOG_TIME.search(line)
+        if match and phase is not None:
+            phase_end[phase] = float(match.group(1))
+
+    previous = 0.0
+    for name, _ in HIGHS_PHASES:
+        if name in phase_end:
+            stats[f'{name}_time'] = max(0.0, phase_end[name] - previous)
+            previous = phase_end[name]
+    for key in ('simplex_iterations', 'ipm_iterations', 'crossover_iterations'):
+        if key in stats:
+            stats[key] = int(stats[key])
+    return stats
+
+
+def _highs_info(model):
+    # linopyが保持しているhighspyのオブジェクトから反復回数などを取得する（取得できなければ空）
+    highs = getattr(model, 'solver_model', None)
+    if highs is None or not hasattr(highs, 'getInfo'):
+        return {}
+    info = highs.getInfo()
+    values = {}
+    for key, attr in [('simplex_iterations', 'simplex_iteration_count'), ('ipm_iterations', 'ipm_iteration_count'),
+                      ('crossover_iterations', 'crossover_iteration_count')]:
+        value = getattr(info, attr, None)
+        if value is not None and value >= 0:
+            values[key] = int(value)
+    if hasattr(highs, 'getRunTime'):
+        values['highs_run_time'] = float(highs.getRunTime())
+    return values
+
+
+def profile_optimize(network, snapshots=None, solver_name='highs', solver_options=None,
+                     extra_functionality=None, log_file=None, **create_options):
+    """
+    network.optimize と同じ処理を段階に分けて実行し、計測結果を返す
+
+    Args:
+        network: PyPSA Network object
+        snapshots: 最適化するスナップショット（省略時は全て）
+        solver_name: ソルバー名（HiGHS以外ではHiGHSの統計は取得しない）
+        solver_options: ソルバーオプション
+        extra_functionality: 追加制約関数
+        log_file: HiGHSのログの保存先（省略時は一時ファイルに書き、解析後に削除する）
+        **create_options: network.optimize.create_model() に渡すその他の引数
+
+    Returns:
+        (status, termination_condition, 計測結果の辞書)
+    """
+    solver_options = dict(solver_options or {})
+    snapshots = network.snapshots if snapshots is None else snapshots
+    use_highs = solver_name == 'highs'
+    remove_log = False
+    if use_highs:
+        if log_file is None:
+            fd, log_file = tempfile.mkstemp(prefix='highs_', suffix='.log')
+            os.close(fd)
+            remove_log = True
+        solver_options.setdefault('log_file', log_file)
+        log_file = solver_options['log_file']
+
+    stages = []
+    try:
+        with stage_timer('model_build', stages, verbose=False):
+            model = network.optimize.create_model(snapshots=snapshots, **create_options)
+        with stage_timer('extra_functionality', stages, verbose=False):
+            if extra_functionality is not None:
+                extra_functionality(network, snapshots)
+        size = model_size(model)
+        with stage_timer('solve', stages, verbose=False) as record:
+            status, condition = network.optimize.solve_model(solver_name=solver_name, solver_options=solver_options)
+
+        highs = {}
+        if use_highs:
+            if os.path.exists(log_file):
+                with open(log_file, encoding='utf-8', errors='replace') as f:
+                    highs.update(parse_highs_log(f.read()))
+            highs.update(_highs_info(model))
+            if 'highs_run_time' in highs:
+                # HiGHSの外側: モデルの受け渡しと結果のネットワークへの書き戻し
+                record['outside_solver'] = max(0.0, record['elapsed'] - highs['highs_run_time'])
+    finally:
+        if remove_log and os.path.exists(log_file):
+            os.remove(log_file)
+
+    telemetry = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'status': status,
+        'termination_condition': condition,
+        'objective': network.objective if status == 'ok' else None,
+        'snapshots': len(snapshots),
+        'solver_name': solver_name,
+        'solver_options': {k: v for k, v in solver_options.items() if k != 'log_file'},
+        'model_size': {
+            'variables': int(size['variables'].sum()),
+            'constraints': int(size['constraints'].sum()),
+            'nonzeros': int(size['nonzeros'].sum()),
+            'by_component': size.reset_index().to_dict(orient='records'),
+        },
+        'highs': highs,
+        'stages': stages,
+        'peak_rss_mb': max((stage['peak_rss_mb'] or 0) for stage in stages) or None,
+    }
+    print(f"  ⏱ 最適化: 変数 {telemetry['model_size']['variables']}, 制約 {telemetry['model_size']['constraints']}, "
+          f"非ゼロ {telemetry['model_size']['nonzeros']}, "
+          + ', '.join(f"{stage['stage']} {stage['elapsed']:.2f}秒" for stage in stages))
+    return status, condition, telemetry
+
+
+def write_telemetry(telemetry, output_file, **extra):
+    """
+    計測結果を結果ファイルの隣に保存する
+
+    Args:
+        telemetry: profile_optimize() の計測結果
+        output_file: 結果ファイル（optimized_network_{year}.nc）
+        **extra: 追加で記録する項目（ワークブックのハッシュ、対象年など）
+
+    Returns:
+        保存したファイルのパス
+    """
+    path = telemetry_path(output_file)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'result_file': os.path.basename(output_file), **extra, **telemetry}, f,
+                  ensure_ascii=False, indent=1, default=str)
+    return path
+
+
+def load_telemetry(paths):
+    """
+    複数の計測結果を1つの表にする（1ファイル1行。コンポーネントごとの大きさは列 {component}_{項目}）
+    """
+    rows = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            telemetry = json.load(f)
+        row = {key: telemetry.get(key) for key in ('result_file', 'workbook', 'workbook_hash', 'year',
+                                                  'demand_change', 'status', 'snapshots', 'peak_rss_mb')}
+        row['run'] = path
+        row.update({key: telemetry['model_size'][key] for key in ('variables', 'constraints', 'nonzeros')})
+        for component in telemetry['model_size']['by_component']:
+            for key in ('variables', 'constraints', 'nonzeros'):
+                row[f"{component['component']}_{key}"] = component[key]
+        row.update({f"{stage['stage']}_elapsed": stage['elapsed'] for stage in telemetry['stages']})
+        row.update({key: value for key, value in telemetry['highs'].items() if key != 'model_status'})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def compare_telemetry(baseline, candidate):
+    """
+    2つの実行（例: V5 と V6 のワークブック）の計測結果を比べる
+
+    Args:
+        baseline, candidate: .telemetry.json のパス
+
+    Returns:
+        index=項目、列 baseline, candidate, ratio の表（ratio = candidate ÷ baseline）
+    """
+    table = load_telemetry([baseline, candidate]).set_index('run').T
+    table.columns = ['baseline', 'candidate']
+    numeric = table.apply(pd.to_numeric, errors='coerce').dropna(how='all')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        numeric['ratio'] = numeric['candidate'] / numeric['baseline']
+    return numeric
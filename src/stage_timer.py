@@ -0,0 +1,96 @@
+import os, time, threading
+from contextlib import contextmanager
+
+# 処理段階ごとの計測（経過時間と最大メモリ使用量）
+# ベンチマークだけでなく通常の実行（scenario_runner など）でも使えるよう、追加の依存はない。
+# メモリは psutil があれば使い、なければ /proc（Linux）と resource の ru_maxrss で測る。
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss():
+    """
+    現在のプロセスの常駐メモリ量 [byte]（取得できない場合は None）
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _max_rss():
+    # プロセス開始以降の最大常駐メモリ量 [byte]（Linuxは KB 単位で返る）
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@contextmanager
+def stage_timer(name, records=None, sample_interval=0.05, verbose=True):
+    """
+    with ブロックの経過時間と最大メモリ使用量を計測する
+
+    使用例:
+        records = []
+        with stage_timer('optimize', records):
+            network.optimize(...)
+
+    Args:
+        name: 段階の名前
+        records: 結果の辞書を追加するリスト（省略可）
+        sample_interval: メモリ使用量のサンプリング間隔（秒）
+        verbose: Trueの場合は終了時に結果を表示する
+
+    Yields:
+        結果の辞書（終了時に elapsed, rss_start_mb, rss_end_mb, peak_rss_mb が入る）
+    """
+    record = {'stage': name}
+    rss_start = current_rss()
+    max_rss_start = _max_rss()
+    peak = {'rss': rss_start or 0}
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(sample_interval):
+            peak['rss'] = max(peak['rss'], current_rss() or 0)
+
+    sampler = threading.Thread(target=sample, daemon=True) if rss_start is not None else None
+    if sampler is not None:
+        sampler.start()
+    t0 = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        if sampler is not None:
+            sampler.join()
+        rss_end = current_rss()
+        peak_rss = max(peak['rss'], rss_end or 0)
+        # プロセスの最大値がこの段階で更新された場合は、サンプリングで取りこぼした山も拾える
+        max_rss_end = _max_rss()
+        if max_rss_end is not None and max_rss_start is not None and max_rss_end > max_rss_start:
+            peak_rss = max(peak_rss, max_rss_end)
+
+        record.update({
+            'elapsed': elapsed,
+            'rss_start_mb': rss_start / 2**20 if rss_start is not None else None,
+            'rss_end_mb': rss_end / 2**20 if rss_end is not None else None,
+            'peak_rss_mb': peak_rss / 2**20 if peak_rss else None,
+        })
+        if records is not None:
+            records.append(record)
+        if verbose:
+            memory = f", 最大メモリ {record['peak_rss_mb']:.0f} MB" if record['peak_rss_mb'] else ''
+            print(f"  ⏱ {name}: {elapsed:.2f}秒{memory}")
@@ -0,0 +1,440 @@
+import os, json, hashlib
+import numpy as np, pandas as pd
+from .profile_store import write_profile_store
+from .demand_allocation import allocate_demand
+
+# 規模を指定して合成ネットワークと時系列データを作成する（ベンチマーク・規模の検証用）
+# 出力は実データと同じ形式:
+# - ワークブック: pypsa-japan-10BusModelV6.xlsx と同じシート（carriers, buses, generators,
+#   links, loads, stores, Demand）と列。揚水は貯水池バス（carrier 水）＋Store＋充電/放電Link
+# - 太陽光: バス名の列を持つ時系列ストア（solar_time_series.parquet と同じ形式）
+# - 水力: 水力稼働率の列を持つ時系列ストア（hydro_hourly.parquet と同じ形式）
+# - write_csv=True の場合は data/processed/*.csv と同じ形式のCSVも書き出す
+# 系統構成（topology）:
+# - 'mesh': 経度順の鎖＋近いバス同士の追加連系線
+# - 'grid': 格子状
+# - 'areas': 9エリアをそれぞれ複数のバス（変電所単位）に分割し、エリア内は 'mesh' と同じ方法で、
+#   エリア間はV6と同じ10本の連系線（最も近いバス同士）でつなぐ。DemandシートはOCCTOと同じエリア単位
+#   の列（'東京D' など）で、負荷シートの area / weight 列でバスに割り当てる（demand_allocation）
+# 同じ引数（seed含む）からは常に同じデータが作られる。
+
+# キャリアごとの (発電機数の割合, 限界費用 [円/MWh], 設備容量の範囲 [MW], Ramp制約)
+CARRIER_PARAMETERS = {
+    '原子力': (0.05, 1500, (800, 1400), 0.2),
+    '水力': (0.15, 0, (20, 400), 1.0),
+    '火力（石炭）': (0.15, 8500, (300, 1000), 0.5),
+    '火力（ガス）': (0.25, 12500, (200, 1500), 1.0),
+    '火力（石油）': (0.05, 20000, (100, 500), 1.0),
+    '太陽光': (0.25, 0, (50, 1500), 1.0),
+    'バイオマス': (0.1, 10000, (10, 100), 1.0),
+}
+# 各バスで需要のピークに対して確保する、太陽光以外の設備容量の倍率
+FIRM_CAPACITY_MARGIN = 1.3
+# 全設備容量の上限（全バスの需要ピークの合計に対する倍率）。発電機数が多い場合は容量を縮小する
+MAX_CAPACITY_RATIO = 3.0
+PROFILE_YEAR = 2024
+TOPOLOGIES = ('mesh', 'grid', 'areas')
+
+# 9エリアの代表座標と需要ピーク [MW]（V6ワークブックの値）
+AREAS = {
+    '北海道': (141.40, 43.07, 5215), '東北': (140.91, 38.28, 14229), '東京': (139.82, 35.67, 56986),
+    '中部': (137.01, 35.18, 25208), '北陸': (137.22, 36.70, 5109), '関西': (135.95, 34.73, 27629),
+    '中国': (132.46, 34.39, 10636), '四国': (134.05, 34.35, 5045), '九州': (130.41, 33.58, 17032),
+}
+# エリア間連系線 (名前, bus0, bus1, carrier, p_nom)（V6ワークブックの値）
+INTERCONNECTORS = [
+    ('北海道本州連系設備', '北海道', '東北', 'DC', 900),
+    ('東北東京間連系線', '東北', '東京', 'AC', 2360),
+    ('東京中部間連系線', '東京', '中部', 'DC', 2100),
+    ('中部北陸連系設備', '中部', '北陸', 'DC', 300),
+    ('中部関西連系線', '中部', '関西', 'AC', 2500),
+    ('北陸関西連系線', '北陸', '関西', 'AC', 1900),
+    ('関西中国間連系線', '関西', '中国', 'AC', 4550),
+    ('関西四国間連系設備', '関西', '四国', 'DC', 1400),
+    ('中国四国間連系線', '中国', '四国', 'AC', 1200),
+    ('中国九州間連系線', '中国', '九州', 'AC', 2470),
+]
+PUMPED_HYDRO_EFFICIENCY = 0.92
+
+
+def bus_names(n_buses):
+    return [f'B{i:04d}' for i in range(n_buses)]
+
+
+def _bus_table(n_buses, rng):
+    # 日本付近（経度129〜146, 緯度31〜45）にバスを配置する
+    return pd.DataFrame({
+        'name': bus_names(n_buses),
+        'carrier': 'AC',
+        'x': rng.uniform(129.0, 146.0, n_buses).round(3),
+        'y': rng.uniform(31.0, 45.0, n_buses).round(3),
+    })
+
+
+def _mesh_pairs(buses, extra_links, rng):
+    # 経度順につないだ鎖（全バスが連結）＋近いバス同士のランダムな追加連系線
+    order = buses.sort_values('x')['name'].to_numpy()
+    pairs = list(zip(order[:-1], order[1:]))
+    coords = buses.set_index('name')[['x', 'y']]
+    for _ in range(extra_links if len(order) > 2 else 0):
+        bus0 = rng.choice(order)
+        distance = np.hypot(coords['x'] - coords.loc[bus0, 'x'], coords['y'] - coords.loc[bus0, 'y'])
+        nearest = distance.drop(bus0).nsmallest(3).index
+        bus1 = nearest[rng.integers(len(nearest))]
+        if (bus0, bus1) not in pairs and (bus1, bus0) not in pairs:
+            pairs.append((bus0, bus1))
+    return pairs
+
+
+def _link_rows(names, carrier, bus0, bus1, p_nom, efficiency=1, p_min_pu=-1):
+    # linksシートの行（V6と同じ列）
+    return pd.DataFrame({
+        'name': names,
+        'carrier': carrier,
+        'bus0': bus0,
+        'bus1': bus1,
+        'p_nom': p_nom,
+        'efficiency': efficiency,
+        'marginal_cost': 0,
+        'capital_cost': 1,
+        'p_max_pu': 1,
+        'p_min_pu': p_min_pu,
+        'committable': False,
+        'min_up_time': 0,
+        'p_nom_extendable': False,
+        'ramp_limit_down': 1,
+        'ramp_limit_up': 1,
+        'start_up_cost': 0,
+    })
+
+
+def _link_table(buses, extra_links, rng):
+    pairs = _mesh_pairs(buses, extra_links, rng)
+    return _link_rows([f'L{i:04d}' for i in range(len(pairs))],
+                      rng.choice(['AC', 'DC'], len(pairs), p=[0.8, 0.2]),
+                      [p[0] for p in pairs], [p[1] for p in pairs],
+                      rng.integers(300, 3000, len(pairs)))
+
+
+def _grid_network(n_buses, rng):
+    # 日本付近の範囲に格子状にバスを並べ、上下左右のバスを連系線でつなぐ
+    columns = int(np.ceil(np.sqrt(n_buses)))
+    position = np.arange(n_buses)
+    row, column = position // columns, position % columns
+    rows = int(np.ceil(n_buses / columns))
+    buses = pd.DataFrame({
+        'name': bus_names(n_buses),
+        'carrier': 'AC',
+        'x': (129.0 + 17.0 * column / max(columns - 1, 1)).round(3),
+        'y': (31.0 + 14.0 * row / max(rows - 1, 1)).round(3),
+    })
+    names = buses['name'].to_numpy()
+    right = position[(column < columns - 1) & (position + 1 < n_buses)]
+    down = position[position + columns < n_buses]
+    bus0 = np.concatenate([names[right], names[down]])
+    bus1 = np.concatenate([names[right + 1], names[down + columns]])
+    links = _link_rows([f'L{i:04d}' for i in range(len(bus0))], 'AC', bus0, bus1,
+                       rng.integers(300, 3000, len(bus0)))
+    return buses, links
+
+
+def _area_network(n_buses, extra_links, rng):
+    # 9エリアを需要ピークに比例した数のバスに分割する（各エリア1つ以上）
+    if n_buses < len(AREAS):
+        raise ValueError(f"topology='areas' ではバス数を {len(AREAS)} 以上にしてください")
+    peaks = np.array([v[2] for v in AREAS.values()], dtype=float)
+    counts = 1 + np.floor((n_buses - len(AREAS)) * peaks / peaks.sum()).astype(int)
+    counts[np.argsort(-peaks)[:n_buses - counts.sum()]] += 1
+
+    frames, bus_peaks, pairs, carriers, p_noms, names = [], [], [], [], [], []
+    for (area, (x, y, peak)), count in zip(AREAS.items(), counts):
+        area_buses = pd.DataFrame({
+            'name': [f'{area}{i:03d}' for i in range(count)],
+            'carrier': 'AC',
+            'x': (x + rng.normal(0, 0.5, count)).round(3),
+            'y': (y + rng.normal(0, 0.4, count)).round(3),
+        })
+        frames.append(area_buses)
+        # エリアの需要ピークをバスにランダムな比率で配分する
+        bus_peaks.append(peak * rng.dirichlet(np.full(count, 2.0)))
+        area_pairs = _mesh_pairs(area_buses, count // 2 if extra_links is None else extra_links, rng)
+        pairs += area_pairs
+        carriers += ['AC'] * len(area_pairs)
+        p_noms += list(rng.integers(500, 5000, len(area_pairs)))
+        names += [f'{area}L{i:03d}' for i in range(len(area_pairs))]
+    buses = pd.concat(frames, ignore_index=True)
+
+    # エリア間連系線は両エリアで最も近いバス同士をつなぐ
+    coords = buses.set_index('name')[['x', 'y']]
+    for name, area0, area1, carrier, p_nom in INTERCONNECTORS:
+        c0 = coords[coords.index.str.startswith(area0)]
+        c1 = coords[coords.index.str.startswith(area1)]
+        distance = np.hypot(c0['x'].to_numpy()[:, None] - c1['x'].to_numpy(),
+                            c0['y'].to_numpy()[:, None] - c1['y'].to_numpy())
+        i, j = np.unravel_index(np.argmin(distance), distance.shape)
+        pairs.append((c0.index[i], c1.index[j]))
+        carriers.append(carrier)
+        p_noms.append(p_nom)
+        names.append(name)
+    links = _link_rows(names, carriers, [p[0] for p in pairs], [p[1] for p in pairs], p_noms)
+    return buses, links, np.concatenate(bus_peaks)
+
+
+def _pumped_hydro(buses, n_pumped_hydro, rng):
+    # 揚水発電所: 貯水池バス（carrier 水）＋Store＋充電Link（系統→貯水池）＋放電Link（貯水池→系統）
+    site = rng.choice(buses['name'].to_numpy(), n_pumped_hydro)
+    coords = buses.set_index('name').loc[site, ['x', 'y']]
+    names = [f'P{i:03d}' for i in range(n_pumped_hydro)]
+    p_nom = rng.integers(100, 1200, n_pumped_hydro)
+    reservoirs = pd.DataFrame({
+        'name': names,
+        'carrier': '水',
+        'x': (coords['x'].to_numpy() + rng.normal(0, 0.1, n_pumped_hydro)).round(3),
+        'y': (coords['y'].to_numpy() + rng.normal(0, 0.1, n_pumped_hydro)).round(3),
+    })
+    stores = pd.DataFrame({'name': names, 'bus': names, 'e_nom': p_nom * rng.integers(6, 10, n_pumped_hydro),
+                           'carrier': '水'})
+    links = pd.concat([
+        _link_rows([f'{n}(充電)' for n in names], '揚水（充電）', site, names, p_nom,
+                   efficiency=PUMPED_HYDRO_EFFICIENCY, p_min_pu=0),
+        _link_rows([f'{n}(放電)' for n in names], '揚水（放電）', names, site, p_nom,
+                   efficiency=PUMPED_HYDRO_EFFICIENCY, p_min_pu=0),
+    ], ignore_index=True)
+    return reservoirs, stores, links
+
+
+def _demand_profiles(bus_list, rng, peaks=None, year=PROFILE_YEAR):
+    # 季節変動（夏・冬のピーク）× 日変動 × 平日/休日 × ノイズ の需要 [MW]（閏日を含む1年分）
+    index = pd.date_range(f'{year}-01-01 00:00', f'{year}-12-31 23:00', freq='h')
+    day_of_year = index.dayofyear.to_numpy()
+    hour = index.hour.to_numpy()
+    seasonal = 1.0 + 0.15 * np.cos(4 * np.pi * (day_of_year - 20) / 365)
+    daily = 0.8 + 0.2 * np.sin(np.pi * np.clip(hour - 6, 0, 16) / 16)
+    weekday = np.where(index.dayofweek.to_numpy() >= 5, 0.9, 1.0)
+    shape = seasonal * daily * weekday
+    if peaks is None:
+        peaks = rng.uniform(500, 8000, len(bus_list))
+    noise = rng.normal(1.0, 0.02, (len(index), len(bus_list)))
+    values = (shape[:, None] * noise / shape.max() * peaks).round(1)
+    return pd.DataFrame(values, index=pd.DatetimeIndex(index, name='Date'), columns=[f'{b}D' for b in bus_list])
+
+
+def _solar_profiles(buses, rng, year=PROFILE_YEAR):
+    # 緯度に応じた日射の日変化 × 季節変化 × 日ごとの天候 の稼働率
+    index = pd.date_range(f'{year}-01-01 00:00', f'{year}-12-31 23:00', freq='h')
+    hour = index.hour.to_numpy()
+    day_of_year = index.dayofyear.to_numpy()
+    daylight = np.clip(np.sin(np.pi * (hour - 6) / 12), 0, None)
+    season = 0.75 + 0.25 * np.sin(2 * np.pi * (day_of_year - 80) / 365)
+    n_days = len(index) // 24
+    weather = rng.beta(4, 2, (n_days, len(buses))).repeat(24, axis=0)
+    latitude = (1.0 - (buses['y'].to_numpy() - 31.0) / 60.0)
+    values = 0.8 * daylight[:, None] * season[:, None] * weather * latitude
+    return pd.DataFrame(values.round(4), index=index, columns=buses['name'].to_numpy())
+
+
+def _hydro_profile(rng, year=PROFILE_YEAR):
+    # 雪解け（春）と梅雨（初夏）に高くなる月別稼働率
+    index = pd.date_range(f'{year}-01-01 00:00', f'{year}-12-31 23:00', freq='h')
+    monthly = np.array([0.35, 0.35, 0.45, 0.65, 0.7, 0.7, 0.65, 0.5, 0.45, 0.4, 0.35, 0.35])
+    values = monthly[index.month.to_numpy() - 1] * rng.uniform(0.95, 1.05)
+    return pd.DataFrame({'水力稼働率': values.round(6)}, index=index)
+
+
+def _generator_table(buses, demand, n_generators, rng):
+    names = buses['name'].to_numpy()
+    carriers = list(CARRIER_PARAMETERS)
+    shares = np.array([CARRIER_PARAMETERS[c][0] for c in carriers])
+    carrier = rng.choice(carriers, n_generators, p=shares / shares.sum())
+    # 各バスに1台は火力（ガス）を置き、残りはランダムなバスに配置する
+    n_fixed = min(len(names), n_generators)
+    carrier[:n_fixed] = '火力（ガス）'
+    bus = np.concatenate([names[:n_fixed], rng.choice(names, n_generators - n_fixed)])
+
+    low = np.array([CARRIER_PARAMETERS[c][2][0] for c in carrier])
+    high = np.array([CARRIER_PARAMETERS[c][2][1] for c in carrier])
+    p_nom = rng.uniform(low, high).round(0)
+    total_peak = demand.max().sum()
+    if p_nom.sum() > MAX_CAPACITY_RATIO * total_peak:
+        p_nom = (p_nom * MAX_CAPACITY_RATIO * total_peak / p_nom.sum()).round(0)
+
+    # 確実に出せる設備容量（太陽光は0、水力は稼働率の下限分）がバスの需要ピーク×余裕率を
+    # 下回る場合は、各バスの火力（ガス）の容量を増やす
+    peaks = pd.Series(demand.max().to_numpy(), index=names)
+    firm_share = np.select([carrier == '太陽光', carrier == '水力'], [0.0, 0.3], 1.0)
+    firm = pd.Series(firm_share * p_nom, index=bus).groupby(level=0).sum()
+    shortage = (peaks * FIRM_CAPACITY_MARGIN - firm.reindex(names, fill_value=0.0)).clip(lower=0)
+    p_nom[:n_fixed] += shortage.to_numpy()[:n_fixed].round(0)
+
+    coords = buses.set_index('name')
+    ramp = np.array([CARRIER_PARAMETERS[c][3] for c in carrier])
+    return pd.DataFrame({
+        'name': [f'G{i:05d}' for i in range(n_generators)],
+        'bus': bus,
+        'carrier': carrier,
+        'efficiency': 1,
+        'capital_cost': 100000,
+        'marginal_cost': [CARRIER_PARAMETERS[c][1] for c in carrier],
+        'p_nom': p_nom,
+        'p_max_pu': 1,
+        'p_min_pu': 0,
+        'min_up_time': 0,
+        'committable': False,
+        'p_nom_extendable': False,
+        'ramp_limit_up': ramp,
+        'ramp_limit_down': ramp,
+        'y': coords.loc[bus, 'y'].to_numpy() + rng.normal(0, 0.05, n_generators).round(4),
+        'x': coords.loc[bus, 'x'].to_numpy() + rng.normal(0, 0.05, n_generators).round(4),
+    })
+
+
+def synthetic_case(n_buses=10, n_generators=100, extra_links=None, seed=0, topology='mesh', n_pumped_hydro=0):
+    """
+    合成ネットワークのシートと時系列データを作成する（ファイルには書き出さない）
+
+    Args:
+        n_buses: バス数（系統側のACバスの数。揚水の貯水池バスは含まない）
+        n_generators: 発電機数（バス数以上）
+        extra_links: 鎖状の連系線に加える追加の連系線数（省略時はバス数の半分。'areas' ではエリアごと）
+        seed: 乱数シード
+        topology: 系統構成（'mesh', 'grid', 'areas'）
+        n_pumped_hydro: 揚水発電所の数
+
+    Returns:
+        {'sheets': {シート名: DataFrame}, 'demand': 需要（Demandシートの列）, 'solar': 太陽光稼働率, 'hydro': 水力稼働率}
+    """
+    if n_generators < n_buses:
+        raise ValueError(f"発電機数 ({n_generators}) はバス数 ({n_buses}) 以上にしてください")
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"topology は {TOPOLOGIES} のいずれかにしてください: {topology}")
+    rng = np.random.default_rng(seed)
+    peaks = None
+    if topology == 'mesh':
+        buses = _bus_table(n_buses, rng)
+        links = _link_table(buses, n_buses // 2 if extra_links is None else extra_links, rng)
+    elif topology == 'grid':
+        buses, links = _grid_network(n_buses, rng)
+    else:
+        buses, links, peaks = _area_network(n_buses, extra_links, rng)
+    if topology == 'areas':
+        # 需要はOCCTOと同じエリア単位の列とし、負荷にはエリアとバスの需要ピーク（割当の重み）を持たせる
+        demand = _demand_profiles(list(AREAS), rng, np.array([v[2] for v in AREAS.values()], dtype=float))
+        loads = pd.DataFrame({'name': [f'{b}D' for b in buses['name']], 'bus': buses['name'],
+                              'area': [f'{b[:-3]}D' for b in buses['name']], 'weight': peaks.round(1)})
+        bus_demand = allocate_demand(demand, loads.set_index('name')[['area', 'weight']], cache_dir=None)
+    else:
+        demand = bus_demand = _demand_profiles(buses['name'], rng, peaks)
+        loads = pd.DataFrame({'name': demand.columns, 'bus': buses['name']})
+    generators = _generator_table(buses, bus_demand, n_generators, rng)
+    carriers = ['AC', 'DC'] + list(CARRIER_PARAMETERS)
+    stores = pd.DataFrame(columns=['name', 'bus', 'e_nom', 'carrier'])
+    solar, hydro = _solar_profiles(buses, rng), _hydro_profile(rng)
+
+    all_buses = buses
+    if n_pumped_hydro > 0:
+        reservoirs, stores, pumped_links = _pumped_hydro(buses, n_pumped_hydro, rng)
+        all_buses = pd.concat([buses, reservoirs], ignore_index=True)
+        links = pd.concat([links, pumped_links], ignore_index=True)
+        carriers += ['揚水（充電）', '揚水（放電）', '水']
+    sheets = {
+        'carriers': pd.DataFrame({'name': carriers, 'co2_emissions': 0}),
+        'buses': all_buses,
+        'links': links,
+        'generators': generators,
+        'loads': loads,
+        'stores': stores,
+    }
+    return {'sheets': sheets, 'demand': demand, 'solar': solar, 'hydro': hydro}
+
+
+def _demand_sheet(demand):
+    # V6のDemandシートと同じく、日時・曜日・週番号の後に負荷名（'areas' ではエリア）の列を並べる
+    sheet = demand.copy()
+    sheet.insert(0, 'Day of week', demand.index.day_name())
+    sheet.insert(1, 'Week of year', demand.index.isocalendar().week.to_numpy())
+    return sheet
+
+
+def write_synthetic_case(output_dir='./data/synthetic', n_buses=10, n_generators=100, extra_links=None, seed=0,
+                         topology='mesh', n_pumped_hydro=0, write_csv=False, overwrite=False):
+    """
+    合成ネットワークのワークブックと時系列ストアを書き出す
+
+    引数ごとにサブディレクトリを作り、作成済みの場合は再利用する（overwrite=True で作り直す）。
+    引数は synthetic_case() と同じ。
+
+    Args:
+        write_csv: Trueの場合は data/processed と同じ形式のCSV（solar_time_series.csv, hydro_hourly.csv）も書き出す
+
+    Returns:
+        {'workbook': .xlsx, 'solar': 太陽光の .parquet, 'hydro': 水力の .parquet, 'directory': 出力先}
+    """
+    params = {'n_buses': n_buses, 'n_generators': n_generators, 'extra_links': extra_links, 'seed': seed}
+    # 既定値の構成は以前と同じディレクトリ名になるよう、既定値以外の場合だけキーに含める
+    if topology != 'mesh':
+        params['topology'] = topology
+    if n_pumped_hydro:
+        params['n_pumped_hydro'] = n_pumped_hydro
+    if topology == 'areas':
+        # エリア単位のDemandシート＋負荷の割当表の形式（以前のバス単位の形式と区別する）
+        params['demand'] = 'areas'
+    key = hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+    directory = os.path.join(output_dir, f'synthetic_{n_buses}bus_{n_generators}gen_{key}')
+    paths = {
+        'workbook': os.path.join(directory, 'network.xlsx'),
+        'solar': os.path.join(directory, 'solar_time_series.parquet'),
+        'hydro': os.path.join(directory, 'hydro_hourly.parquet'),
+        'directory': directory,
+    }
+    outputs = ['workbook', 'solar', 'hydro']
+    if write_csv:
+        paths['solar_csv'] = os.path.join(directory, 'solar_time_series.csv')
+        paths['hydro_csv'] = os.path.join(directory, 'hydro_hourly.csv')
+        outputs += ['solar_csv', 'hydro_csv']
+    if not overwrite and all(os.path.exists(paths[k]) for k in outputs):
+        return paths
+
+    os.makedirs(directory, exist_ok=True)
+    case = synthetic_case(n_buses, n_generators, extra_links, seed, topology, n_pumped_hydro)
+    tmp_file = f"{paths['workbook']}.{os.getpid()}.tmp.xlsx"
+    with pd.ExcelWriter(tmp_file, engine='openpyxl') as writer:
+        for sheet_name, df in case['sheets'].items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+        _demand_sheet(case['demand']).to_excel(writer, sheet_name='Demand')
+    os.replace(tmp_file, paths['workbook'])
+    if write_csv:
+        # ストアより先に書き出す（CSVの方が新しいとストアが作り直されるため）
+        case['solar'].to_csv(paths['solar_csv'], encoding='utf-8-sig')
+        case['hydro'].to_csv(paths['hydro_csv'], index_label='日時', encoding='utf-8-sig')
+    write_profile_store(case['solar'], paths['solar'], source='synthetic')
+    write_profile_store(case['hydro'], paths['hydro'], source='synthetic')
+    with open(os.path.join(directory, 'params.json'), 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=1)
+    sheets = case['sheets']
+    print(f"  ✓ 合成ネットワークを作成しました: {directory} ({n_buses}バス, {n_generators}発電機, "
+          f"{len(sheets['links'])}リンク, {len(sheets['stores'])}揚水)")
+    return paths
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='合成ネットワーク（V6ワークブック形式）を作成する')
+    parser.add_argument('--buses', type=int, default=100)
+    parser.add_argument('--generators', type=int, default=1000)
+    parser.add_argument('--topology', default='areas', choices=TOPOLOGIES)
+    parser.add_argument('--pumped-hydro', type=int, default=0)
+    parser.add_argument('--extra-links', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default='./data/synthetic')
+    parser.add_argument('--csv', action='store_true', help='data/processed と同じ形式のCSVも書き出す')
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args(argv)
+    paths = write_synthetic_case(args.output_dir, args.buses, args.generators, args.extra_links, args.seed,
+                                 args.topology, args.pumped_hydro, args.csv, args.overwrite)
+    for name, path in paths.items():
+        print(f"  {name}: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import numpy as np, pandas as pd
+from scipy.cluster.vq import kmeans2
+
+# 代表日（代表期間）による時間集約
+# 1年分の需要・太陽光・水力の時系列を日単位のプロファイルにしてk-meansでクラスタリングし、
+# 各クラスタを1つの代表日で置き換える。代表日の時系列にはクラスタ内の平均値を使い、
+# snapshot_weightings（objective, generators）にクラスタの日数を設定するので、
+# 年間の電力量・費用は元の時系列と一致する（平均値×日数＝合計値）。
+
+
+def _time_series_frames(network):
+    # 時間変化する入力データ（需要、発電機の稼働率など）を列挙する
+    for c in network.components:
+        if c.static.empty:
+            continue
+        for attr, df in c.dynamic.items():
+            # 最適化結果（Output）は対象外
+            if df.empty or attr not in c.defaults.index or not c.defaults.loc[attr, 'status'].startswith('Input'):
+                continue
+            yield c, attr, df
+
+
+def _daily_features(network, period_hours):
+    # (期間数, period_hours × 列数) の特徴量行列。列ごとに最大値で正規化する
+    frames = []
+    for c, attr, df in _time_series_frames(network):
+        values = df.to_numpy(dtype=float)
+        scale = np.abs(values).max(axis=0)
+        scale[scale == 0] = 1.0
+        frames.append(values / scale)
+    values = np.hstack(frames)
+    n_periods = len(network.snapshots) // period_hours
+    return values.reshape(n_periods, period_hours * values.shape[1])
+
+
+def cluster_periods(network, n_periods, period_hours=24, seed=0):
+    """
+    日単位（period_hours単位）のプロファイルをクラスタリングする
+
+    Args:
+        network: PyPSA Network object（1時間刻みで、期間の長さで割り切れるスナップショット）
+        n_periods: 代表期間の数
+        period_hours: 1期間の時間数（24なら代表日、168なら代表週）
+        seed: k-meansの乱数シード
+
+    Returns:
+        (各期間のクラスタ番号の配列, 各クラスタの代表期間番号の配列)
+    """
+    if len(network.snapshots) % period_hours != 0:
+        raise ValueError(f"スナップショット数 {len(network.snapshots)} が {period_hours} で割り切れません")
+    features = _daily_features(network, period_hours)
+    centroids, labels = kmeans2(features, n_periods, minit='++', seed=seed)
+
+    # 空のクラスタを除いて番号を振り直す
+    used = np.unique(labels)
+    labels = np.searchsorted(used, labels)
+    centroids = centroids[used]
+
+    # 各クラスタで重心に最も近い実在の期間を代表期間とする
+    medoids = np.array([
+        np.flatnonzero(labels == k)[np.argmin(((features[labels == k] - centroids[k]) ** 2).sum(axis=1))]
+        for k in range(len(used))
+    ])
+    return labels, medoids
+
+
+def aggregate_snapshots(network, n_periods, period_hours=24, seed=0):
+    """
+    代表期間で時間集約したネットワークを作成する
+
+    代表期間は時系列順に並べ、時系列データはクラスタ内の平均値に置き換える。
+    snapshot_weightings の objective と generators にはクラスタの期間数を、
+    stores には1（経過時間）を設定する。
+    代表期間は連続していないので、PyPSAのRamp制約（ramp_limit_up/down）は代表期間の
+    境界でも前の時刻の出力を基準にする点に注意すること。
+
+    Args:
+        network: PyPSA Network object（時系列データを設定済み）
+        n_periods: 代表期間の数
+        period_hours: 1期間の時間数（24なら代表日）
+        seed: k-meansの乱数シード
+    """
+    labels, medoids = cluster_periods(network, n_periods, period_hours, seed)
+    order = np.argsort(medoids)
+    medoids = medoids[order]
+    # 時系列順に並べた代表期間の番号に合わせてクラスタ番号を付け直す
+    labels = np.argsort(order)[labels]
+    counts = np.bincount(labels, minlength=len(medoids))
+
+    positions = (medoids[:, None] * period_hours + np.arange(period_hours)).ravel()
+    snapshots = network.snapshots[positions]
+    aggregated = network.copy(snapshots=snapshots)
+
+    # 時系列データをクラスタ平均に置き換える
+    for c, attr, df in _time_series_frames(network):
+        values = df.to_numpy(dtype=float).reshape(len(labels), period_hours, df.shape[1])
+        sums = np.zeros((len(medoids), period_hours, df.shape[1]))
+        np.add.at(sums, labels, values)
+        means = sums / counts[:, None, None]
+        aggregated.components[c.name].dynamic[attr] = pd.DataFrame(
+            means.reshape(-1, df.shape[1]), index=snapshots, columns=df.columns)
+
+    weights = np.repeat(counts, period_hours).astype(float)
+    aggregated.snapshot_weightings['objective'] = weights
+    aggregated.snapshot_weightings['generators'] = weights
+    aggregated.snapshot_weightings['stores'] = 1.0
+
+    error = profile_error(network, labels, aggregated, period_hours)
+    print(f"代表期間: {len(medoids)}個 × {period_hours}時間 (元の{len(network.snapshots)}時間 → {len(snapshots)}時間)")
+    print(f"  時系列の近似誤差 (NRMSE): 平均 {error['nrmse'].mean():.3f}, 最大 {error['nrmse'].max():.3f}")
+    return aggregated
+
+
+def profile_error(network, labels, aggregated, period_hours=24):
+    """
+    代表期間で再構成した時系列と元の時系列の誤差（列ごとのNRMSEと年間量の誤差）
+
+    Args:
+        network: 集約前の PyPSA Network object
+        labels: 各期間のクラスタ番号（代表期間の時系列順）
+        aggregated: aggregate_snapshots() で作成したネットワーク
+        period_hours: 1期間の時間数
+    """
+    records = []
+    for c, attr, df in _time_series_frames(network):
+        rep = aggregated.components[c.name].dynamic[attr][df.columns].to_numpy()
+        rep = rep.reshape(-1, period_hours, df.shape[1])[labels].reshape(-1, df.shape[1])
+        orig = df.to_numpy(dtype=float)
+        span = orig.max(axis=0) - orig.min(axis=0)
+        span[span == 0] = 1.0
+        nrmse = np.sqrt(((rep - orig) ** 2).mean(axis=0)) / span
+        total = orig.sum(axis=0)
+        energy_error = np.divide(rep.sum(axis=0) - total, total, out=np.zeros_like(total), where=total != 0)
+        records.append(pd.DataFrame({'component': c.name, 'attr': attr, 'name': df.columns,
+                                     'nrmse': nrmse, 'energy_error': energy_error}))
+    return pd.concat(records, ignore_index=True)
+
+
+def approximation_error(full_network, aggregated_network):
+    """
+    最適化済みの全時間解像度ネットワークと代表期間ネットワークの結果を比較する
+
+    Returns:
+        指標（総費用、キャリア別発電電力量）ごとの値と相対誤差のDataFrame
+    """
+    def _energy_by_carrier(n):
+        weights = n.snapshot_weightings['generators']
+        return n.generators_t.p.mul(weights, axis=0).sum().groupby(n.generators.carrier).sum()
+
+    full = pd.concat([pd.Series({'総費用': full_network.objective}), _energy_by_carrier(full_network)])
+    aggregated = pd.concat([pd.Series({'総費用': aggregated_network.objective}), _energy_by_carrier(aggregated_network)])
+    report = pd.DataFrame({'full': full, 'aggregated': aggregated.reindex(full.index)})
+    report['relative_error'] = (report['aggregated'] - report['full']) / report['full'].where(report['full'] != 0)
+    return report
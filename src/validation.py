@@ -0,0 +1,280 @@
+import os, re, sys, glob, argparse, functools, unicodedata
+import numpy as np, pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .aggregation import _group_columns
+from .profile_store import read_profile_store, write_profile_store
+
+# 2024年の実績データとの比較（検証）
+# OCCTO（電力広域的運営推進機関）のエリア需給実績（エリア × 電源種別の発電実績）を、
+# モデルのキャリア × バス（エリア）の表に変換し、2月29日を除いた1時間値のストアに保存する。
+# 結果ファイル（complete_network/*.nc）は results_reader.open_result で generators_t.p だけを読み、
+# (carrier, bus) に集計して実績と比較する。ファイルごとに読み込み→集計→指標の計算→解放を
+# 行う1回の走査で、指標は全ての (carrier, bus) 列についてまとめて計算する。
+# パラメータの較正（多数の候補の結果の検証）では workers で並列に処理できる。
+#
+# 実行例:
+#   python -m src.validation complete_network --actuals ./data/processed/actuals_2024.parquet
+
+DEFAULT_ACTUALS_FILE = './data/processed/actuals_2024.parquet'
+DEFAULT_REPORT_FILE = './complete_network/validation_report.csv'
+NATIONAL = '全国'
+COLUMN_SEPARATOR = '|'
+
+# OCCTOのエリア番号（ファイル名 eria_jukyu_YYYYMM_NN.csv の NN）→ バス名
+AREA_CODES = {
+    '01': '北海道', '02': '東北', '03': '東京', '04': '中部', '05': '北陸',
+    '06': '関西', '07': '中国', '08': '四国', '09': '九州', '10': '沖縄',
+}
+
+# 実績の列名（全角・半角の違いは NFKC で正規化して比較）→ モデルのキャリア名
+# 同じキャリアに複数の列を割り当てた場合は合計する
+CARRIER_MAP = {
+    '原子力': '原子力',
+    '火力(LNG)': '火力（ガス）',
+    '火力(石炭)': '火力（石炭）',
+    '火力(石油)': '火力（石油）',
+    '火力(その他)': 'その他',
+    '水力': '水力',
+    'バイオマス': 'バイオマス',
+    '太陽光発電実績': '太陽光',
+    '太陽光': '太陽光',
+}
+
+
+def _normalize(name):
+    return unicodedata.normalize('NFKC', str(name)).strip()
+
+
+def _read_occto_csv(path):
+    # ヘッダーの前に単位などの行がある場合に備えて、DATE / 日付 を含む行をヘッダーとする
+    for encoding in ('cp932', 'utf-8-sig'):
+        try:
+            with open(path, encoding=encoding) as f:
+                lines = f.readlines()
+            break
+        except UnicodeDecodeError:
+            continue
+    header = next(i for i, line in enumerate(lines) if 'DATE' in line.upper() or '日付' in line)
+    data = pd.read_csv(path, encoding=encoding, skiprows=header, thousands=',')
+    data.columns = [_normalize(c) for c in data.columns]
+    date_column = next(c for c in data.columns if c.upper() == 'DATE' or c == '日付')
+    time_column = next((c for c in data.columns if c.upper() == 'TIME' or c == '時刻'), None)
+    timestamps = data[date_column].astype(str)
+    if time_column is not None:
+        # '0:00' と '0:00-0:30' の両方の形式に対応（区間の開始時刻を使う）
+        timestamps = timestamps + ' ' + data[time_column].astype(str).str.split(r'[-~〜]').str[0]
+    data.index = pd.to_datetime(timestamps)
+    return data.drop(columns=[c for c in (date_column, time_column) if c is not None])
+
+
+def occto_area_files(directory):
+    """
+    ディレクトリ内のエリア需給実績CSVをエリアごとにまとめる（ファイル名末尾のエリア番号で判別）
+
+    Returns:
+        {バス名: ファイルパスのリスト}
+    """
+    files = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+        match = re.search(r'_(\d{2})\.csv$', os.path.basename(path))
+        if match and match.group(1) in AREA_CODES:
+            files.setdefault(AREA_CODES[match.group(1)], []).append(path)
+    return files
+
+
+def convert_occto_actuals(files, output_file=DEFAULT_ACTUALS_FILE, carrier_map=None, scale=1.0):
+    """
+    OCCTOのエリア需給実績を (carrier, bus) ごとの1時間値 [MW] のストアに変換する
+
+    Args:
+        files: {バス名: CSVのパスまたはパスのリスト}、またはCSVを置いたディレクトリ
+        output_file: 保存先の .parquet
+        carrier_map: 実績の列名→キャリア名（省略時は CARRIER_MAP）
+        scale: MW に換算する係数（万kW の場合は 10、30分値の MWh の場合は 2）
+
+    Returns:
+        列が (carrier, bus) のマルチインデックスのDataFrame
+    """
+    if isinstance(files, str):
+        files = occto_area_files(files)
+    carrier_map = {_normalize(k): v for k, v in (carrier_map or CARRIER_MAP).items()}
+    frames = {}
+    for bus, paths in files.items():
+        paths = [paths] if isinstance(paths, str) else paths
+        data = pd.concat([_read_occto_csv(path) for path in paths]).sort_index()
+        data = data[~data.index.duplicated()]
+        columns = [c for c in data.columns if c in carrier_map]
+        by_carrier = data[columns].apply(pd.to_numeric, errors='coerce').T.groupby(
+            [carrier_map[c] for c in columns]).sum(min_count=1).T
+        # 30分値などは1時間ごとの平均にする
+        frames[bus] = by_carrier.resample('h').mean() * scale
+        print(f"  ✓ {bus}: {len(paths)}ファイル, {list(by_carrier.columns)}")
+
+    actuals = pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+    actuals.columns.names = ['carrier', 'bus']
+    flat = actuals.set_axis([f'{carrier}{COLUMN_SEPARATOR}{bus}' for carrier, bus in actuals.columns], axis=1)
+    write_profile_store(flat, output_file, source='OCCTO エリア需給実績')
+    print(f"✓ 実績データを保存しました: {output_file} ({actuals.shape[1]}列)")
+    return actuals
+
+
+@functools.lru_cache(maxsize=4)
+def load_actuals(path=DEFAULT_ACTUALS_FILE):
+    """
+    convert_occto_actuals() で保存した実績データを読み込む（プロセスごとに1回だけ読み込む）
+
+    Returns:
+        列が (carrier, bus) のマルチインデックス、2月29日を除いた1時間値のDataFrame
+    """
+    data = read_profile_store(path)
+    data.columns = pd.MultiIndex.from_tuples([tuple(c.split(COLUMN_SEPARATOR, 1)) for c in data.columns],
+                                             names=['carrier', 'bus'])
+    return data
+
+
+def _with_national(data):
+    # キャリアごとに全エリアの合計（bus = '全国'）の列を加える
+    # 欠測のあるエリアを含む時刻は合計も欠測にする
+    national = data.T.groupby(level='carrier').sum().T
+    national = national.mask(data.isna().T.groupby(level='carrier').any().T)
+    national.columns = pd.MultiIndex.from_product([national.columns, [NATIONAL]], names=['carrier', 'bus'])
+    return pd.concat([data, national], axis=1)
+
+
+def error_metrics(model, actual):
+    """
+    列ごとの誤差指標をまとめて計算する（model, actual は同じ形の (時刻 × 列) の配列）
+
+    - mae: 平均絶対誤差 [MW]
+    - bias: 平均誤差（モデル − 実績）[MW]
+    - ramp_error: 1時間の出力変化の平均絶対誤差 [MW]
+    - duration_distance: 持続曲線（降順に並べた出力）どうしの平均絶対差 [MW]
+    - nmae: mae ÷ 実績の平均
+    - energy_error: 電力量の相対誤差（モデル − 実績）÷ 実績
+    """
+    diff = model - actual
+    ramp = np.abs(np.diff(model, axis=0) - np.diff(actual, axis=0))
+    duration = np.abs(np.sort(model, axis=0) - np.sort(actual, axis=0))
+    actual_mean = actual.mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(actual_mean != 0, 1 / actual_mean, np.nan)
+    mae = np.abs(diff).mean(axis=0)
+    return {
+        'mae': mae,
+        'bias': diff.mean(axis=0),
+        'ramp_error': ramp.mean(axis=0) if len(ramp) else np.full(model.shape[1], np.nan),
+        'duration_distance': duration.mean(axis=0),
+        'nmae': mae * relative,
+        'energy_error': diff.mean(axis=0) * relative,
+        'actual_mean': actual_mean,
+        'model_mean': model.mean(axis=0),
+    }
+
+
+def _align_actuals(actuals, timestamps):
+    # 結果の時刻の年を実績の年に置き換えて、同じ月日時刻の実績を取り出す（近い時刻で補わない）
+    from .preprocess_data import shift_year
+    return actuals.reindex(shift_year(timestamps, actuals.index[0].year)).set_axis(timestamps)
+
+
+def validate_result(path, actuals_file=DEFAULT_ACTUALS_FILE):
+    """
+    1つの結果ファイルを実績と比較する
+
+    代表日などで集約された結果は、代表日の時刻どうしで比較する（重みは使わない）。
+    実績が欠測している時刻（比較する列のいずれかが欠測）は除外し、その数を missing_hours に記録する。
+
+    Returns:
+        (carrier, bus) ごとの誤差指標のDataFrame（bus = '全国' は全エリアの合計）
+    """
+    from .results_reader import open_result
+
+    ds = open_result(path, variables=[('generators', 'p')], chunks=None)
+    timestamps = pd.DatetimeIndex(ds['timestamp'].values)
+    p = ds['generators_t_p'].transpose('snapshot', 'generators')
+    model = _group_columns(p.values, ds['generators_carrier'].sel(generators=p['generators']).values,
+                           ds['generators_bus'].sel(generators=p['generators']).values, timestamps)
+    ds.close()
+
+    actuals = load_actuals(actuals_file)
+    model, actuals = _with_national(model), _with_national(actuals)
+    columns = model.columns.intersection(actuals.columns)
+    actual = _align_actuals(actuals[columns], timestamps)
+    covered = actual.notna().all(axis=1).to_numpy()
+    if not covered.all():
+        print(f"  ⚠ {os.path.basename(path)}: 実績のない {int((~covered).sum())}時間を除外します")
+    metrics = error_metrics(model[columns].to_numpy(dtype=float)[covered], actual.to_numpy(dtype=float)[covered])
+
+    report = pd.DataFrame(metrics, index=columns).reset_index()
+    report.insert(0, 'file', os.path.basename(path))
+    report['hours'] = int(covered.sum())
+    report['missing_hours'] = int((~covered).sum())
+    return report
+
+
+def validate_results(sources='complete_network', actuals_file=DEFAULT_ACTUALS_FILE, output_file=DEFAULT_REPORT_FILE,
+                     workers=1):
+    """
+    結果ファイルを1つずつ実績と比較し、1つの表にまとめて保存する
+
+    Args:
+        sources: .nc ファイルとディレクトリ（直下の *.nc）のリスト
+        actuals_file: convert_occto_actuals() で保存した実績データ
+        output_file: 保存先（拡張子で .parquet / .csv を選ぶ。None の場合は保存しない）
+        workers: 並列ワーカー数（1の場合はこのプロセスで逐次処理）
+
+    Returns:
+        (file, carrier, bus) ごとの誤差指標のDataFrame
+    """
+    from .figure_batch import network_files
+
+    files = network_files(sources)
+    if not files:
+        raise FileNotFoundError('結果ファイルが見つかりません')
+    print(f"検証する結果ファイル: {len(files)}個 (ワーカー数: {workers})")
+
+    reports = []
+    if workers == 1:
+        for path in files:
+            try:
+                reports.append(validate_result(path, actuals_file))
+            except Exception as e:
+                print(f"  ✗ {path}: {e}")
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(validate_result, path, actuals_file): path for path in files}
+            for future in as_completed(futures):
+                try:
+                    reports.append(future.result())
+                except Exception as e:
+                    print(f"  ✗ {futures[future]}: {e}")
+    if not reports:
+        raise RuntimeError('検証できた結果ファイルがありません')
+
+    report = pd.concat(reports, ignore_index=True).sort_values(['file', 'carrier', 'bus']).reset_index(drop=True)
+    # 指標は float32 で保存して表を小さくする
+    metric_columns = report.columns.difference(['file', 'carrier', 'bus', 'hours', 'missing_hours'])
+    report[metric_columns] = report[metric_columns].astype(np.float32)
+    if output_file is not None:
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        if output_file.endswith('.parquet'):
+            report.to_parquet(output_file, index=False)
+        else:
+            report.to_csv(output_file, index=False, encoding='utf-8-sig')
+        print(f"✓ 検証結果を保存しました: {output_file} ({report['file'].nunique()}ファイル, {len(report)}行)")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='最適化結果（.nc）を2024年の実績データと比較する')
+    parser.add_argument('sources', nargs='*', default=['complete_network'], help='.nc ファイルまたはディレクトリ')
+    parser.add_argument('--actuals', default=DEFAULT_ACTUALS_FILE, help='convert_occto_actuals() で保存した実績データ')
+    parser.add_argument('--output', default=DEFAULT_REPORT_FILE)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args(argv)
+    validate_results(args.sources, args.actuals, args.output, args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+import os, json, time, functools
+import numpy as np, pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .stage_timer import stage_timer
+
+# 気象年アンサンブル（同じネットワークを20〜40の気象年の時系列で最適化する）
+# 時系列データは気象年の次元を持つ1つの配列として .npy に保存する。
+# - solar.npy: (weather_year, hour, bus) の float32
+# - hydro.npy: (weather_year, hour) の float32
+# - ensemble.json: 気象年・バス名・水力の列名などのメタデータ
+# hour は2月29日を除いた1月1日0時からの8760時間。読み込みはメモリマップで行うため、
+# 並列ワーカーは同じページ（OSのページキャッシュ）を共有し、各プロセスには
+# 自分の気象年・必要なバスの分だけがコピーされる。
+
+HOURS_PER_YEAR = 8760
+METADATA_FILE = 'ensemble.json'
+DEFAULT_ENSEMBLE_DIR = './data/processed/weather_ensemble'
+SHEDDING_CARRIER = '供給支障'
+
+
+def _reference_index():
+    # 気象年に依存しない時刻インデックス（align_to_snapshots で対象年に置き換えられる）
+    return pd.date_range('2023-01-01 00:00', periods=HOURS_PER_YEAR, freq='h', name='snapshot')
+
+
+def _annual_frame(data, weather_year):
+    # 1気象年分のデータ（DataFrame または .parquet/.csv のパス）を8760時間の DataFrame にする
+    # （欠けている時刻は align_to_snapshots と同じく最も近い時刻の値で埋める）
+    from .preprocess_data import align_to_snapshots, drop_leap_day
+    from .profile_store import open_profiles
+
+    if isinstance(data, str):
+        data = open_profiles(data)
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    data = drop_leap_day(data)
+    if len(data) != HOURS_PER_YEAR:
+        print(f"  ⚠ 気象年 {weather_year} のデータは {len(data)}時間です。"
+              f"最も近い時刻の値で{HOURS_PER_YEAR}時間に合わせます")
+    return align_to_snapshots(data, _reference_index())
+
+
+def write_weather_ensemble(directory, solar, hydro):
+    """
+    気象年ごとの太陽光・水力の時系列をアンサンブルの配列として保存する
+
+    1気象年ずつメモリマップに書き込むため、全気象年分をメモリに載せる必要はない。
+
+    Args:
+        directory: 保存先ディレクトリ
+        solar: 気象年→太陽光の時系列（DataFrame（列=バス）または .parquet/.csv のパス）の辞書
+        hydro: 気象年→水力稼働率の時系列の辞書。1つの DataFrame/パスの場合は全気象年で共通とする
+
+    Returns:
+        メタデータの辞書
+    """
+    weather_years = sorted(solar)
+    if not isinstance(hydro, dict):
+        hydro = dict.fromkeys(weather_years, hydro)
+    missing = [year for year in weather_years if year not in hydro]
+    if missing:
+        raise ValueError(f"水力データがない気象年があります: {missing}")
+    os.makedirs(directory, exist_ok=True)
+
+    first = _annual_frame(solar[weather_years[0]], weather_years[0])
+    buses = [str(c) for c in first.columns]
+    hydro_column = None
+
+    tmp = {name: os.path.join(directory, f'{name}.{os.getpid()}.tmp.npy') for name in ('solar', 'hydro')}
+    solar_array = np.lib.format.open_memmap(tmp['solar'], mode='w+', dtype=np.float32,
+                                            shape=(len(weather_years), HOURS_PER_YEAR, len(buses)))
+    hydro_array = np.lib.format.open_memmap(tmp['hydro'], mode='w+', dtype=np.float32,
+                                            shape=(len(weather_years), HOURS_PER_YEAR))
+    for i, year in enumerate(weather_years):
+        frame = first if i == 0 else _annual_frame(solar[year], year)
+        frame.columns = [str(c) for c in frame.columns]
+        absent = [bus for bus in buses if bus not in frame.columns]
+        if absent:
+            raise ValueError(f"気象年 {year} の太陽光データにバスがありません: {absent}")
+        solar_array[i] = frame[buses].to_numpy(dtype=np.float32)
+
+        rate = _annual_frame(hydro[year], year)
+        hydro_column = hydro_column or str(rate.columns[0])
+        hydro_array[i] = rate.iloc[:, 0].to_numpy(dtype=np.float32)
+        print(f"  ✓ 気象年 {year} を書き込みました")
+    solar_array.flush()
+    hydro_array.flush()
+    del solar_array, hydro_array
+    for name, path in tmp.items():
+        os.replace(path, os.path.join(directory, f'{name}.npy'))
+
+    metadata = {
+        'weather_years': [int(year) for year in weather_years],
+        'buses': buses,
+        'hydro_column': hydro_column,
+        'hours': HOURS_PER_YEAR,
+        'leap_day_removed': True,
+    }
+    with open(os.path.join(directory, METADATA_FILE), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=1)
+    # 作り直した場合に古いメモリマップを使わないようにする
+    open_weather_ensemble.cache_clear()
+    print(f"✓ 気象年アンサンブルを保存しました: {directory} ({len(weather_years)}気象年 × {len(buses)}バス)")
+    return metadata
+
+
+def fetch_solar_weather_years(bus_coords, weather_years, transport, **fetch_options):
+    """
+    Renewables.Ninja から複数の気象年の太陽光発電の時系列を取得する（write_weather_ensemble の solar 用）
+
+    Args:
+        bus_coords: index=バス名、列 lat, lon のDataFrame
+        weather_years: 気象年のリスト
+        transport: http_transport() / fixture_transport() などの通信関数
+        **fetch_options: fetch_pv_time_series() に渡すその他の引数
+
+    Returns:
+        気象年→時系列DataFrameの辞書（取得に失敗したバスがある気象年は含めない）
+    """
+    from .ninja_fetch import fetch_pv_time_series
+
+    solar = {}
+    for year in weather_years:
+        print(f"気象年 {year} の太陽光データを取得しています")
+        data, failed = fetch_pv_time_series(bus_coords, year, transport, **fetch_options)
+        if failed:
+            print(f"  ✗ 気象年 {year} は取得に失敗したバスがあるため除外します: {list(failed)}")
+            continue
+        solar[year] = data
+    return solar
+
+
+@functools.lru_cache(maxsize=None)
+def open_weather_ensemble(directory):
+    """
+    アンサンブルの配列を読み取り専用のメモリマップで開く（プロセスごとに1回だけ開く）
+
+    Returns:
+        {'solar': (weather_year, hour, bus) の配列, 'hydro': (weather_year, hour) の配列, 'metadata': メタデータ}
+    """
+    with open(os.path.join(directory, METADATA_FILE), encoding='utf-8') as f:
+        metadata = json.load(f)
+    return {
+        'solar': np.load(os.path.join(directory, 'solar.npy'), mmap_mode='r'),
+        'hydro': np.load(os.path.join(directory, 'hydro.npy'), mmap_mode='r'),
+        'metadata': metadata,
+    }
+
+
+def ensemble_profiles(directory, kind, weather_year, columns=None):
+    """
+    1気象年分の時系列データを DataFrame として取り出す（SolarTimeSeriesDataSet などから使う）
+
+    Args:
+        directory: アンサンブルのディレクトリ
+        kind: 'solar' または 'hydro'
+        weather_year: 気象年
+        columns: 読み込むバス（solarのみ。存在しないバスは無視する）
+    """
+    ensemble = open_weather_ensemble(os.path.abspath(directory))
+    metadata = ensemble['metadata']
+    if weather_year not in metadata['weather_years']:
+        raise KeyError(f"気象年 {weather_year} はアンサンブルにありません: {metadata['weather_years']}")
+    i = metadata['weather_years'].index(weather_year)
+    if kind == 'hydro':
+        return pd.DataFrame({metadata['hydro_column']: ensemble['hydro'][i]}, index=_reference_index())
+    all_buses = pd.Index(metadata['buses'])
+    buses = all_buses if columns is None else all_buses[all_buses.isin(pd.unique(pd.Index(columns)))]
+    # 必要なバスの列だけをメモリマップからコピーする
+    values = ensemble['solar'][i][:, all_buses.get_indexer(buses)]
+    data = pd.DataFrame(values, index=_reference_index(), columns=buses)
+    data.attrs['weather_year'] = weather_year
+    return data
+
+
+def add_load_shedding(network, voll):
+    """
+    負荷のあるバスに供給支障（需要の切り捨て）を表す発電機を追加する
+
+    Args:
+        network: PyPSA Network object
+        voll: 供給支障コスト（発電機の marginal_cost と同じ単位）
+
+    Returns:
+        追加した発電機名の Index
+    """
+    buses = pd.Index(pd.unique(network.loads['bus']))
+    names = buses + f' {SHEDDING_CARRIER}'
+    if SHEDDING_CARRIER not in network.carriers.index:
+        network.add('Carrier', SHEDDING_CARRIER)
+    # 容量はバスの最大需要とし、どの時刻でも需要全体を切り捨てられるようにする
+    peak = network.loads_t.p_set.T.groupby(network.loads['bus']).sum().T.max().reindex(buses).fillna(0.0)
+    network.add('Generator', names, bus=buses, carrier=SHEDDING_CARRIER, p_nom=peak.to_numpy(),
+                marginal_cost=voll)
+    return names
+
+
+def _run_weather_year(weather_year, options):
+    # ワーカープロセスで1気象年を構築→最適化し、費用と供給支障量を返す
+    import warnings
+    from .preprocess_data import build_network
+
+    warnings.filterwarnings("ignore", category=UserWarning, module="pypsa")
+    stages = []
+    with stage_timer('build', stages, verbose=False):
+        network = build_network(options['file_name'], options['year'], options['demand_change'],
+                                start=options['start'], end=options['end'],
+                                solar_data_file=options['ensemble_dir'], hydro_data_file=options['ensemble_dir'],
+                                representative_days=options['representative_days'], weather_year=weather_year)
+        shedding = add_load_shedding(network, options['voll'])
+    with stage_timer('optimize', stages, verbose=False):
+        status, condition = network.optimize(solver_name='highs', solver_options=options['solver_options'],
+                                             extra_functionality=options['extra_functionality'])
+
+    result = {'weather_year': weather_year, 'status': status, 'termination_condition': condition,
+              'stages': stages}
+    if status == 'ok':
+        weights = network.snapshot_weightings['generators']
+        unserved = network.generators_t.p[shedding].sum(axis=1)
+        result.update({
+            'total_cost': network.objective,
+            'shedding_cost': unserved.mul(network.snapshot_weightings['objective']).sum() * options['voll'],
+            'unserved_energy': (unserved * weights).sum(),
+            'unserved_hours': weights[unserved > 1e-6].sum(),
+            'peak_unserved': unserved.max(),
+            'total_demand': network.loads_t.p.sum(axis=1).mul(weights).sum(),
+        })
+    result['elapsed'] = sum(stage['elapsed'] for stage in stages)
+    return result
+
+
+def run_weather_ensemble(file_name, year, demand_change=0, ensemble_dir=DEFAULT_ENSEMBLE_DIR, weather_years=None,
+                         workers=None, highs_threads=1, start='04-01 00:00', end='04-14 23:00', voll=100000,
+                         extra_functionality=None, solver_options=None, representative_days=None):
+    """
+    同じネットワークを気象年ごとの時系列で並列に最適化する
+
+    Args:
+        file_name: ネットワーク＋需要データを含むExcelファイル
+        year: 対象年（需要データとスナップショットの年）
+        demand_change: 需要変化率（2024年比, %）
+        ensemble_dir: write_weather_ensemble() で保存したディレクトリ
+        weather_years: 実行する気象年（省略時はアンサンブルの全気象年）
+        workers: 並列ワーカー数（省略時はCPU数 ÷ highs_threads）。1の場合は逐次実行
+        highs_threads: ワーカー1つあたりのHiGHSスレッド数
+        start, end: 期間（月日時刻）
+        voll: 供給支障コスト（発電機の marginal_cost と同じ単位）
+        extra_functionality: 追加制約関数（並列実行時はモジュールレベルの関数であること）
+        solver_options: HiGHSに渡す追加オプション
+        representative_days: 代表日で時間集約して解く場合の代表日数
+
+    Returns:
+        気象年ごとの結果（total_cost, unserved_energy など）のDataFrame。集計は ensemble_statistics() で行う
+    """
+    metadata = open_weather_ensemble(os.path.abspath(ensemble_dir))['metadata']
+    weather_years = metadata['weather_years'] if weather_years is None else list(weather_years)
+    solver_options = dict(solver_options or {})
+    solver_options.setdefault('threads', highs_threads)
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // max(1, highs_threads))
+    options = {
+        'file_name': file_name, 'year': year, 'demand_change': demand_change,
+        'ensemble_dir': os.path.abspath(ensemble_dir), 'start': start, 'end': end, 'voll': voll,
+        'extra_functionality': extra_functionality, 'solver_options': solver_options,
+        'representative_days': representative_days,
+    }
+    print(f"気象年数: {len(weather_years)} (ワーカー数: {workers})")
+
+    t0 = time.time()
+    results = []
+    if workers == 1:
+        for weather_year in weather_years:
+            try:
+                results.append(_run_weather_year(weather_year, options))
+                print(f"  ✓ 完了: 気象年 {weather_year}")
+            except Exception as e:
+                print(f"  ✗ 失敗: 気象年 {weather_year}: {e}")
+                results.append({'weather_year': weather_year, 'status': 'error', 'termination_condition': str(e)})
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_run_weather_year, weather_year, options): weather_year
+                       for weather_year in weather_years}
+            for future in as_completed(futures):
+                weather_year = futures[future]
+                try:
+                    results.append(future.result())
+                    print(f"  ✓ 完了: 気象年 {weather_year}")
+                except Exception as e:
+                    print(f"  ✗ 失敗: 気象年 {weather_year}: {e}")
+                    results.append({'weather_year': weather_year, 'status': 'error', 'termination_condition': str(e)})
+    print(f"✓ アンサンブルの最適化が完了しました ({time.time() - t0:.1f}秒)")
+    return pd.DataFrame(results).sort_values('weather_year').reset_index(drop=True)
+
+
+def ensemble_statistics(results, percentiles=(5, 50, 95),
+                        metrics=('total_cost', 'unserved_energy', 'unserved_hours', 'peak_unserved')):
+    """
+    気象年ごとの結果をパーセンタイルなどの統計量にまとめる（最適化に成功した気象年のみ）
+
+    Args:
+        results: run_weather_ensemble() の結果
+        percentiles: 計算するパーセンタイル
+        metrics: 集計する列
+
+    Returns:
+        index=指標、列 mean, p5, p50, p95, max などのDataFrame（attrs['weather_years'] に集計した気象年数）
+    """
+    ok = results[results['status'] == 'ok']
+    values = ok[[m for m in metrics if m in ok.columns]].astype(float)
+    table = pd.DataFrame({'mean': values.mean(), 'min': values.min()})
+    for q in percentiles:
+        table[f'p{q:g}'] = values.quantile(q / 100)
+    table['max'] = values.max()
+    table.attrs['weather_years'] = len(ok)
+    if len(ok) < len(results):
+        print(f"  ⚠ 最適化に失敗した気象年を除外しました: {list(results.loc[results['status'] != 'ok', 'weather_year'])}")
+    return table
@@ -0,0 +1,51 @@
+import numpy as np, pandas as pd
+
+from src.demand_allocation import allocate_demand, allocation_matrix, allocation_table
+
+
+def make_table():
+    loads = pd.DataFrame({'area': ['東京D', '東京D', '関西D', '関西D'], 'weight': [3.0, 1.0, 0.0, 0.0]},
+                         index=['東京北', '東京南', '大阪', '京都'])
+    table, missing = allocation_table(loads, ['東京D', '関西D'])
+    assert missing == []
+    return table
+
+
+def test_allocation_table_falls_back_to_load_name():
+    loads = pd.DataFrame(index=['東京D', '中部D', '沖縄'])
+    table, missing = allocation_table(loads, ['東京D', '中部D'])
+    assert table['area'].tolist() == ['東京D', '中部D']
+    assert table['weight'].tolist() == [1.0, 1.0]
+    assert missing == ['沖縄']
+
+
+def test_allocate_demand_normalizes_weights_and_splits_zero_weights_equally():
+    table = make_table()
+    area_demand = pd.DataFrame({'東京D': [400.0, 800.0], '関西D': [100.0, 300.0]},
+                               index=pd.date_range('2030-04-01', periods=2, freq='h'))
+
+    allocated = allocate_demand(area_demand, table, cache_dir=None)
+
+    # 東京は重み 3:1、関西は重みの合計が0なので均等に配分する
+    np.testing.assert_allclose(allocated['東京北'], [300.0, 600.0])
+    np.testing.assert_allclose(allocated['東京南'], [100.0, 200.0])
+    np.testing.assert_allclose(allocated['大阪'], [50.0, 150.0])
+    np.testing.assert_allclose(allocated['京都'], [50.0, 150.0])
+    np.testing.assert_allclose(allocated.sum(axis=1), area_demand.sum(axis=1))
+
+
+def test_allocation_matrix_cache_is_keyed_on_weights(tmp_path):
+    table = make_table()
+    areas = ['東京D', '関西D']
+
+    first = allocation_matrix(table, areas, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob('allocation_*.npz'))) == 1
+    # 同じ割当表はキャッシュから読み込む
+    np.testing.assert_allclose(allocation_matrix(table, areas, cache_dir=str(tmp_path)).toarray(), first.toarray())
+
+    # 重みを変えると別のキャッシュになり、古い行列は使われない
+    changed = table.assign(weight=[1.0, 1.0, 0.0, 0.0])
+    second = allocation_matrix(changed, areas, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob('allocation_*.npz'))) == 2
+    np.testing.assert_allclose(second.toarray()[0, :2], [0.5, 0.5])
+    np.testing.assert_allclose(first.toarray()[0, :2], [0.75, 0.25])
@@ -0,0 +1,107 @@
+import json, types
+import numpy as np, pandas as pd
+import pytest
+
+from src import ninja_fetch
+from src.ninja_fetch import cache_key, fetch_cached, fixture_transport, pv_params
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # 再試行・レート制限の待ち時間を記録するだけにして、実際には待たない
+    calls = []
+    monkeypatch.setattr(ninja_fetch, 'time', types.SimpleNamespace(sleep=calls.append,
+                                                                   monotonic=ninja_fetch.time.monotonic))
+    return calls
+
+
+def scripted_transport(responses):
+    # 呼ばれるたびに responses の先頭を返す（例外の場合は送出する）
+    calls = []
+
+    def transport(params):
+        calls.append(params)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    transport.calls = calls
+    return transport
+
+
+def pv_response(year, value=0.5):
+    # Renewables.Ninja と同じ形式（キーはUTCのUnix時間[ms]）
+    index = pd.date_range(f'{year - 1}-12-31 15:00', f'{year}-12-31 14:00', freq='h')
+    return {'data': {str(t.value // 10**6): {'electricity': value} for t in index}}
+
+
+@pytest.mark.parametrize('failure', [(429, None, None), (500, None, None), (503, None, 2.0),
+                                     TimeoutError('timed out'), ConnectionError('reset')])
+def test_fetch_cached_retries_transient_failures(tmp_path, sleeps, failure):
+    params = pv_params(35.0, 139.0, 2023)
+    transport = scripted_transport([failure, (200, {'data': {}}, None)])
+
+    assert fetch_cached(params, transport, cache_dir=str(tmp_path), backoff=1.0) == {'data': {}}
+    assert len(transport.calls) == 2
+    # Retry-After があればその秒数、なければ指数バックオフの初回分だけ待つ
+    expected = failure[2] if isinstance(failure, tuple) and failure[2] is not None else 1.0
+    assert sleeps == [expected]
+    assert (tmp_path / f'{cache_key(params)}.json').exists()
+
+
+def test_fetch_cached_gives_up_after_max_retries(tmp_path, sleeps):
+    transport = scripted_transport([(500, None, None)] * 3)
+    with pytest.raises(RuntimeError, match='500'):
+        fetch_cached(pv_params(35.0, 139.0, 2023), transport, cache_dir=str(tmp_path), max_retries=2, backoff=1.0)
+    assert len(transport.calls) == 3
+    assert sleeps == [1.0, 2.0]
+
+
+def test_fetch_cached_does_not_retry_client_errors(tmp_path, sleeps):
+    transport = scripted_transport([(403, None, None)])
+    with pytest.raises(RuntimeError, match='403'):
+        fetch_cached(pv_params(35.0, 139.0, 2023), transport, cache_dir=str(tmp_path))
+    assert len(transport.calls) == 1
+    assert sleeps == []
+
+
+def test_fetch_cached_reads_cache_without_calling_transport(tmp_path):
+    params = pv_params(35.0, 139.0, 2023)
+    (tmp_path / f'{cache_key(params)}.json').write_text(json.dumps({'data': {'cached': 1}}), encoding='utf-8')
+
+    def transport(params):
+        raise AssertionError('キャッシュがあるのにAPIを呼んだ')
+
+    assert fetch_cached(params, transport, cache_dir=str(tmp_path)) == {'data': {'cached': 1}}
+
+
+def test_get_solar_time_series_drops_failed_buses(tmp_path, monkeypatch, sleeps):
+    from src.preprocess_data import GetSolarTimeSeriesData
+    from src.profile_store import open_profiles, store_path_for
+
+    monkeypatch.chdir(tmp_path)
+    year = 2023
+    buses = pd.DataFrame({'name': ['Tokyo', 'Osaka', 'Sapporo', 'Tokyo DC'],
+                          'carrier': ['AC', 'AC', 'AC', 'DC'],
+                          'x': [139.7, 135.5, 141.3, 139.7], 'y': [35.7, 34.7, 43.1, 35.7]})
+    workbook = tmp_path / 'network.xlsx'
+    buses.to_excel(workbook, sheet_name='buses', index=False)
+
+    # Sapporo の応答だけ用意しない（404 → 取得失敗）
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    for name, value in [('Tokyo', 0.25), ('Osaka', 0.5)]:
+        row = buses.set_index('name').loc[name]
+        params = pv_params(row['y'], row['x'], year)
+        (fixtures / f'{cache_key(params)}.json').write_text(json.dumps(pv_response(year, value)), encoding='utf-8')
+
+    output_file = tmp_path / 'solar.csv'
+    GetSolarTimeSeriesData(str(workbook), str(output_file), year, None,
+                           transport=fixture_transport(str(fixtures)))
+
+    saved = pd.read_csv(output_file, index_col=0, parse_dates=True)
+    assert list(saved.columns) == ['Tokyo', 'Osaka']
+    assert len(saved) == 8760
+    np.testing.assert_allclose(saved['Osaka'], 0.5)
+    assert list(open_profiles(store_path_for(str(output_file))).columns) == ['Tokyo', 'Osaka']
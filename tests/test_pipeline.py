@@ -0,0 +1,79 @@
+from src.pipeline import run_pipeline, stage
+
+
+def make_stages(tmp_path, calls):
+    raw, mid, out = (str(tmp_path / name) for name in ('raw.txt', 'mid.txt', 'out.txt'))
+
+    def normalize():
+        # 前後の空白と大文字小文字の違いは下流に伝えない
+        calls.append('normalize')
+        with open(raw, encoding='utf-8') as f:
+            text = f.read().strip().lower()
+        with open(mid, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def report():
+        calls.append('report')
+        with open(mid, encoding='utf-8') as f:
+            text = f.read()
+        with open(out, 'w', encoding='utf-8') as f:
+            f.write(f'{len(text)}\n')
+
+    # 順不同で渡しても依存関係の順に実行される
+    return raw, [stage('report', report, inputs=[mid], outputs=[out]),
+                 stage('normalize', normalize, inputs=[raw], outputs=[mid])]
+
+
+def statuses(results):
+    return dict(zip(results['stage'], results['status']))
+
+
+def test_run_pipeline_skips_unchanged_and_reruns_changed_inputs(tmp_path):
+    calls = []
+    raw, stages = make_stages(tmp_path, calls)
+    state_file = str(tmp_path / 'state.json')
+    with open(raw, 'w', encoding='utf-8') as f:
+        f.write('Hydro\n')
+
+    assert statuses(run_pipeline(stages, state_file=state_file)) == {'normalize': 'ran', 'report': 'ran'}
+    assert calls == ['normalize', 'report']
+
+    calls.clear()
+    assert statuses(run_pipeline(stages, state_file=state_file)) == {'normalize': 'skipped', 'report': 'skipped'}
+    assert calls == []
+
+    # 入力のハッシュが変わると再実行するが、中間ファイルの内容が同じなら下流はスキップする
+    with open(raw, 'w', encoding='utf-8') as f:
+        f.write('  HYDRO  \n')
+    assert statuses(run_pipeline(stages, state_file=state_file)) == {'normalize': 'ran', 'report': 'skipped'}
+    assert calls == ['normalize']
+
+    # 中間ファイルの内容が変わると下流も再実行する
+    calls.clear()
+    with open(raw, 'w', encoding='utf-8') as f:
+        f.write('solar and hydro\n')
+    assert statuses(run_pipeline(stages, state_file=state_file)) == {'normalize': 'ran', 'report': 'ran'}
+    assert calls == ['normalize', 'report']
+    assert (tmp_path / 'out.txt').read_text(encoding='utf-8') == '15\n'
+
+
+def test_run_pipeline_reruns_when_params_change(tmp_path):
+    calls = []
+    raw, stages = make_stages(tmp_path, calls)
+    state_file = str(tmp_path / 'state.json')
+    with open(raw, 'w', encoding='utf-8') as f:
+        f.write('hydro')
+    run_pipeline(stages, state_file=state_file)
+
+    calls.clear()
+    stages[1]['params'] = {'year': 2030}
+    assert statuses(run_pipeline(stages, state_file=state_file)) == {'normalize': 'ran', 'report': 'skipped'}
+    assert calls == ['normalize']
+
+
+def test_run_pipeline_blocks_downstream_of_failed_stage(tmp_path):
+    calls = []
+    raw, stages = make_stages(tmp_path, calls)
+    results = run_pipeline(stages, state_file=str(tmp_path / 'state.json'))
+    assert statuses(results) == {'normalize': 'failed', 'report': 'blocked'}
+    assert calls == []
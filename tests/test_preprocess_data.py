@@ -0,0 +1,72 @@
+import numpy as np, pandas as pd
+
+from src.preprocess_data import align_to_snapshots, drop_leap_day
+
+
+def hourly(start, periods, columns=('東京',)):
+    index = pd.date_range(start, periods=periods, freq='h')
+    return pd.DataFrame({c: np.arange(periods, dtype=float) + i * 10000 for i, c in enumerate(columns)}, index=index)
+
+
+def test_align_to_snapshots_shifts_year_keeping_month_day_hour():
+    data = hourly('2023-01-01', 8760, columns=('東京', '関西'))
+    snapshots = pd.date_range('2030-04-01 00:00', '2030-04-14 23:00', freq='h')
+
+    aligned = align_to_snapshots(data, snapshots)
+
+    assert aligned.index.equals(snapshots)
+    assert list(aligned.columns) == ['東京', '関西']
+    expected = data.loc['2023-04-01 00:00':'2023-04-14 23:00'].to_numpy()
+    np.testing.assert_array_equal(aligned.to_numpy(), expected)
+
+
+def test_align_to_snapshots_leap_target_year_without_feb_29():
+    data = hourly('2023-01-01', 8760)
+    snapshots = pd.date_range('2024-02-28 00:00', '2024-03-01 23:00', freq='h')
+    snapshots = snapshots[~((snapshots.month == 2) & (snapshots.day == 29))]
+
+    aligned = align_to_snapshots(data, snapshots)
+
+    assert len(aligned) == 48
+    np.testing.assert_array_equal(aligned.loc['2024-03-01', '東京'], data.loc['2023-03-01', '東京'])
+
+
+def test_align_to_snapshots_leap_source_year():
+    # 閏年のデータ（2月29日を除外済み）を平年のスナップショットに合わせる
+    data = drop_leap_day(hourly('2024-01-01', 8784))
+    snapshots = pd.date_range('2030-01-01 00:00', periods=8760, freq='h')
+
+    aligned = align_to_snapshots(data, snapshots)
+
+    assert not aligned.isna().any().any()
+    np.testing.assert_array_equal(aligned['東京'].to_numpy(), data['東京'].to_numpy())
+
+
+def test_align_to_snapshots_data_crossing_new_year():
+    data = hourly('2022-12-31 00:00', 48)
+    snapshots = pd.date_range('2030-01-01 00:00', periods=24, freq='h')
+
+    aligned = align_to_snapshots(data, snapshots)
+
+    np.testing.assert_array_equal(aligned['東京'].to_numpy(), np.arange(24, 48, dtype=float))
+
+
+def test_align_to_snapshots_multi_year_data_keeps_first_year():
+    # 複数年のデータは同じ月日時刻の重複を除いてから合わせる
+    data = hourly('2022-01-01', 2 * 8760)
+    snapshots = pd.date_range('2030-07-01 00:00', periods=24, freq='h')
+
+    aligned = align_to_snapshots(data, snapshots)
+
+    np.testing.assert_array_equal(aligned['東京'].to_numpy(), data.loc['2022-07-01', '東京'].to_numpy())
+
+
+def test_align_to_snapshots_fills_missing_hours_with_nearest():
+    data = hourly('2023-01-01', 8760).drop(pd.Timestamp('2023-06-01 12:00'))
+    snapshots = pd.date_range('2030-06-01 11:00', periods=3, freq='h')
+
+    aligned = align_to_snapshots(data, snapshots)
+
+    assert not aligned.isna().any().any()
+    assert aligned['東京'].iloc[0] == data.loc['2023-06-01 11:00', '東京']
+    assert aligned['東京'].iloc[2] == data.loc['2023-06-01 13:00', '東京']
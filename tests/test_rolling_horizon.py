@@ -0,0 +1,41 @@
+import pandas as pd
+import pypsa
+
+from src.rolling_horizon import optimize_rolling_horizon, window_starts
+
+
+def make_network(peak=10.0):
+    network = pypsa.Network()
+    network.set_snapshots(pd.date_range('2030-01-01', periods=48, freq='h'))
+    network.add('Bus', 'b')
+    demand = pd.Series(10.0, index=network.snapshots)
+    demand.iloc[30] = peak
+    network.add('Load', 'l', bus='b', p_set=demand)
+    network.add('Generator', 'g', bus='b', p_nom=100, marginal_cost=5)
+    network.add('StorageUnit', 's', bus='b', p_nom=10, max_hours=2, cyclic_state_of_charge=True)
+    return network
+
+
+def test_window_starts_cover_all_snapshots():
+    assert window_starts(48, 12, 2) == [0, 10, 20, 30, 40]
+    assert window_starts(10, 12, 2) == [0]
+
+
+def test_optimize_rolling_horizon_restores_storage_settings():
+    network = make_network()
+    windows = optimize_rolling_horizon(network, window=12, overlap=2)
+
+    assert (windows['status'] == 'ok').all()
+    assert len(windows) == 5
+    assert network.storage_units.loc['s', 'cyclic_state_of_charge']
+    assert network.generators_t.p['g'].notna().all()
+
+
+def test_optimize_rolling_horizon_stops_at_failed_window():
+    # 30時刻目の需要は発電と放電の合計を超えるので、3つ目のウィンドウが解けない
+    network = make_network(peak=500.0)
+    windows = optimize_rolling_horizon(network, window=12, overlap=2)
+
+    assert windows['status'].tolist() == ['ok', 'ok', 'warning']
+    assert windows['objective'].iloc[:2].notna().all()
+    assert pd.isna(windows['objective'].iloc[2])
@@ -0,0 +1,16 @@
+import numpy as np, pandas as pd
+
+from src.validation import _align_actuals
+
+
+def test_align_actuals_matches_month_day_hour_without_nearest_fill():
+    actuals = pd.DataFrame({'東京': np.arange(8760.0)}, index=pd.date_range('2023-01-01', periods=8760, freq='h'))
+    actuals = actuals.drop(pd.Timestamp('2023-03-01 01:00'))
+    timestamps = pd.DatetimeIndex(['2024-02-28 23:00', '2024-02-29 00:00', '2024-03-01 00:00',
+                                   '2024-03-01 01:00'])
+
+    aligned = _align_actuals(actuals, timestamps)
+
+    assert aligned.index.equals(timestamps)
+    # 実績の年にない2月29日と、実績が欠測している時刻は補わない
+    np.testing.assert_array_equal(aligned['東京'].to_numpy(), [1415.0, np.nan, 1416.0, np.nan])